@@ -1,25 +1,125 @@
 from canvasapi import Canvas
+from canvasapi.account import Account
+from canvasapi.course import Course
+from canvasapi.user import User
 from canvasapi.exceptions import CanvasException
+from canvasapi.util import combine_kwargs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+from app.api.rate_limit import RateLimitController, RateLimitedSession
 from app.config import Config
-from typing import Dict, List, Optional
+from app.metrics import metrics, timed
+from app.models.inventory import inventory
+from app.models.user_index import user_index
+from typing import Dict, Iterator, List, Optional
+import contextvars
+import functools
+import inspect
+import io
+import itertools
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Largest page size Canvas accepts for list endpoints
+PAGE_SIZE = 100
+
+COURSE_STATES = ['available', 'completed', 'unpublished']
+
+PROGRESS_FINISHED_STATES = ('completed', 'failed')
+
+SIS_IMPORT_FINISHED_STATES = (
+    'imported', 'imported_with_messages', 'failed', 'failed_with_messages', 'aborted'
+)
+
+# How Canvas writes timestamps: UTC, whole seconds, e.g. 2026-10-18T15:35:55Z
+CANVAS_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+def canvas_time(value: Optional[str] = None) -> str:
+    """A timestamp (now when value is None) in Canvas' format, so stored times compare as strings"""
+    moment = datetime.fromisoformat(value) if value else datetime.now(timezone.utc)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime(CANVAS_TIME_FORMAT)
+
+def _with_page(url: str, page: int) -> str:
+    """Return a pagination link pointing at another page number"""
+    parts = urlparse(url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    query['page'] = [str(page)]
+    return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+
+metrics.histogram('canvas_call_seconds', 'Duration of CanvasClient calls by operation, environment and outcome')
+
+def _instrumented(cls):
+    """Time every public CanvasClient method as one operation, per environment.
+
+    Generators are left alone: they stay suspended while the caller works
+    on each item, so _iter_paginated times their page fetches instead.
+    """
+    def wrap(name, method):
+        @functools.wraps(method)
+        def call(self, *args, **kwargs):
+            with timed('canvas_call_seconds', 'canvas', name, environment=self.environment or 'default'):
+                return method(self, *args, **kwargs)
+        return call
+
+    for name, method in list(vars(cls).items()):
+        if (not name.startswith('_') and name != 'close' and inspect.isfunction(method)
+                and not inspect.isgeneratorfunction(method)):
+            setattr(cls, name, wrap(name, method))
+    return cls
+
+@_instrumented
 class CanvasClient:
-    def __init__(self, base_url: str = None, token: str = None):
+    def __init__(self, base_url: str = None, token: str = None, environment: str = None, pool_size: int = None):
         # Remove /api/v1 if present in the URL
         self.base_url = (base_url or Config.CANVAS_API_URL).replace('/api/v1', '')
         self.token = token or Config.CANVAS_API_TOKEN
+        self.environment = environment
+        self._current_user = None
+        self._connect_lock = threading.Lock()
         
-        try:
-            self.canvas = Canvas(self.base_url, self.token)
-            # Test the connection
-            self.current_user = self.canvas.get_current_user()
-            logger.info(f"Connected to Canvas as {self.current_user.name}")
-        except Exception as e:
-            logger.error(f"Failed to connect to Canvas: {e}")
-            raise
+        self.canvas = Canvas(self.base_url, self.token)
+        
+        # All threads using this client share one rate limit budget and one keep-alive pool
+        self.rate_limit = RateLimitController()
+        self.session = RateLimitedSession(self.rate_limit, environment=environment)
+        self.canvas._Canvas__requester._session = self.session
+        pool_size = pool_size or Config.CANVAS_POOL_SIZE
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    @property
+    def current_user(self):
+        """The authenticated user, fetched once on first use"""
+        with self._connect_lock:
+            if self._current_user is None:
+                try:
+                    self._current_user = self.canvas.get_current_user()
+                    logger.info(f"Connected to Canvas as {self._current_user.name}")
+                except Exception as e:
+                    logger.error(f"Failed to connect to Canvas: {e}")
+                    raise
+            return self._current_user
+    
+    def close(self):
+        """Release pooled HTTP connections"""
+        self.session.close()
+    
+    def _account(self, account_id: int) -> Account:
+        """Id-only Account handle: write calls only need the id, so skip fetching the account"""
+        return Account(self.canvas._Canvas__requester, {'id': account_id})
+    
+    def _course(self, course_id: int) -> Course:
+        """Id-only Course handle: write calls only need the id, so skip fetching the course"""
+        return Course(self.canvas._Canvas__requester, {'id': course_id})
     
     def get_root_account(self) -> Dict:
         """Get the root account"""
@@ -35,24 +135,43 @@ class CanvasClient:
     def create_subaccount(self, parent_id: int, name: str, **kwargs) -> Dict:
         """Create a new subaccount"""
         try:
-            account = self.canvas.get_account(parent_id)
+            account = self._account(parent_id)
             subaccount = account.create_subaccount(
                 account={'name': name, **kwargs}
             )
-            return {
+            created = {
                 'id': subaccount.id,
                 'name': subaccount.name,
                 'parent_account_id': subaccount.parent_account_id,
                 'workflow_state': getattr(subaccount, 'workflow_state', 'active')
             }
+            inventory.add_accounts(self.environment or 'default', [created])
+            return created
         except CanvasException as e:
             logger.error(f"Failed to create subaccount: {e}")
             raise
     
+    def get_account_by_sis_id(self, sis_account_id: str) -> Dict:
+        """Get an account by its SIS id"""
+        try:
+            account = self.canvas.get_account(sis_account_id, use_sis_id=True)
+            found = {
+                'id': account.id,
+                'name': account.name,
+                'parent_account_id': account.parent_account_id,
+                'workflow_state': getattr(account, 'workflow_state', 'active')
+            }
+            # Subaccounts adopted after a failed create belong in the inventory too
+            inventory.add_accounts(self.environment or 'default', [found])
+            return found
+        except CanvasException as e:
+            logger.error(f"Failed to get account {sis_account_id}: {e}")
+            raise
+    
     def create_course(self, account_id: int, name: str, course_code: str, **kwargs) -> Dict:
         """Create a new course"""
         try:
-            account = self.canvas.get_account(account_id)
+            account = self._account(account_id)
             
             # Set default values
             course_data = {
@@ -66,20 +185,33 @@ class CanvasClient:
             
             course = account.create_course(course=course_data)
             
-            return {
+            created = {
                 'id': course.id,
                 'name': course.name,
                 'course_code': course.course_code,
-                'workflow_state': course.workflow_state
+                'workflow_state': course.workflow_state,
+                'account_id': getattr(course, 'account_id', account_id)
             }
+            inventory.add_courses(self.environment or 'default', [{
+                **created,
+                'sis_course_id': course_data.get('sis_course_id'),
+                'created_at': canvas_time(getattr(course, 'created_at', None))
+            }])
+            return created
         except CanvasException as e:
             logger.error(f"Failed to create course: {e}")
             raise
     
     def create_user(self, account_id: int, name: str, email: str, login_id: str, **kwargs) -> Dict:
-        """Create a new user"""
+        """Create a new user, or reuse the indexed user with the same login or SIS id"""
+        sis_user_id = kwargs.pop('sis_user_id', None)
+        existing = user_index.lookup(self.environment or 'default', login_id=login_id, sis_user_id=sis_user_id)
+        if existing is not None:
+            logger.info(f"Reusing Canvas user {existing['id']} for {login_id}")
+            return {**existing, 'reused': True}
+        
         try:
-            account = self.canvas.get_account(account_id)
+            account = self._account(account_id)
             
             user_data = {
                 'name': name,
@@ -91,7 +223,7 @@ class CanvasClient:
             pseudonym_data = {
                 'unique_id': login_id,
                 'password': 'ChangeMePlease123!',  # Default password
-                'sis_user_id': kwargs.get('sis_user_id'),
+                'sis_user_id': sis_user_id,
                 'send_confirmation': False
             }
             
@@ -101,20 +233,53 @@ class CanvasClient:
                 communication_channel={'address': email, 'type': 'email'}
             )
             
-            return {
+            created = {
                 'id': user.id,
                 'name': user.name,
                 'email': email,
-                'login_id': login_id
+                'login_id': login_id,
+                'sis_user_id': sis_user_id
             }
+            user_index.record(self.environment or 'default', [created])
+            return created
         except CanvasException as e:
             logger.error(f"Failed to create user: {e}")
             raise
     
+    def update_user(self, user_id: int, **fields) -> Dict:
+        """Update a user's profile fields (name, short_name, sortable_name, ...)"""
+        try:
+            user = User(self.canvas._Canvas__requester, {'id': user_id}).edit(user=fields)
+            return {
+                'id': user.id,
+                'name': user.name
+            }
+        except CanvasException as e:
+            logger.error(f"Failed to update user {user_id}: {e}")
+            raise
+    
+    def get_user_by_sis_id(self, sis_user_id: str) -> Dict:
+        """Get a user by its SIS id"""
+        try:
+            user = self.canvas.get_user(sis_user_id, 'sis_user_id')
+            found = {
+                'id': user.id,
+                'name': user.name,
+                'email': getattr(user, 'email', None),
+                'login_id': getattr(user, 'login_id', None),
+                'sis_user_id': sis_user_id
+            }
+            # Users adopted after a failed create belong in the index too
+            user_index.record(self.environment or 'default', [found])
+            return found
+        except CanvasException as e:
+            logger.error(f"Failed to get user {sis_user_id}: {e}")
+            raise
+    
     def enroll_user(self, course_id: int, user_id: int, role: str = "StudentEnrollment") -> Dict:
         """Enroll a user in a course"""
         try:
-            course = self.canvas.get_course(course_id)
+            course = self._course(course_id)
             enrollment = course.enroll_user(
                 user_id,
                 enrollment_type=role,
@@ -135,7 +300,7 @@ class CanvasClient:
     def create_assignment(self, course_id: int, name: str, **kwargs) -> Dict:
         """Create an assignment in a course"""
         try:
-            course = self.canvas.get_course(course_id)
+            course = self._course(course_id)
             
             assignment_data = {
                 'name': name,
@@ -160,28 +325,201 @@ class CanvasClient:
     def delete_course(self, course_id: int) -> Dict:
         """Delete a course"""
         try:
-            course = self.canvas.get_course(course_id)
+            course = self._course(course_id)
             course.delete()
+            inventory.remove_courses(self.environment or 'default', [course_id])
             return {'success': True, 'course_id': course_id}
         except CanvasException as e:
             logger.error(f"Failed to delete course: {e}")
             raise
     
+    def copy_course_content(self, course_id: int, source_course: str) -> Dict:
+        """Start copying all content of a template course into a course.
+
+        source_course is a Canvas course id or an 'sis_course_id:...' reference.
+        Returns the migration with the id of the progress object to poll.
+        """
+        try:
+            migration = self._course(course_id).create_content_migration(
+                'course_copy_importer',
+                settings={'source_course_id': source_course}
+            )
+            progress_url = getattr(migration, 'progress_url', None) or ''
+            return {
+                'id': migration.id,
+                'course_id': course_id,
+                'workflow_state': migration.workflow_state,
+                'progress_id': int(progress_url.rstrip('/').rsplit('/', 1)[-1]) if progress_url else None
+            }
+        except CanvasException as e:
+            logger.error(f"Failed to copy course {source_course} into {course_id}: {e}")
+            raise
+    
+    def batch_update_courses(self, account_id: int, course_ids: List[int], event: str) -> Dict:
+        """Start an asynchronous batch update (e.g. event='delete') of courses in an account"""
+        try:
+            requester = self.canvas._Canvas__requester
+            response = requester.request(
+                'PUT',
+                f'accounts/{account_id}/courses',
+                _kwargs=combine_kwargs(course_ids=list(course_ids), event=event)
+            )
+            return self._progress_dict(response.json())
+        except CanvasException as e:
+            logger.error(f"Failed to {event} courses in account {account_id}: {e}")
+            raise
+    
+    def get_progress(self, progress_id: int) -> Dict:
+        """Get the current state of an asynchronous operation"""
+        try:
+            return self._progress_dict(self.canvas.get_progress(progress_id))
+        except CanvasException as e:
+            logger.error(f"Failed to get progress {progress_id}: {e}")
+            raise
+    
+    def wait_for_progress(self, progress_id: int, timeout: int = None, interval: float = None) -> Dict:
+        """Poll a progress object until the operation has completed or failed"""
+        timeout = timeout or Config.PROGRESS_TIMEOUT
+        interval = interval or Config.PROGRESS_POLL_INTERVAL
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            progress = self.get_progress(progress_id)
+            if progress['workflow_state'] in PROGRESS_FINISHED_STATES:
+                return progress
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Progress {progress_id} did not finish within {timeout}s")
+            time.sleep(interval)
+    
+    @staticmethod
+    def _progress_dict(progress) -> Dict:
+        if not isinstance(progress, dict):
+            progress = {name: getattr(progress, name, None)
+                        for name in ('id', 'workflow_state', 'completion', 'message')}
+        return {
+            'id': progress['id'],
+            'workflow_state': progress.get('workflow_state'),
+            'completion': progress.get('completion') or 0,
+            'message': progress.get('message')
+        }
+    
+    def _iter_paginated(self, operation: str, endpoint: str, **params) -> Iterator[Dict]:
+        """Yield raw items from a paginated endpoint using the maximum page size.
+
+        When the first response's Link header exposes a numbered last page,
+        the remaining pages are prefetched concurrently in a bounded window
+        and yielded in page order. Otherwise next links are followed one by one.
+        Each page fetch is timed as one call of operation.
+        """
+        requester = self.canvas._Canvas__requester
+        
+        def get(*args, **kwargs):
+            # Timed per request, never across a yield, so the caller's time isn't counted
+            with timed('canvas_call_seconds', 'canvas', operation, environment=self.environment or 'default'):
+                return requester.request('GET', *args, **kwargs)
+        
+        response = get(endpoint, _kwargs=combine_kwargs(per_page=PAGE_SIZE, **params))
+        yield from response.json()
+        
+        last_page, last_url = self._last_page(response)
+        if last_page:
+            def fetch(page):
+                return get(_url=_with_page(last_url, page)).json()
+        
+            pages = iter(range(2, last_page + 1))
+            window = max(1, Config.LISTING_PREFETCH_PAGES)
+            with ThreadPoolExecutor(max_workers=window, thread_name_prefix='canvas-pages') as executor:
+                # Prefetched pages count towards the caller's timing breakdown too
+                def submit(page):
+                    return executor.submit(contextvars.copy_context().run, fetch, page)
+        
+                pending = deque(submit(page) for page in itertools.islice(pages, window))
+                while pending:
+                    items = pending.popleft().result()
+                    next_page = next(pages, None)
+                    if next_page is not None:
+                        pending.append(submit(next_page))
+                    yield from items
+            return
+        
+        next_link = response.links.get('next')
+        while next_link:
+            response = get(_url=next_link['url'])
+            yield from response.json()
+            next_link = response.links.get('next')
+    
+    @staticmethod
+    def _last_page(response):
+        """Return (page count, last page url) if the Link header numbers its pages"""
+        last = response.links.get('last')
+        if not last or not response.links.get('next'):
+            return None, None
+        page = parse_qs(urlparse(last['url']).query).get('page', [''])[0]
+        if not page.isdigit():
+            return None, None
+        return int(page), last['url']
+    
+    def iter_subaccounts(self, account_id: int) -> Iterator[Dict]:
+        """Stream all subaccounts below an account"""
+        for sub in self._iter_paginated('iter_subaccounts', f"accounts/{account_id}/sub_accounts", recursive=True):
+            yield {
+                'id': sub['id'],
+                'name': sub['name'],
+                'parent_account_id': sub.get('parent_account_id'),
+                'workflow_state': sub.get('workflow_state', 'active')
+            }
+    
+    def iter_account_users(self, account_id: int) -> Iterator[Dict]:
+        """Stream all users of an account with their login and SIS ids"""
+        for user in self._iter_paginated('iter_account_users', f"accounts/{account_id}/users"):
+            yield {
+                'id': user['id'],
+                'name': user.get('name'),
+                'email': user.get('email'),
+                'login_id': user.get('login_id'),
+                'sis_user_id': user.get('sis_user_id')
+            }
+    
+    def iter_account_courses(self, account_id: int, include: List[str] = None, sort: str = None,
+                             order: str = None) -> Iterator[Dict]:
+        """Stream all courses in an account, in Canvas' order unless sort/order are given"""
+        params = {'state': COURSE_STATES}
+        if include:
+            params['include'] = include
+        if sort:
+            params['sort'] = sort
+        if order:
+            params['order'] = order
+        for course in self._iter_paginated('iter_account_courses', f"accounts/{account_id}/courses", **params):
+            yield {
+                'id': course['id'],
+                'name': course.get('name'),
+                'course_code': course.get('course_code'),
+                'workflow_state': course.get('workflow_state'),
+                'created_at': canvas_time(course['created_at']) if course.get('created_at') else None,
+                'account_id': course.get('account_id'),
+                'sis_course_id': course.get('sis_course_id')
+            }
+    
+    def summarize_account_courses(self, account_id: int) -> Dict:
+        """Count courses and find the newest created_at without keeping the list"""
+        count = 0
+        last_created_at = None
+        for course in self.iter_account_courses(account_id):
+            count += 1
+            created_at = course['created_at']
+            if created_at and (last_created_at is None or created_at > last_created_at):
+                last_created_at = created_at
+        return {'count': count, 'last_created_at': last_created_at}
+    
+    def count_subaccounts(self, account_id: int) -> int:
+        """Count subaccounts without keeping the list"""
+        return sum(1 for _ in self.iter_subaccounts(account_id))
+    
     def list_subaccounts(self, account_id: int) -> List[Dict]:
         """List all subaccounts"""
         try:
-            account = self.canvas.get_account(account_id)
-            subaccounts = []
-            
-            for sub in account.get_subaccounts(recursive=True):
-                subaccounts.append({
-                    'id': sub.id,
-                    'name': sub.name,
-                    'parent_account_id': sub.parent_account_id,
-                    'workflow_state': getattr(sub, 'workflow_state', 'active')
-                })
-            
-            return subaccounts
+            return list(self.iter_subaccounts(account_id))
         except CanvasException as e:
             logger.error(f"Failed to list subaccounts: {e}")
             raise
@@ -189,32 +527,112 @@ class CanvasClient:
     def get_account_courses(self, account_id: int, include_subaccounts: bool = True) -> List[Dict]:
         """Get all courses in an account"""
         try:
-            account = self.canvas.get_account(account_id)
-            courses = []
+            return list(self.iter_account_courses(account_id, include=['term', 'teachers']))
+        except CanvasException as e:
+            logger.error(f"Failed to get courses: {e}")
+            raise
+    
+    def get_course_by_sis_id(self, sis_course_id: str) -> Dict:
+        """Get a course by its SIS id"""
+        try:
+            course = self.canvas.get_course(sis_course_id, use_sis_id=True)
+            found = {
+                'id': course.id,
+                'name': course.name,
+                'course_code': course.course_code,
+                'workflow_state': course.workflow_state,
+                'sis_course_id': sis_course_id,
+                'account_id': getattr(course, 'account_id', None)
+            }
+            # Covers courses created by SIS imports and adopted after a failed create
+            created_at = getattr(course, 'created_at', None)
+            inventory.add_courses(self.environment or 'default',
+                                  [{**found, 'created_at': canvas_time(created_at) if created_at else None}])
+            return found
+        except CanvasException as e:
+            logger.error(f"Failed to get course {sis_course_id}: {e}")
+            raise
+    
+    def list_course_enrollments(self, course_id: int) -> List[Dict]:
+        """List enrollments in a course, including the enrolled users"""
+        try:
+            course = self._course(course_id)
+            enrollments = []
             
-            # Get courses with additional info
-            for course in account.get_courses(
-                include=['term', 'teachers'],
-                state=['available', 'completed', 'unpublished']
-            ):
-                courses.append({
-                    'id': course.id,
-                    'name': course.name,
-                    'course_code': course.course_code,
-                    'workflow_state': course.workflow_state,
-                    'created_at': course.created_at,
-                    'account_id': course.account_id
+            for enrollment in course.get_enrollments():
+                user = getattr(enrollment, 'user', {}) or {}
+                enrollments.append({
+                    'id': enrollment.id,
+                    'user_id': enrollment.user_id,
+                    'course_id': enrollment.course_id,
+                    'course_section_id': getattr(enrollment, 'course_section_id', None),
+                    'role': enrollment.role,
+                    'state': enrollment.enrollment_state,
+                    'user': {
+                        'id': user.get('id', enrollment.user_id),
+                        'name': user.get('name'),
+                        'login_id': user.get('login_id'),
+                        'sis_user_id': user.get('sis_user_id')
+                    }
                 })
             
-            return courses
+            return enrollments
         except CanvasException as e:
-            logger.error(f"Failed to get courses: {e}")
+            logger.error(f"Failed to list enrollments: {e}")
             raise
     
+    def create_sis_import(self, account_id: int, archive: bytes, filename: str = 'sis_import.zip', **kwargs) -> Dict:
+        """Upload a zipped set of SIS CSV files"""
+        try:
+            account = self._account(account_id)
+            sis_import = account.create_sis_import(
+                (filename, io.BytesIO(archive), 'application/zip'),
+                import_type='instructure_csv',
+                extension='zip',
+                **kwargs
+            )
+            return self._sis_import_dict(sis_import)
+        except CanvasException as e:
+            logger.error(f"Failed to create SIS import: {e}")
+            raise
+    
+    def get_sis_import(self, account_id: int, import_id: int) -> Dict:
+        """Get the current state of an SIS import"""
+        try:
+            account = self._account(account_id)
+            return self._sis_import_dict(account.get_sis_import(import_id))
+        except CanvasException as e:
+            logger.error(f"Failed to get SIS import {import_id}: {e}")
+            raise
+    
+    def wait_for_sis_import(self, account_id: int, import_id: int, timeout: int = None, interval: float = None) -> Dict:
+        """Poll an SIS import until Canvas has finished processing it"""
+        timeout = timeout or Config.SIS_IMPORT_TIMEOUT
+        interval = interval or Config.SIS_IMPORT_POLL_INTERVAL
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            sis_import = self.get_sis_import(account_id, import_id)
+            if sis_import['workflow_state'] in SIS_IMPORT_FINISHED_STATES:
+                return sis_import
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"SIS import {import_id} did not finish within {timeout}s")
+            time.sleep(interval)
+    
+    @staticmethod
+    def _sis_import_dict(sis_import) -> Dict:
+        return {
+            'id': sis_import.id,
+            'workflow_state': sis_import.workflow_state,
+            'progress': getattr(sis_import, 'progress', 0),
+            'processing_errors': getattr(sis_import, 'processing_errors', None) or [],
+            'processing_warnings': getattr(sis_import, 'processing_warnings', None) or []
+        }
+    
     def create_term(self, account_id: int, name: str, start_at: str, end_at: str) -> Dict:
         """Create an enrollment term"""
         try:
-            account = self.canvas.get_account(account_id)
+            account = self._account(account_id)
             
             # Note: Creating terms requires account admin permissions
             term = account.create_enrollment_term(
@@ -242,25 +660,15 @@ class CanvasClient:
                 root = self.get_root_account()
                 account_id = root['id']
             
-            # Count subaccounts
-            subaccounts = self.list_subaccounts(account_id)
-            
-            # Count courses
-            courses = self.get_account_courses(account_id)
-            
-            # Get recent activity (last created course)
-            last_activity = None
-            if courses:
-                # Sort by created_at and get the most recent
-                sorted_courses = sorted(courses, key=lambda x: x.get('created_at', ''), reverse=True)
-                if sorted_courses and sorted_courses[0].get('created_at'):
-                    last_activity = sorted_courses[0]['created_at']
+            # Count subaccounts and courses without materialising either list
+            subaccounts = self.count_subaccounts(account_id)
+            courses = self.summarize_account_courses(account_id)
             
             return {
-                'subaccounts': len(subaccounts),
-                'courses': len(courses),
-                'lastActivity': last_activity,
-                'status': 'in-use' if (subaccounts or courses) else 'clean'
+                'subaccounts': subaccounts,
+                'courses': courses['count'],
+                'lastActivity': courses['last_created_at'],
+                'status': 'in-use' if (subaccounts or courses['count']) else 'clean'
             }
         except Exception as e:
             logger.error(f"Failed to get environment status: {e}")
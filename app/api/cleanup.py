@@ -0,0 +1,154 @@
+from app.api.canvas_client import CanvasClient
+from app.api.provisioning import run_bounded
+from app.api.user_pool import pool_enabled, user_pool
+from app.config import Config
+from app.models.inventory import inventory
+from app.models.request_store import request_store
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+def delete_courses(client: CanvasClient, courses: Iterable, batch_size: Optional[int] = None,
+                   max_workers: Optional[int] = None) -> List[Dict]:
+    """Delete courses with account-level batch calls, one result per course.
+
+    courses are course records (with 'id' and optionally 'account_id') or
+    plain ids. Courses are grouped per account and deleted in chunks of
+    batch_size through one asynchronous batch update each, whose progress
+    is polled until Canvas finishes. Chunks whose batch call or progress
+    fails are retried as parallel single deletes.
+
+    Returns [{'course_id', 'deleted', 'error', 'method'}] in input order.
+    """
+    batch_size = batch_size or Config.COURSE_BATCH_SIZE
+    by_account: Dict[int, List[int]] = {}
+    order = []
+    for course in courses:
+        course_id, account_id = (course['id'], course.get('account_id')) if isinstance(course, dict) else (course, None)
+        by_account.setdefault(account_id or Config.ROOT_ACCOUNT_ID, []).append(course_id)
+        order.append(course_id)
+
+    results: Dict[int, Dict] = {}
+    fallback = []
+    for account_id, course_ids in by_account.items():
+        for start in range(0, len(course_ids), batch_size):
+            chunk = course_ids[start:start + batch_size]
+            try:
+                batch_results = _delete_batch(client, account_id, chunk)
+            except Exception as e:
+                logger.warning(f"Batch delete of {len(chunk)} courses in account {account_id} failed, "
+                               f"deleting them one by one: {e}")
+                fallback.extend(chunk)
+                continue
+            results.update(batch_results)
+            inventory.remove_courses(client.environment or 'default',
+                                     [course_id for course_id, outcome in batch_results.items() if outcome['deleted']])
+
+    for course_id, _, error in run_bounded(client.delete_course, fallback, max_workers):
+        results[course_id] = {
+            'course_id': course_id,
+            'deleted': error is None,
+            'error': str(error) if error else None,
+            'method': 'single'
+        }
+
+    return [results[course_id] for course_id in order]
+
+def cleanup_request_resources(client: CanvasClient, request_obj: Dict, reason: Optional[str] = None) -> Dict:
+    """Delete a request's courses, recycle its users and mark the request cleaned.
+
+    request_obj is a request record including its created_resources. The
+    results are saved as the record's cleanup_results and returned; reason
+    (e.g. 'expired') is saved as cleanup_reason when given. The request is
+    only marked cleaned once every course is gone: when a delete fails, its
+    cleanup_attempts goes up, cleanup_error says why, and the next attempt
+    deletes just the courses still left.
+    """
+    request_id = request_obj['id']
+    results = {
+        "deleted_courses": 0,
+        "deleted_users": 0,
+        "errors": []
+    }
+
+    # Delete courses, batched per account, skipping those an earlier attempt already deleted
+    deleted_before = [outcome for outcome in (request_obj.get('cleanup_results') or {}).get('courses', [])
+                      if outcome['deleted']]
+    skip = {outcome['course_id'] for outcome in deleted_before}
+    courses = [course for course in request_obj['created_resources'].get('courses', []) if course['id'] not in skip]
+    results['courses'] = deleted_before + delete_courses(client, courses)
+    course_errors = []
+    for outcome in results['courses']:
+        if outcome['deleted']:
+            results['deleted_courses'] += 1
+        else:
+            error_msg = f"Failed to delete course {outcome['course_id']}: {outcome['error']}"
+            logger.error(error_msg)
+            course_errors.append(error_msg)
+    results['errors'].extend(course_errors)
+    logger.info(f"Deleted {results['deleted_courses']} courses from request {request_id}")
+
+    # Note: Canvas doesn't allow deleting users via API
+    # We'll mark them as deleted in our tracking
+    users = request_obj['created_resources'].get('users', [])
+    results['deleted_users'] = len(users)
+
+    # With a warm pool, the now unenrolled users are renamed and reused for later requests
+    # (skipped when a course survived, since its users would still be enrolled there).
+    # Requester-scoped users are kept as they are for the requester's next request.
+    requester_scoped = request_obj.get('user_suffix') not in (None, request_id[-8:])
+    releasable = [user for user in users if user.get('pool') or not requester_scoped]
+    if pool_enabled(request_obj.get('environment')) and releasable and not results['errors']:
+        recycled = user_pool.release(request_obj.get('environment'), releasable)
+        results['recycled_users'] = recycled['recycled']
+        results['errors'].extend(recycled['errors'])
+
+    # Update request status; with courses left in Canvas it stays uncleaned for a retry
+    results['cleaned'] = not course_errors
+    changes = {'cleanup_results': results}
+    if course_errors:
+        changes['cleanup_attempts'] = request_obj.get('cleanup_attempts', 0) + 1
+        changes['cleanup_error'] = '; '.join(course_errors)
+    else:
+        changes['cleaned'] = True
+        changes['cleaned_at'] = datetime.now().isoformat()
+    if reason:
+        changes['cleanup_reason'] = reason
+    request_store.update(request_id, changes)
+    return results
+
+def _delete_batch(client: CanvasClient, account_id: int, course_ids: List[int]) -> Dict[int, Dict]:
+    """Delete one chunk through a batch update and map the outcome back to each course"""
+    progress = client.batch_update_courses(account_id, course_ids, event='delete')
+    progress = client.wait_for_progress(progress['id'])
+    if progress['workflow_state'] != 'completed':
+        raise RuntimeError(progress.get('message') or f"Progress {progress['id']} {progress['workflow_state']}")
+
+    failures = _batch_failures(progress.get('message'), course_ids)
+    return {
+        course_id: {
+            'course_id': course_id,
+            'deleted': course_id not in failures,
+            'error': failures.get(course_id),
+            'method': 'batch'
+        }
+        for course_id in course_ids
+    }
+
+def _batch_failures(message: Optional[str], course_ids: List[int]) -> Dict[int, str]:
+    """Parse per-course errors from a batch progress message.
+
+    Canvas reports the processed count on the first line, then one line
+    per error of the form "<error>: <id>, <id>, ...".
+    """
+    failures = {}
+    wanted = {str(course_id): course_id for course_id in course_ids}
+    for line in (message or '').splitlines()[1:]:
+        error, _, ids = line.rpartition(':')
+        for value in re.findall(r'\d+', ids):
+            if value in wanted:
+                failures[wanted[value]] = error.strip() or line.strip()
+    return failures
@@ -0,0 +1,71 @@
+from app.api.canvas_client import CanvasClient
+from app.config import Config
+from app.metrics import COUNTER, GAUGE, metrics
+from typing import Dict, Optional, Tuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENVIRONMENT = 'default'
+
+class ClientRegistry:
+    """Process-wide pool of long-lived CanvasClients, one per environment"""
+
+    def __init__(self):
+        # Each client with the (base_url, token) it was built with
+        self._clients: Dict[str, Tuple[Tuple[str, str], CanvasClient]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, environment: Optional[str] = None) -> CanvasClient:
+        """Return the shared client for an environment.
+
+        Credentials are resolved on every call, so the client is rebuilt when
+        the environment's URL or token in os.environ differs from the one it
+        was built with. The .env file is only read at startup.
+        """
+        key = environment or DEFAULT_ENVIRONMENT
+        if key != DEFAULT_ENVIRONMENT and key not in Config.TEST_ENVIRONMENTS:
+            raise ValueError(f"Unknown environment: {environment}")
+
+        base_url, token = Config.canvas_credentials(environment)
+        if not base_url or not token:
+            raise ValueError(f"No Canvas credentials configured for environment {key}")
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and entry[0] == (base_url, token):
+                return entry[1]
+
+            # Other threads may still have calls in flight on the old client, so it is only
+            # swapped out; its connections close once they finish and it is garbage-collected
+            if entry is not None:
+                logger.info(f"Canvas credentials changed for {key}, rebuilding client")
+
+            client = CanvasClient(base_url=base_url, token=token, environment=key)
+            self._clients[key] = ((base_url, token), client)
+            return client
+
+    def rate_limits(self) -> Dict[str, Dict]:
+        """Current Canvas rate limit budget and concurrency cap per environment"""
+        with self._lock:
+            clients = dict(self._clients)
+        return {key: client.rate_limit.stats() for key, (_, client) in clients.items()}
+
+registry = ClientRegistry()
+
+def get_client(environment: Optional[str] = None) -> CanvasClient:
+    """Get the pooled CanvasClient for an environment"""
+    return registry.get(environment)
+
+def _collect_metrics():
+    for environment, stats in registry.rate_limits().items():
+        labels = {'environment': environment}
+        yield 'canvas_rate_limit_remaining', GAUGE, 'Last X-Rate-Limit-Remaining Canvas reported', labels, stats['remaining']
+        yield 'canvas_concurrency_limit', GAUGE, 'Current adaptive cap on in-flight Canvas requests', labels, stats['limit']
+        yield 'canvas_in_flight', GAUGE, 'Canvas requests currently in flight', labels, stats['in_flight']
+        for name in ('throttled', 'increases', 'decreases'):
+            yield 'canvas_rate_limit_events_total', COUNTER, 'Throttled responses and concurrency cap changes', \
+                {**labels, 'event': name}, stats[name]
+
+metrics.collector(_collect_metrics)
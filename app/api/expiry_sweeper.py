@@ -0,0 +1,139 @@
+"""Automatic cleanup of requests whose end_date has passed.
+
+Every CLEANUP_SWEEP_INTERVAL seconds inside the off-peak CLEANUP_WINDOW,
+the sweeper queues one cleanup job, unless one is still queued or running
+in any process. The job takes up to CLEANUP_SWEEP_BATCH expired, uncleaned
+requests from the end_date index and cleans up CLEANUP_MAX_WORKERS of them
+at a time, exactly like the cleanup button does. Course deletion goes
+through the same batched, rate-limited Canvas calls. A request whose
+cleanup raises or leaves courses behind is retried by later sweeps up to
+CLEANUP_MAX_ATTEMPTS times.
+"""
+from app.api.cleanup import cleanup_request_resources
+from app.api.client_registry import get_client
+from app.api.jobs import JobContext, job_queue
+from app.api.provisioning import run_bounded
+from app.config import Config
+from app.metrics import metrics
+from app.models.request_store import request_store
+from datetime import datetime, time as dt_time
+from typing import Dict, Optional
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = 'cleanup_expired'
+
+CLEANUP_REASON = 'expired'
+
+metrics.counter('expired_cleanups_total', 'Expired requests cleaned up automatically, by outcome')
+
+def parse_window(window: str) -> Optional[tuple]:
+    """'22:00-06:00' -> (time(22, 0), time(6, 0)); None for an empty window (any time)"""
+    if not window or not window.strip():
+        return None
+    try:
+        start, end = (dt_time.fromisoformat(part.strip()) for part in window.split('-'))
+    except ValueError as e:
+        raise ValueError(f"Invalid cleanup window '{window}', expected HH:MM-HH:MM") from e
+    return start, end
+
+def in_window(window: str, now: datetime = None) -> bool:
+    """Whether now falls inside the window; windows may wrap past midnight"""
+    bounds = parse_window(window)
+    if bounds is None:
+        return True
+    start, end = bounds
+    current = (now or datetime.now()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+def cleanup_expired(job: JobContext, payload: Dict) -> Dict:
+    """Job handler: clean up one batch of expired requests"""
+    today = datetime.now().date().isoformat()
+    limit = payload.get('limit') or Config.CLEANUP_SWEEP_BATCH
+    candidates = request_store.expired(today, limit, max_attempts=Config.CLEANUP_MAX_ATTEMPTS)
+    job.phase('cleanup', len(candidates))
+
+    def clean(summary):
+        record = request_store.get(summary['id'], include=('created_resources',))
+        if record is None or record.get('cleaned'):
+            return None
+        try:
+            client = get_client(record.get('environment'))
+            return cleanup_request_resources(client, record, reason=CLEANUP_REASON)
+        except Exception as e:
+            request_store.update(record['id'], {'cleanup_attempts': record.get('cleanup_attempts', 0) + 1,
+                                                'cleanup_error': str(e)})
+            raise
+
+    cleaned = []
+    failed = []
+    for summary, results, error in run_bounded(clean, candidates, Config.CLEANUP_MAX_WORKERS):
+        if error is not None:
+            logger.error(f"Automatic cleanup of expired request {summary['id']} failed: {error}")
+            metrics.inc('expired_cleanups_total', outcome='error')
+            failed.append({'request_id': summary['id'], 'error': str(error)})
+            job.advance('cleanup', done=0, failed=1, event='cleanup_failed', request_id=summary['id'],
+                        error=str(error))
+            continue
+        if results is None:
+            job.advance('cleanup', event='cleanup_skipped', request_id=summary['id'])
+            continue
+        if not results['cleaned']:
+            # Some courses are still in Canvas; a later sweep retries them
+            logger.error(f"Automatic cleanup of expired request {summary['id']} left courses behind: "
+                         f"{results['errors']}")
+            metrics.inc('expired_cleanups_total', outcome='partial')
+            failed.append({'request_id': summary['id'], 'error': '; '.join(results['errors'])})
+            job.advance('cleanup', done=0, failed=1, event='cleanup_failed', request_id=summary['id'],
+                        deleted_courses=results['deleted_courses'], errors=len(results['errors']))
+            continue
+        metrics.inc('expired_cleanups_total', outcome='ok')
+        cleaned.append(summary['id'])
+        job.advance('cleanup', event='request_cleaned', request_id=summary['id'],
+                    deleted_courses=results['deleted_courses'], errors=len(results['errors']))
+
+    logger.info(f"Cleaned up {len(cleaned)} of {len(candidates)} expired requests")
+    return {'expired_before': today, 'candidates': len(candidates), 'cleaned': cleaned, 'failed': failed}
+
+job_queue.register(JOB_KIND, cleanup_expired)
+
+class ExpirySweeper:
+    """Queues cleanup_expired jobs inside the cleanup window"""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+
+    def sweep(self, now: datetime = None) -> Optional[str]:
+        """Queue a cleanup job if the window is open and none is pending; returns its id"""
+        if not in_window(Config.CLEANUP_WINDOW, now):
+            return None
+        return job_queue.enqueue_unique(JOB_KIND, {'limit': Config.CLEANUP_SWEEP_BATCH})
+
+    def start(self):
+        """Start the background sweeper in this process"""
+        if self._thread or Config.CLEANUP_SWEEP_INTERVAL <= 0:
+            return
+        parse_window(Config.CLEANUP_WINDOW)
+        self._thread = threading.Thread(target=self._work, name='expiry-sweeper', daemon=True)
+        self._thread.start()
+        logger.info(f"Started expiry sweeper (window {Config.CLEANUP_WINDOW or 'any time'})")
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self.sweep()
+                if job_id:
+                    logger.info(f"Queued expired request cleanup {job_id}")
+            except Exception:
+                logger.exception("Expiry sweep failed")
+            self._stop.wait(Config.CLEANUP_SWEEP_INTERVAL)
+
+expiry_sweeper = ExpirySweeper()
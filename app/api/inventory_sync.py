@@ -0,0 +1,194 @@
+"""Keep the local inventory (app.models.inventory) in step with Canvas.
+
+CanvasClient records the app's own changes as they happen; the sync only
+has to find changes made elsewhere. An incremental sync lists courses
+newest first (sort=created_at, order=desc) and stops at the created_at
+watermark of the previous sync, so it reads just the pages holding new
+courses. The sort is not part of Canvas' documented API: an instance
+that ignores it is noticed by a first page that is not newest first,
+checked as a whole before the watermark is applied, and the sync then
+stops reading after that page, leaving courses created outside the app
+to the next full crawl. Course times are kept in Canvas' own format (see
+canvas_time) so they compare as strings. Subaccounts have no created_at
+to page by and are few, so every sync lists them in full.
+
+Deletions made outside the app are only found by a full crawl, which
+replaces the mirror every INVENTORY_FULL_SYNC_INTERVAL seconds and runs
+first for environments that have never been crawled.
+"""
+from app.api.canvas_client import PAGE_SIZE
+from app.api.client_registry import get_client
+from app.api.jobs import JobContext, job_queue
+from app.config import Config
+from app.metrics import GAUGE, metrics
+from app.models.inventory import inventory
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from typing import Dict, Optional
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = 'sync_inventory'
+
+FULL = 'full'
+INCREMENTAL = 'incremental'
+
+metrics.counter('inventory_syncs_total', 'Inventory syncs by environment, mode and outcome')
+metrics.counter('inventory_drift_total', 'Subaccounts and courses a full crawl found changed outside the app')
+
+class InventorySync:
+    """Background catch-up of every environment's inventory"""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # Environments whose Canvas was seen ignoring sort=created_at
+        self._unsorted = set()
+
+    def sync(self, environment: str, full: Optional[bool] = None) -> Dict:
+        """Sync one environment; a full crawl when full, or when one is due if full is None"""
+        with self._lock(environment):
+            state = inventory.state(environment)
+            if full is None:
+                full = self._full_due(state)
+            mode = FULL if full else INCREMENTAL
+            try:
+                result = self._crawl(environment) if full else self._catch_up(environment, state)
+            except Exception:
+                metrics.inc('inventory_syncs_total', environment=environment, mode=mode, outcome='error')
+                raise
+            metrics.inc('inventory_syncs_total', environment=environment, mode=mode, outcome='ok')
+            return {'environment': environment, 'mode': mode, **result}
+
+    def status(self, environment: str) -> Dict:
+        """Environment status from the inventory, crawling Canvas first if it never has been"""
+        status = inventory.status(environment)
+        if status is None:
+            self.sync(environment, full=True)
+            status = inventory.status(environment)
+        return status
+
+    def _crawl(self, environment: str) -> Dict:
+        client = get_client(environment)
+        crawled_before = inventory.status(environment) is not None
+        root = client.get_root_account()
+        accounts = list(client.iter_subaccounts(root['id']))
+        courses = list(client.iter_account_courses(root['id']))
+        drift = inventory.replace(environment, root['id'], accounts, courses)
+
+        # The first crawl has nothing to drift from
+        if crawled_before and any(drift.values()):
+            logger.warning(f"Inventory of {environment} had drifted from Canvas: {drift}")
+            for kind, count in drift.items():
+                if count:
+                    metrics.inc('inventory_drift_total', count, environment=environment, kind=kind)
+        return {'subaccounts': len(accounts), 'courses': len(courses), 'drift': drift}
+
+    def _catch_up(self, environment: str, state: Dict) -> Dict:
+        client = get_client(environment)
+        root_id = state['root_account_id']
+        watermark = state['course_watermark']
+
+        accounts = list(client.iter_subaccounts(root_id))
+        inventory.add_accounts(environment, accounts)
+
+        courses = client.iter_account_courses(root_id, sort='created_at', order='desc')
+        # Check the order over the whole first page before applying the watermark:
+        # an oldest-first listing would otherwise stop at its first, old course
+        first_page = list(islice(courses, PAGE_SIZE))
+        times = [course['created_at'] for course in first_page if course['created_at']]
+        ordered = times == sorted(times, reverse=True)
+        recent = []
+        if not ordered:
+            # Canvas ignored the sort: reading on would be a full crawl every interval,
+            # so outside changes wait for the next scheduled one instead
+            recent = first_page
+            courses = first_page = ()
+        previous = None
+        for course in chain(first_page, courses):
+            created_at = course['created_at']
+            if created_at and previous and created_at > previous:
+                # Out of order past the first page: stop here, as above
+                ordered = False
+                break
+            # Courses created in the same second as the watermark may still be new
+            if watermark and created_at and created_at < watermark:
+                break
+            previous = created_at or previous
+            recent.append(course)
+
+        added = inventory.add_courses(environment, recent)
+        newest = max((course['created_at'] for course in recent if course['created_at']), default=None)
+        inventory.mark_synced(environment, newest if ordered else None)
+        if not ordered and environment not in self._unsorted:
+            self._unsorted.add(environment)
+            logger.warning(f"Canvas for {environment} ignores sort=created_at; courses created outside the app "
+                           f"are picked up by the full crawl every {Config.INVENTORY_FULL_SYNC_INTERVAL}s")
+        return {'subaccounts': len(accounts), 'courses_read': len(recent), 'courses_added': added,
+                'sorted': ordered}
+
+    @staticmethod
+    def _full_due(state: Optional[Dict]) -> bool:
+        if state is None or state['full_synced_at'] is None or state['root_account_id'] is None:
+            return True
+        age = datetime.now() - datetime.fromisoformat(state['full_synced_at'])
+        return age >= timedelta(seconds=Config.INVENTORY_FULL_SYNC_INTERVAL)
+
+    @staticmethod
+    def _recently_synced(environment: str) -> bool:
+        """Whether this or another process synced the environment less than an interval ago"""
+        state = inventory.state(environment)
+        if state is None or state['synced_at'] is None:
+            return False
+        age = datetime.now() - datetime.fromisoformat(state['synced_at'])
+        return age < timedelta(seconds=Config.INVENTORY_SYNC_INTERVAL)
+
+    def _lock(self, environment: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(environment, threading.Lock())
+
+    def start(self):
+        """Start the background sync in this process"""
+        if self._thread or Config.INVENTORY_SYNC_INTERVAL <= 0:
+            return
+        self._thread = threading.Thread(target=self._work, name='inventory-sync', daemon=True)
+        self._thread.start()
+        logger.info('Started inventory sync')
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            # Environments without credentials would only fail and log every interval
+            for environment in Config.configured_environments():
+                if self._recently_synced(environment):
+                    continue
+                try:
+                    self.sync(environment)
+                except Exception:
+                    logger.exception(f"Inventory sync for {environment} failed")
+            self._stop.wait(Config.INVENTORY_SYNC_INTERVAL)
+
+inventory_sync = InventorySync()
+
+def sync_inventory(job: JobContext, payload: Dict) -> Dict:
+    """Job handler: sync one environment's inventory now"""
+    job.phase('sync', 1)
+    result = inventory_sync.sync(payload['environment'], full=payload.get('full'))
+    job.advance('sync', event='inventory_synced', mode=result['mode'])
+    return result
+
+job_queue.register(JOB_KIND, sync_inventory)
+
+def _collect_metrics():
+    for environment, stats in inventory.stats().items():
+        labels = {'environment': environment}
+        yield 'inventory_courses', GAUGE, 'Courses in the local inventory', labels, stats['courses']
+        yield 'inventory_subaccounts', GAUGE, 'Subaccounts in the local inventory', labels, stats['subaccounts']
+
+metrics.collector(_collect_metrics)
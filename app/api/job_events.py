@@ -0,0 +1,69 @@
+"""Fan-out of job progress events to Server-Sent Events watchers.
+
+One poller thread per process looks up the newest event of every watched
+job in a single query each SSE_POLL_INTERVAL and wakes the watchers of
+jobs that moved on, so the database sees one query per interval however
+many browsers are watching. Watchers wait on a condition between events
+instead of polling, and read the new events once they are woken.
+"""
+from app.api.jobs import job_queue
+from app.config import Config
+from contextlib import contextmanager
+from typing import Dict
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class JobEventHub:
+    """Wakes the watchers of a job when it has new progress events"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._watchers: Dict[str, int] = {}
+        self._latest: Dict[str, int] = {}
+        self._thread = None
+
+    @contextmanager
+    def watching(self, job_id: str):
+        """Register a watcher of job_id for the duration of a stream"""
+        with self._condition:
+            self._watchers[job_id] = self._watchers.get(job_id, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, name='job-event-poller', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._watchers[job_id] -= 1
+                if not self._watchers[job_id]:
+                    del self._watchers[job_id]
+                    self._latest.pop(job_id, None)
+
+    def wait(self, job_id: str, after_id: int, timeout: float) -> bool:
+        """Block until job_id has an event newer than after_id; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._latest.get(job_id, 0) > after_id, timeout)
+
+    def _poll(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._watchers)
+                job_ids = list(self._watchers)
+            try:
+                latest = job_queue.latest_event_ids(job_ids)
+            except Exception:
+                logger.exception('Polling job events failed')
+                latest = {}
+            with self._condition:
+                moved = {job_id: event_id for job_id, event_id in latest.items()
+                         if job_id in self._watchers and event_id > self._latest.get(job_id, 0)}
+                if moved:
+                    self._latest.update(moved)
+                    self._condition.notify_all()
+                # Woken early when a new watcher registers
+                self._condition.wait(Config.SSE_POLL_INTERVAL)
+
+job_event_hub = JobEventHub()
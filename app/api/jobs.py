@@ -0,0 +1,322 @@
+"""Persistent background job queue.
+
+Jobs are rows in the app database, so queued work survives restarts and
+can be picked up by worker threads in any process. Run workers outside
+the web process with app.worker:
+
+    python -m app.worker
+"""
+from app.config import Config
+from app.models.database import Database, get_database
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id);
+"""
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+class JobContext:
+    """Handed to job handlers to report per-phase progress and partial results"""
+
+    def __init__(self, queue: 'JobQueue', job: Dict):
+        self.queue = queue
+        self.job = job
+        self.progress = job['progress']
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._started = time.monotonic()
+        self._events = []
+
+    @property
+    def id(self) -> str:
+        return self.job['id']
+
+    def phase(self, phase_name: str, total: int = 0):
+        """Start (or restart) tracking a phase"""
+        with self._lock:
+            self.progress.setdefault('phases', {})[phase_name] = {'done': 0, 'total': total, 'failed': 0}
+            self.progress['current_phase'] = phase_name
+        self.flush()
+
+    def advance(self, phase_name: str, done: int = 1, failed: int = 0, event: str = None, **details):
+        """Record finished items in a phase, optionally emitting a progress event"""
+        with self._lock:
+            phase = self.progress.setdefault('phases', {}).setdefault(phase_name, {'done': 0, 'total': 0, 'failed': 0})
+            phase['done'] += done
+            phase['failed'] += failed
+            finished = phase['total'] and phase['done'] + phase['failed'] >= phase['total']
+            if event:
+                self._events.append((event, {'phase': phase_name, **details, **self._overall()}))
+        self.flush(force=bool(finished))
+
+    def event(self, event: str, **details):
+        """Emit a progress event without changing any counts"""
+        with self._lock:
+            self._events.append((event, {**details, **self._overall()}))
+        self.flush(force=False)
+
+    def _overall(self) -> Dict:
+        """Counts across all phases plus throughput and ETA; caller holds the lock"""
+        phases = self.progress.get('phases', {}).values()
+        total = sum(p['total'] for p in phases)
+        finished = sum(p['done'] + p['failed'] for p in phases)
+        elapsed = time.monotonic() - self._started
+        throughput = finished / elapsed if elapsed > 0 else 0
+        remaining = max(total - finished, 0)
+        return {
+            'done': finished,
+            'total': total,
+            'throughput': round(throughput, 2),
+            'eta_seconds': round(remaining / throughput, 1) if throughput else None
+        }
+
+    def flush(self, force: bool = True):
+        """Persist progress and buffered events, at most every JOB_PROGRESS_INTERVAL seconds unless forced"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_flush < Config.JOB_PROGRESS_INTERVAL:
+                return
+            self._last_flush = now
+            progress = json.loads(json.dumps(self.progress))
+            events, self._events = self._events, []
+        self.queue.save_progress(self.id, progress, events)
+
+class JobQueue:
+    """SQLite-backed job queue with leased, restart-safe claims"""
+
+    def __init__(self, database: Database = None):
+        self._database = database
+        self._handlers: Dict[str, Callable] = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def db(self) -> Database:
+        database = self._database or get_database()
+        database.ensure_schema('jobs', SCHEMA)
+        return database
+
+    def register(self, kind: str, handler: Callable[[JobContext, Dict], Optional[Dict]]):
+        """Register the function that runs jobs of a kind"""
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Dict, job_id: str = None) -> str:
+        """Queue a job and return its id"""
+        job_id = job_id or str(uuid.uuid4())
+        with self.db.transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, kind, QUEUED, json.dumps(payload), datetime.now().isoformat())
+            )
+        self._wakeup.set()
+        return job_id
+
+    def enqueue_unique(self, kind: str, payload: Dict) -> Optional[str]:
+        """Queue a job unless one of the same kind is queued or running; returns its id, or None if skipped"""
+        job_id = str(uuid.uuid4())
+        with self.db.transaction() as conn:
+            active = conn.execute(
+                'SELECT id FROM jobs WHERE status IN (?, ?) AND kind = ? LIMIT 1', (QUEUED, RUNNING, kind)
+            ).fetchone()
+            if active is not None:
+                return None
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, kind, QUEUED, json.dumps(payload), datetime.now().isoformat())
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self.db.connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def save_progress(self, job_id: str, progress: Dict, events: List[Tuple[str, Dict]] = ()):
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET progress = ?, lease_until = ? WHERE id = ?',
+                (json.dumps(progress), self._lease(), job_id)
+            )
+            conn.executemany(
+                'INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)',
+                [(job_id, event, json.dumps(data), now) for event, data in events]
+            )
+
+    def latest_event_ids(self, job_ids: List[str]) -> Dict[str, int]:
+        """Id of the newest progress event of each job that has any"""
+        if not job_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in job_ids)
+        rows = self.db.connection().execute(
+            f'SELECT job_id, MAX(id) AS latest FROM job_events WHERE job_id IN ({placeholders}) GROUP BY job_id',
+            list(job_ids)
+        ).fetchall()
+        return {row['job_id']: row['latest'] for row in rows}
+
+    def events_since(self, job_id: str, after_id: int = 0, limit: int = 500) -> List[Dict]:
+        """Progress events of a job newer than after_id, oldest first"""
+        rows = self.db.connection().execute(
+            'SELECT id, type, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?',
+            (job_id, after_id, limit)
+        ).fetchall()
+        return [{'id': row['id'], 'type': row['type'], 'data': json.loads(row['data'])} for row in rows]
+
+    def claim(self) -> Optional[Dict]:
+        """Take the oldest queued job, or a running job whose worker stopped renewing its lease"""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) '
+                'ORDER BY created_at LIMIT 1',
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            if row['status'] == RUNNING:
+                logger.warning(f"Reclaiming job {row['id']} abandoned by {row['worker']}")
+            conn.execute(
+                'UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, '
+                'started_at = COALESCE(started_at, ?) WHERE id = ?',
+                (RUNNING, self.worker_name, self._lease(), now, row['id'])
+            )
+        job = self._job(row)
+        job['status'] = RUNNING
+        return job
+
+    def finish(self, job_id: str, status: str, result: Dict = None, error: str = None):
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, now, job_id)
+            )
+            # Terminal event so stream watchers know to stop
+            conn.execute(
+                'INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, 'job_finished', json.dumps({'status': status, 'result': result, 'error': error}), now)
+            )
+
+    def run_one(self) -> bool:
+        """Claim and run a single job; returns False when the queue is empty"""
+        job = self.claim()
+        if job is None:
+            return False
+
+        handler = self._handlers.get(job['kind'])
+        if handler is None:
+            self.finish(job['id'], FAILED, error=f"No handler for job kind {job['kind']}")
+            return True
+
+        context = JobContext(self, job)
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], done), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(context, job['payload'])
+            context.flush()
+            self.finish(job['id'], COMPLETED, result=result)
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed")
+            context.flush()
+            self.finish(job['id'], FAILED, error=str(e))
+        finally:
+            done.set()
+        return True
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        """Keep renewing the lease so long silent phases aren't reclaimed"""
+        while not done.wait(Config.JOB_LEASE_SECONDS / 3):
+            try:
+                with self.db.transaction() as conn:
+                    conn.execute('UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?',
+                                 (self._lease(), job_id, RUNNING))
+            except Exception:
+                logger.exception(f"Failed to renew lease for job {job_id}")
+
+    def start(self, workers: int = None):
+        """Start background worker threads in this process"""
+        workers = Config.JOB_WORKERS if workers is None else workers
+        if self._threads or workers <= 0:
+            return
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {workers} job workers as {self.worker_name}")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_one():
+                    continue
+            except Exception:
+                logger.exception("Job worker error")
+            # Sleep until new work is queued in this process, polling for work queued elsewhere
+            self._wakeup.wait(Config.JOB_POLL_INTERVAL)
+            self._wakeup.clear()
+
+    @staticmethod
+    def _lease() -> str:
+        return (datetime.now() + timedelta(seconds=Config.JOB_LEASE_SECONDS)).isoformat()
+
+    @staticmethod
+    def _job(row) -> Dict:
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'payload': json.loads(row['payload']),
+            'progress': json.loads(row['progress'] or '{}'),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+
+job_queue = JobQueue()
@@ -0,0 +1,125 @@
+"""Dry-run planning: which Canvas calls a request would make and how long it would take.
+
+Durations come from the recent mean latency of each CanvasClient operation
+in this process (see app.metrics), falling back to DEFAULT_LATENCIES for
+operations that haven't run here yet.
+"""
+from app.api.client_registry import registry
+from app.api.provisioning import BACKEND_REST, BACKEND_SIS_IMPORT, build_user_specs, select_backend, user_suffix
+from app.api.user_pool import pool_enabled, user_pool
+from app.config import Config
+from app.metrics import metrics
+from app.models.user_index import user_index
+from typing import Dict, List, Optional
+
+# Seconds per call assumed until an operation has been measured
+DEFAULT_LATENCY = 0.5
+DEFAULT_LATENCIES = {
+    'create_sis_import': 2.0,
+    'wait_for_sis_import': 120.0,
+    'list_course_enrollments': 1.0,
+    'content_copy': 60.0
+}
+
+# Placeholder request id; only the shape of the generated ids matters for planning
+PLAN_REQUEST_ID = 'REQ-PLAN-00000000'
+
+def plan_request(data: Dict) -> Dict:
+    """Plan a TestEnvironmentRequest (as submitted to /api/submit-request)"""
+    environment = data.get('environment')
+    courses = data['courses']
+    backend = select_backend(courses)
+    steps = []
+
+    if data['subaccount'].get('create'):
+        steps.append(_step('create_subaccount', 1))
+
+    if backend == BACKEND_SIS_IMPORT:
+        # One import for everything, then one lookup and one enrollment listing per course
+        steps.append(_step('create_sis_import', 1))
+        steps.append(_step('wait_for_sis_import', 1))
+        steps.append(_step('get_course_by_sis_id', len(courses)))
+        steps.append(_step('list_course_enrollments', len(courses)))
+    else:
+        suffix = user_suffix(PLAN_REQUEST_ID, data.get('requester'))
+        students = set()
+        users = set()
+        enrollments = 0
+        for course_config in courses:
+            for spec in build_user_specs(PLAN_REQUEST_ID, course_config, suffix):
+                users.add(spec['login_id'])
+                if spec['role'] == 'StudentEnrollment':
+                    students.add(spec['login_id'])
+                enrollments += 1
+
+        # Users the requester already has are reused, and the pool covers the remaining students
+        known = set(user_index.known_logins(environment or 'default', users))
+        students -= known
+        pooled = min(len(students), user_pool.depth(environment)) if pool_enabled(environment) else 0
+        steps.append(_step('create_course', len(courses)))
+        steps.append(_step('create_user', len(users) - len(known) - pooled, parallel=True))
+        steps.append(_step('enroll_user', enrollments, parallel=True))
+
+    if Config.SCENARIO_TEMPLATES.get(data.get('scenario')):
+        steps.append(_step('copy_course_content', len(courses), parallel=True))
+        steps.append(_step('content_copy', 1, calls=0))
+
+    return _plan(environment, backend, steps)
+
+def plan_setup(config) -> Dict:
+    """Plan a TestEnvironmentConfig (as posted to /api/setup)"""
+    # Objects of one kind rarely depend on each other, so the graph runs each kind in parallel
+    steps = [
+        _step('create_subaccount', len(config.subaccounts), parallel=True),
+        _step('create_course', len(config.courses), parallel=True),
+        _step('create_user', len(config.users or []), parallel=True),
+        _step('enroll_user', len(config.enrollments or []), parallel=True)
+    ]
+    return _plan(config.environment, BACKEND_REST, steps)
+
+def _step(operation: str, count: int, parallel: bool = False, calls: Optional[int] = None) -> Dict:
+    """One kind of operation; calls is the number of Canvas calls if it differs from count"""
+    return {'operation': operation, 'count': count, 'parallel': parallel,
+            'calls': count if calls is None else calls}
+
+def _plan(environment: Optional[str], backend: str, steps: List[Dict]) -> Dict:
+    steps = [step for step in steps if step['count'] > 0]
+    concurrency = _concurrency(environment)
+
+    for step in steps:
+        operation = step['operation']
+        measured = metrics.recent('canvas_call_seconds', operation=operation, outcome='ok',
+                                  environment=environment or 'default')
+        if measured is None:
+            measured = metrics.recent('provisioning_wait_seconds', operation=operation, outcome='ok',
+                                      environment=environment or 'default')
+        step['latency'] = round(measured if measured is not None else DEFAULT_LATENCIES.get(operation, DEFAULT_LATENCY), 3)
+        step['latency_source'] = 'measured' if measured is not None else 'default'
+        lanes = min(concurrency, step['count']) if step['parallel'] else 1
+        step['seconds'] = round(step['count'] * step['latency'] / lanes, 2)
+
+    total_calls = sum(step['calls'] for step in steps)
+    estimated_seconds = round(sum(step['seconds'] for step in steps), 2)
+    refusals = []
+    if Config.PLAN_MAX_CANVAS_CALLS and total_calls > Config.PLAN_MAX_CANVAS_CALLS:
+        refusals.append(f"{total_calls} Canvas calls exceed the limit of {Config.PLAN_MAX_CANVAS_CALLS}")
+    if Config.PLAN_MAX_SECONDS and estimated_seconds > Config.PLAN_MAX_SECONDS:
+        refusals.append(f"Estimated {estimated_seconds}s exceeds the limit of {Config.PLAN_MAX_SECONDS}s")
+
+    return {
+        'environment': environment,
+        'backend': backend,
+        'operations': steps,
+        'calls': {step['operation']: step['calls'] for step in steps if step['calls']},
+        'total_calls': total_calls,
+        'concurrency': concurrency,
+        'estimated_seconds': estimated_seconds,
+        'allowed': not refusals,
+        'refusals': refusals
+    }
+
+def _concurrency(environment: Optional[str]) -> int:
+    """Parallel Canvas calls to expect: the worker count, capped by the environment's current rate limit"""
+    rate_limit = registry.rate_limits().get(environment or 'default')
+    limit = rate_limit['limit'] if rate_limit else Config.RATE_LIMIT_INITIAL_CONCURRENCY
+    return max(1, min(Config.PROVISIONING_MAX_WORKERS, limit))
@@ -0,0 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.api.canvas_client import PROGRESS_FINISHED_STATES, CanvasClient
+from app.config import Config
+from app.models.resources import user_fields
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import contextvars
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def run_bounded(func: Callable, items: Iterable, max_workers: Optional[int] = None) -> List[Tuple[Any, Any, Optional[Exception]]]:
+    """Run func over items with at most max_workers in flight.
+
+    Returns (item, result, error) tuples in the same order as items, so one
+    failing item never hides the results of the others.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    max_workers = max(1, min(max_workers or Config.PROVISIONING_MAX_WORKERS, len(items)))
+
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    if max_workers == 1:
+        return [call(item) for item in items]
+
+    # Each item runs in a copy of the caller's context, so per-request timings follow the work
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='provision') as executor:
+        futures = [executor.submit(contextvars.copy_context().run, call, item) for item in items]
+        return [future.result() for future in futures]
+
+def account_sis_id(request_id: str) -> str:
+    """Deterministic SIS id for the subaccount of a request"""
+    return f"TEST-{request_id[-8:]}"
+
+def course_sis_id(request_id: str, index: int) -> str:
+    """Deterministic SIS id for the index-th (1-based) course of a request"""
+    return f"TEST-{request_id[-8:]}-C{index}"
+
+IDENTITY_SCOPE_REQUEST = 'request'
+IDENTITY_SCOPE_REQUESTER = 'requester'
+
+def user_suffix(request_id: str, requester: Optional[str] = None) -> str:
+    """Suffix of a request's test user logins.
+
+    With USER_IDENTITY_SCOPE=requester it only depends on the requester, so
+    their next request reuses the same users; otherwise it is per request.
+    """
+    if Config.USER_IDENTITY_SCOPE == IDENTITY_SCOPE_REQUESTER and requester:
+        return hashlib.sha1(requester.strip().lower().encode()).hexdigest()[:8]
+    return request_id[-8:]
+
+def build_user_specs(request_id: str, course_config: Dict, suffix: Optional[str] = None) -> List[Dict]:
+    """Describe the test students and teachers needed for one course.
+
+    Login ids (also used as SIS user ids) only depend on the suffix (see
+    user_suffix, default the request's) and the user's position, so courses
+    of one request share their test users and re-running a step finds the
+    user it created before.
+    """
+    suffix = suffix or request_id[-8:]
+    specs = []
+
+    for i in range(course_config['students']):
+        specs.append({**user_fields('student', i + 1, suffix), 'role': 'StudentEnrollment'})
+
+    for i in range(course_config['teachers']):
+        specs.append({**user_fields('teacher', i + 1, suffix), 'role': 'TeacherEnrollment'})
+
+    return specs
+
+def user_step(spec: Dict) -> str:
+    return f"user:{spec['login_id']}"
+
+def enrollment_step(course_key: str, spec: Dict) -> str:
+    return f"enrollment:{course_key}:{spec['login_id']}"
+
+def create_or_adopt(create: Callable[[], Dict], find: Callable[[], Dict]) -> Dict:
+    """Create a resource with a deterministic SIS id, or adopt the one an earlier attempt created.
+
+    When create fails (typically because the SIS id is already in use), find
+    looks the resource up by that SIS id. If that fails too, the original
+    error is raised.
+    """
+    try:
+        return create()
+    except Exception as error:
+        try:
+            existing = find()
+        except Exception:
+            raise error
+        logger.info(f"Adopted existing resource {existing.get('id')} after create failed: {error}")
+        return existing
+
+def provision_course_users(client: CanvasClient, account_id: int, course_id: int, specs: List[Dict],
+                           checkpoints: Dict[str, int], course_key: str,
+                           max_workers: Optional[int] = None,
+                           on_user: Optional[Callable[[Dict, Optional[Dict], Optional[str]], None]] = None,
+                           on_enrollment: Optional[Callable[[Dict, Optional[str]], None]] = None) -> Tuple[List[Dict], List[str]]:
+    """Create and enroll users for a course in parallel, skipping checkpointed steps.
+
+    checkpoints maps finished step keys (see user_step/enrollment_step) to
+    Canvas ids and is updated as steps succeed, so a later run only repeats
+    what failed. Returns the users created by this call in spec order and
+    one error message per failed step. on_user(spec, user, error) and
+    on_enrollment(spec, error) are called from the worker threads for each
+    step actually attempted; user is None when creating it failed.
+    """
+    def create_and_enroll(spec):
+        user = None
+        user_id = checkpoints.get(user_step(spec))
+        if user_id is None:
+            try:
+                user = create_or_adopt(
+                    lambda: client.create_user(
+                        account_id=account_id,
+                        name=spec['name'],
+                        email=spec['email'],
+                        login_id=spec['login_id'],
+                        sis_user_id=spec['sis_user_id']
+                    ),
+                    lambda: client.get_user_by_sis_id(spec['sis_user_id'])
+                )
+            except Exception as e:
+                if on_user:
+                    on_user(spec, None, str(e))
+                raise
+            user_id = checkpoints[user_step(spec)] = user['id']
+            if on_user:
+                on_user(spec, user, None)
+
+        enroll_error = None
+        if enrollment_step(course_key, spec) not in checkpoints:
+            try:
+                enrollment = client.enroll_user(
+                    course_id=course_id,
+                    user_id=user_id,
+                    role=spec['role']
+                )
+                checkpoints[enrollment_step(course_key, spec)] = enrollment['id']
+            except Exception as e:
+                # Keep the user so it is still tracked for the request
+                enroll_error = f"Failed to enroll {spec['login_id']} in course {course_id}: {str(e)}"
+            if on_enrollment:
+                on_enrollment(spec, enroll_error)
+        return user, enroll_error
+
+    users = []
+    errors = []
+    for spec, outcome, error in run_bounded(create_and_enroll, specs, max_workers):
+        if error is not None:
+            error_msg = f"Failed to create user {spec['login_id']}: {str(error)}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+            continue
+
+        user, enroll_error = outcome
+        if user is not None:
+            users.append(user)
+        if enroll_error:
+            logger.error(enroll_error)
+            errors.append(enroll_error)
+
+    return users, errors
+
+def wait_for_all_progress(client: CanvasClient, progress_ids: Iterable[int], timeout: Optional[float] = None,
+                          interval: Optional[float] = None, max_workers: Optional[int] = None,
+                          on_finished: Optional[Callable[[int, Dict], None]] = None) -> Dict[int, Dict]:
+    """Poll many asynchronous Canvas operations together until all have finished.
+
+    Each round polls every unfinished progress object in parallel, so the
+    total wait is that of the slowest operation rather than the sum. Returns
+    the final progress per id; operations still running at the deadline are
+    reported with workflow_state 'timeout'.
+    """
+    timeout = timeout or Config.PROGRESS_TIMEOUT
+    interval = interval or Config.PROGRESS_POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    pending = list(progress_ids)
+    finished = {}
+
+    while pending:
+        still_running = []
+        for progress_id, progress, error in run_bounded(client.get_progress, pending, max_workers):
+            if error is None and progress['workflow_state'] not in PROGRESS_FINISHED_STATES:
+                still_running.append(progress_id)
+                continue
+            if error is not None:
+                progress = {'id': progress_id, 'workflow_state': 'failed', 'message': str(error)}
+            finished[progress_id] = progress
+            if on_finished:
+                on_finished(progress_id, progress)
+
+        pending = still_running
+        if pending and time.monotonic() >= deadline:
+            for progress_id in pending:
+                finished[progress_id] = {'id': progress_id, 'workflow_state': 'timeout',
+                                         'message': f"Did not finish within {timeout}s"}
+                if on_finished:
+                    on_finished(progress_id, finished[progress_id])
+            break
+        if pending:
+            time.sleep(interval)
+
+    return finished
+
+BACKEND_REST = 'rest'
+BACKEND_SIS_IMPORT = 'sis_import'
+
+def select_backend(courses: List[Dict]) -> str:
+    """Pick SIS import for requests too large for one REST call per user.
+
+    Courses share their test users (see build_user_specs), so each user is
+    counted once, not once per course.
+    """
+    distinct_users = {spec['login_id'] for course in courses for spec in build_user_specs('', course, suffix='-')}
+    if len(distinct_users) > Config.SIS_IMPORT_THRESHOLD:
+        return BACKEND_SIS_IMPORT
+    return BACKEND_REST
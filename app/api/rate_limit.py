@@ -0,0 +1,177 @@
+from app.config import Config
+from app.metrics import metrics, record_timing
+from typing import Dict, Optional
+import logging
+import random
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+metrics.counter('canvas_http_requests_total', 'HTTP requests sent to Canvas by environment and status code')
+metrics.counter('canvas_http_retries_total', 'Throttled Canvas requests that were retried, by environment')
+metrics.histogram('canvas_rate_limit_wait_seconds', 'Time requests waited for a rate limit slot or backoff')
+
+def is_throttled(response: requests.Response) -> bool:
+    """Canvas answers 403 'Rate Limit Exceeded' when the token's bucket is empty"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and 'rate limit exceeded' in response.text.lower()
+
+class RateLimitController:
+    """Adaptive cap on concurrent Canvas requests for one client (AIMD).
+
+    Every response reports how much of the token's request-cost bucket is
+    left (X-Rate-Limit-Remaining). While the bucket stays above low_water
+    the cap grows by one request per full window of responses; when it
+    drops below low_water, or Canvas throttles a call, the cap is halved
+    and new requests are paced out so the bucket can refill. Throttled
+    calls also pause all new requests for a jittered backoff.
+    """
+
+    def __init__(self, initial: int = None, minimum: int = None, maximum: int = None,
+                 low_water: float = None):
+        self.minimum = minimum or Config.RATE_LIMIT_MIN_CONCURRENCY
+        self.maximum = maximum or Config.RATE_LIMIT_MAX_CONCURRENCY
+        self.low_water = low_water if low_water is not None else Config.RATE_LIMIT_LOW_WATER
+        self.limit = max(self.minimum, min(initial or Config.RATE_LIMIT_INITIAL_CONCURRENCY, self.maximum))
+        self.in_flight = 0
+        self.remaining: Optional[float] = None
+        self.last_cost: Optional[float] = None
+        self._credit = 0.0
+        self._hold = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self.counters = {'requests': 0, 'throttled': 0, 'retries': 0, 'increases': 0, 'decreases': 0}
+
+    def acquire(self):
+        """Wait for a free slot under the current cap and outside any pause"""
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self.in_flight >= self.limit:
+                    self._condition.wait()
+                else:
+                    break
+            self.in_flight += 1
+            self.counters['requests'] += 1
+
+    def release(self, response: Optional[requests.Response] = None, throttled: bool = False):
+        """Free a slot and adapt the cap to the budget the response reported"""
+        with self._condition:
+            self.in_flight -= 1
+            if response is not None:
+                remaining = response.headers.get('X-Rate-Limit-Remaining')
+                cost = response.headers.get('X-Request-Cost')
+                if remaining is not None:
+                    self.remaining = float(remaining)
+                if cost is not None:
+                    self.last_cost = float(cost)
+
+            if throttled:
+                self.counters['throttled'] += 1
+                self._decrease()
+            elif self.remaining is not None and self.remaining < self.low_water:
+                # Requests already in flight were sent under the old cap; react to them only once
+                if self._hold > 0:
+                    self._hold -= 1
+                else:
+                    self._decrease()
+                # Fewer slots don't help once the bucket is nearly empty; space requests out so it refills
+                shortfall = 1 - max(self.remaining, 0) / self.low_water if self.low_water else 0
+                self._paused_until = max(self._paused_until,
+                                         time.monotonic() + Config.RATE_LIMIT_PACING_DELAY * shortfall)
+            elif response is not None and response.ok:
+                self._increase()
+            self._condition.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """Pause all requests for a jittered exponential delay before a retry and return it"""
+        ceiling = min(Config.RATE_LIMIT_BACKOFF_MAX, Config.RATE_LIMIT_BACKOFF_BASE * 2 ** attempt)
+        delay = random.uniform(ceiling / 2, ceiling)
+        with self._condition:
+            self.counters['retries'] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def _increase(self):
+        """Additive increase: one more slot per full window of good responses; caller holds the lock"""
+        if self.limit >= self.maximum:
+            return
+        self._credit += 1 / self.limit
+        if self._credit >= 1:
+            self._credit = 0.0
+            self.limit += 1
+            self.counters['increases'] += 1
+
+    def _decrease(self):
+        """Multiplicative decrease; caller holds the lock"""
+        self._credit = 0.0
+        self._hold = self.in_flight
+        if self.limit > self.minimum:
+            self.limit = max(self.minimum, self.limit // 2)
+            self.counters['decreases'] += 1
+            logger.info(f"Canvas budget low ({self.remaining}), concurrency cap now {self.limit}")
+
+    def stats(self) -> Dict:
+        """Current budget, cap and counters"""
+        with self._condition:
+            return {
+                'remaining': self.remaining,
+                'last_cost': self.last_cost,
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 2),
+                **self.counters
+            }
+
+class RateLimitedSession(requests.Session):
+    """requests Session that routes every call through a RateLimitController"""
+
+    def __init__(self, controller: RateLimitController, max_retries: int = None, environment: str = None):
+        super().__init__()
+        self.controller = controller
+        self.max_retries = Config.RATE_LIMIT_MAX_RETRIES if max_retries is None else max_retries
+        self.environment = environment or 'default'
+
+    def request(self, method, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            self.controller.acquire()
+            self._waited(time.perf_counter() - started, 'slot')
+            response = None
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            finally:
+                throttled = response is not None and is_throttled(response)
+                self.controller.release(response, throttled=throttled)
+                metrics.inc('canvas_http_requests_total', environment=self.environment,
+                            status=response.status_code if response is not None else 'none')
+
+            if not throttled or attempt >= self.max_retries:
+                return response
+
+            delay = self.controller.backoff(attempt)
+            attempt += 1
+            metrics.inc('canvas_http_retries_total', environment=self.environment)
+            logger.warning(f"Canvas throttled {method} {url}, retry {attempt} in {delay:.1f}s")
+            self._rewind_files(kwargs.get('files'))
+            time.sleep(delay)
+            self._waited(delay, 'backoff')
+
+    def _waited(self, seconds: float, reason: str):
+        metrics.observe('canvas_rate_limit_wait_seconds', seconds, environment=self.environment, reason=reason)
+        record_timing('rate_limit_wait', seconds, reason)
+
+    @staticmethod
+    def _rewind_files(files):
+        """Uploaded file objects were read by the failed attempt; rewind them for the retry"""
+        entries = files.values() if isinstance(files, dict) else [value for _, value in files or []]
+        for value in entries:
+            handle = value[1] if isinstance(value, tuple) else value
+            if hasattr(handle, 'seek'):
+                handle.seek(0)
@@ -0,0 +1,335 @@
+from app.api.client_registry import get_client
+from app.api.jobs import JobContext, job_queue
+from app.api.provisioning import (
+    BACKEND_SIS_IMPORT, account_sis_id, build_user_specs, course_sis_id, create_or_adopt,
+    enrollment_step, provision_course_users, run_bounded, select_backend, user_step, wait_for_all_progress
+)
+from app.api.sis_import import provision_with_sis_import
+from app.api.user_pool import pool_enabled, user_pool
+from app.config import Config
+from app.metrics import metrics, timed, track_timings
+from app.models.request_store import request_store
+from app.models.resources import compact_resources
+from app.models.user_index import user_index
+from datetime import datetime
+from typing import Dict
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = 'provision_request'
+
+metrics.histogram('request_log_seconds', 'Duration of request log appends')
+metrics.histogram('provisioning_wait_seconds', 'Time spent waiting for asynchronous Canvas work to finish')
+
+def store_request_details(request_data, results):
+    """Store request details for tracking and cleanup, with created resources in their compact form"""
+    request_record = {
+        "id": results['request_id'],
+        "timestamp": datetime.now().isoformat(),
+        "request": request_data,
+        "results": {**results, "created_resources": compact_resources(results.get('created_resources'))}
+    }
+
+    # Append-only log: one write per request instead of rewriting the whole file
+    with timed('request_log_seconds', 'store', 'request_log'), open(Config.REQUEST_LOG_PATH, 'a') as f:
+        f.write(json.dumps(request_record) + '\n')
+
+def provision_request(job: JobContext, payload: Dict) -> Dict:
+    """Job handler: provision a stored request and mark it failed if that raises.
+
+    Where the run spent its time (Canvas calls, rate limit waits, store
+    I/O) is saved as the request's 'timings'.
+    """
+    with track_timings() as timings:
+        try:
+            result = _provision_request(job, payload['request_id'])
+        except Exception as e:
+            request_store.update(payload['request_id'], {'status': 'failed', 'error': str(e),
+                                                         'timings': timings.as_dict()})
+            raise
+    request_store.update(payload['request_id'], {'timings': timings.as_dict()})
+    return result
+
+def _provision_request(job: JobContext, request_id: str) -> Dict:
+    """Create everything a stored request asks for, checkpointing each step.
+
+    Every finished step is recorded under created_resources['checkpoints']
+    and saved as the run progresses, so running the job again for the same
+    request (see /api/requests/<id>/resume) only repeats the missing steps.
+    """
+    request_record = request_store.get(request_id)
+    if request_record is None:
+        raise ValueError(f"Request {request_id} not found")
+
+    data = request_record['request_data']
+    # Records from before requester-scoped users keep their per-request logins
+    suffix = request_record.get('user_suffix') or request_id[-8:]
+    resources = request_record['created_resources']
+    checkpoints = resources.setdefault('checkpoints', {})
+    # Errors describe the latest run only; steps that failed before are retried below
+    resources['errors'] = []
+
+    def save(**changes):
+        request_store.update(request_id, {'created_resources': resources, **changes})
+
+    save(status='provisioning', job_id=job.id)
+    client = get_client(data.get('environment'))
+
+    # Large requests go through one SIS import instead of a call per user
+    backend = request_record.get('backend') or select_backend(data['courses'])
+
+    # Create subaccount if requested
+    subaccount_pending = data['subaccount']['create'] and 'subaccount' not in checkpoints
+    job.phase('subaccount', 1 if subaccount_pending else 0)
+    if subaccount_pending:
+        try:
+            subaccount = create_or_adopt(
+                lambda: client.create_subaccount(
+                    parent_id=Config.ROOT_ACCOUNT_ID,
+                    name=data['subaccount']['name'],
+                    sis_account_id=account_sis_id(request_id)
+                ),
+                lambda: client.get_account_by_sis_id(account_sis_id(request_id))
+            )
+            resources['subaccounts'].append(subaccount)
+            checkpoints['subaccount'] = subaccount['id']
+            job.advance('subaccount', event='subaccount_created', id=subaccount['id'], name=subaccount['name'])
+        except Exception as e:
+            resources['errors'].append(f"Failed to create subaccount: {str(e)}")
+            job.advance('subaccount', done=0, failed=1, event='subaccount_failed', error=str(e))
+    account_id = checkpoints.get('subaccount', Config.ROOT_ACCOUNT_ID)
+    subaccount_sis_id = account_sis_id(request_id) if 'subaccount' in checkpoints else None
+    save(backend=backend)
+
+    # Create admin access
+    for admin_user in data['admin_users']:
+        # In real implementation, grant admin access to the users
+        logger.info(f"Would grant admin access to {admin_user}")
+
+    if backend == BACKEND_SIS_IMPORT:
+        # An SIS import is idempotent on its SIS ids, so a resumed run simply imports again
+        job.phase('sis_import', 0 if 'sis_import' in checkpoints else 1)
+        if 'sis_import' not in checkpoints:
+            try:
+                imported = provision_with_sis_import(
+                    client,
+                    request_id,
+                    data['courses'],
+                    root_account_id=Config.ROOT_ACCOUNT_ID,
+                    account_sis_id=subaccount_sis_id,
+                    user_suffix=suffix
+                )
+                resources['courses'] = imported['courses']
+                resources['users'] = imported['users']
+                for course in imported['courses']:
+                    checkpoints[f"course:{course['sis_course_id']}"] = course['id']
+                resources['errors'].extend(imported['errors'])
+                if not imported['errors']:
+                    checkpoints['sis_import'] = imported['sis_import']['id']
+                save(sis_import=imported['sis_import'])
+                job.advance('sis_import', event='sis_import_finished', courses=len(imported['courses']),
+                            users=len(imported['users']), state=imported['sis_import']['workflow_state'])
+            except Exception as e:
+                resources['errors'].append(f"SIS import failed: {str(e)}")
+                job.advance('sis_import', done=0, failed=1, event='sis_import_failed', error=str(e))
+    else:
+        # Create courses and users through the REST API, skipping checkpointed steps
+        plan = []
+        for index, course_config in enumerate(data['courses'], start=1):
+            course_key = course_sis_id(request_id, index)
+            specs = build_user_specs(request_id, course_config, suffix)
+            pending = [spec for spec in specs if enrollment_step(course_key, spec) not in checkpoints]
+            plan.append((course_key, course_config, specs, pending))
+
+        # Generic students come ready-made from the warm pool and only need enrolling,
+        # unless the requester already has their own users from an earlier request
+        if pool_enabled(data.get('environment')):
+            students = {}
+            for _, _, specs, _ in plan:
+                for spec in specs:
+                    if spec['role'] == 'StudentEnrollment' and user_step(spec) not in checkpoints:
+                        students.setdefault(user_step(spec), spec)
+            known = set(user_index.known_logins(data.get('environment'),
+                                                [spec['login_id'] for spec in students.values()]))
+            students = {step: spec for step, spec in students.items() if spec['login_id'] not in known}
+            recorded_users = [user_id for step, user_id in checkpoints.items() if step.startswith('user:')]
+            pooled = user_pool.take(data.get('environment'), len(students), request_id,
+                                    exclude=recorded_users)
+            for step, user in zip(students, pooled):
+                checkpoints[step] = user['id']
+                resources['users'].append(user)
+            if pooled:
+                job.event('pool_users_taken', count=len(pooled), requested=len(students))
+                save()
+
+        # Users are shared between courses: each course still to run that needs a user
+        # may try to create it, so a user only counts as failed once none is left
+        users_needed = {}
+        for course_key, _, _, pending in plan:
+            for spec in pending:
+                if user_step(spec) not in checkpoints:
+                    users_needed.setdefault(user_step(spec), []).append(course_key)
+
+        def give_up_user(spec, course_key) -> bool:
+            """Drop course_key from the courses that would create the user; True if none is left"""
+            remaining = users_needed.get(user_step(spec))
+            if remaining and course_key in remaining:
+                remaining.remove(course_key)
+            return not remaining
+
+        job.phase('courses', sum(1 for course_key, *_ in plan if f"course:{course_key}" not in checkpoints))
+        job.phase('users', len(users_needed))
+        job.phase('enrollments', sum(len(pending) for *_, pending in plan))
+
+        def user_finished(course_key, spec, user, error):
+            if user is not None:
+                job.advance('users', event='user_created', id=user['id'], login_id=spec['login_id'])
+                return
+            # Its enrollment in this course is never attempted
+            job.advance('enrollments', done=0, failed=1)
+            if give_up_user(spec, course_key):
+                job.advance('users', done=0, failed=1, event='user_failed', login_id=spec['login_id'], error=error)
+            else:
+                job.event('user_failed', login_id=spec['login_id'], error=error, retried=True)
+
+        def enrollment_finished(spec, error):
+            if error:
+                job.advance('enrollments', done=0, failed=1, event='enrollment_failed',
+                            login_id=spec['login_id'], error=error)
+            else:
+                job.advance('enrollments', event='enrollment_created', login_id=spec['login_id'], role=spec['role'])
+
+        for course_key, course_config, specs, pending in plan:
+            course_id = checkpoints.get(f"course:{course_key}")
+            if course_id is None:
+                try:
+                    # Create course
+                    course = create_or_adopt(
+                        lambda: client.create_course(
+                            account_id=account_id,
+                            name=course_config['name'],
+                            course_code=f"TEST-{request_id[-8:]}",
+                            sis_course_id=course_key
+                        ),
+                        lambda: client.get_course_by_sis_id(course_key)
+                    )
+                    resources['courses'].append(course)
+                    course_id = checkpoints[f"course:{course_key}"] = course['id']
+                    job.advance('courses', event='course_created', id=course['id'], name=course['name'])
+                except Exception as e:
+                    resources['errors'].append(f"Failed to create course {course_config['name']}: {str(e)}")
+                    job.advance('courses', done=0, failed=1, event='course_failed', name=course_config['name'], error=str(e))
+                    # Its enrollments will not be created, nor its users unless a later course needs
+                    # them too; count the rest as failed so the ETA stays honest
+                    job.advance('users', done=0, failed=sum(
+                        1 for spec in pending
+                        if user_step(spec) in users_needed and user_step(spec) not in checkpoints
+                        and give_up_user(spec, course_key)
+                    ))
+                    job.advance('enrollments', done=0, failed=len(pending))
+                    save()
+                    continue
+
+                # Create sections if more than 1
+                if course_config['sections'] > 1:
+                    for i in range(2, course_config['sections'] + 1):
+                        # Canvas API for creating sections
+                        logger.info(f"Would create section {i} for course {course_id}")
+
+            if not pending:
+                continue
+
+            # Create and enroll test students and teachers in parallel
+            users, errors = provision_course_users(
+                client,
+                account_id=account_id,
+                course_id=course_id,
+                specs=pending,
+                checkpoints=checkpoints,
+                course_key=course_key,
+                on_user=lambda spec, user, error, course_key=course_key: user_finished(course_key, spec, user, error),
+                on_enrollment=enrollment_finished
+            )
+            resources['users'].extend(users)
+            resources['errors'].extend(errors)
+
+            # Partial results become visible through the request and job endpoints
+            save()
+
+    # Template-based scenarios get their assignments, rubrics and modules by copying the template
+    template = Config.SCENARIO_TEMPLATES.get(data.get('scenario'))
+    if template:
+        course_ids = {
+            key: checkpoints[f"course:{key}"]
+            for key in (course_sis_id(request_id, index) for index in range(1, len(data['courses']) + 1))
+            if f"course:{key}" in checkpoints
+        }
+        _copy_template(job, client, template, course_ids, resources, checkpoints)
+        save()
+
+    # Handle additional options
+    if data['options']['configure_terms']:
+        logger.info("Would configure terms")
+
+    if data['options']['add_apps']:
+        for app_name in data['options']['app_names']:
+            logger.info(f"Would configure app: {app_name}")
+
+    # Requests with failed steps stay resumable
+    save(status='completed', completed_at=datetime.now().isoformat(), resumable=bool(resources['errors']))
+
+    # Also store in old format for compatibility
+    store_request_details(data, {
+        "request_id": request_id,
+        "status": "completed",
+        "created_resources": resources
+    })
+
+    return {
+        "request_id": request_id,
+        "status": "completed",
+        "resource_counts": {name: len(resources[name]) for name in ('subaccounts', 'courses', 'users', 'errors')}
+    }
+
+def _copy_template(job: JobContext, client, template: str, course_ids: Dict[str, int], resources: Dict,
+                   checkpoints: Dict):
+    """Copy a template course into every course and wait for all copies together"""
+    pending = {key: course_id for key, course_id in course_ids.items() if f"content:{key}" not in checkpoints}
+    job.phase('content', len(pending))
+
+    # Start the copies that no earlier run started; a started copy is only waited for again
+    to_start = [key for key in pending if f"content_started:{key}" not in checkpoints]
+    for key, migration, error in run_bounded(lambda key: client.copy_course_content(pending[key], template), to_start):
+        if error is not None:
+            resources['errors'].append(f"Failed to copy template {template} into course {pending[key]}: {error}")
+            job.advance('content', done=0, failed=1, event='content_failed', course_id=pending[key], error=str(error))
+            continue
+        if migration['progress_id'] is None:
+            # Nothing to poll; Canvas finishes the copy on its own
+            checkpoints[f"content:{key}"] = migration['id']
+            job.advance('content', event='content_copied', course_id=pending[key])
+            continue
+        checkpoints[f"content_started:{key}"] = migration['progress_id']
+
+    keys_by_progress = {checkpoints[f"content_started:{key}"]: key for key in pending
+                        if checkpoints.get(f"content_started:{key}")}
+
+    def copy_finished(progress_id, progress):
+        key = keys_by_progress[progress_id]
+        if progress['workflow_state'] == 'completed':
+            checkpoints[f"content:{key}"] = progress_id
+            job.advance('content', event='content_copied', course_id=pending[key])
+        else:
+            # Forget the failed copy so a resumed run starts a new one
+            checkpoints.pop(f"content_started:{key}", None)
+            error = progress.get('message') or progress['workflow_state']
+            resources['errors'].append(f"Copying template {template} into course {pending[key]} failed: {error}")
+            job.advance('content', done=0, failed=1, event='content_failed', course_id=pending[key], error=error)
+
+    with timed('provisioning_wait_seconds', 'wait', 'content_copy', environment=client.environment or 'default'):
+        wait_for_all_progress(client, keys_by_progress, timeout=Config.CONTENT_MIGRATION_TIMEOUT,
+                              on_finished=copy_finished)
+
+job_queue.register(JOB_KIND, provision_request)
@@ -1,10 +1,30 @@
-from flask import Blueprint, request, jsonify
-from app.api.canvas_client import CanvasClient
+from flask import Blueprint, Response, request, jsonify, make_response, stream_with_context
+from app.api.cleanup import cleanup_request_resources, delete_courses
+from app.api.client_registry import get_client, registry
+from app.api.expiry_sweeper import JOB_KIND as CLEANUP_EXPIRED_JOB
+from app.api.inventory_sync import JOB_KIND as SYNC_INVENTORY_JOB, inventory_sync
+from app.api.job_events import job_event_hub
+from app.api.jobs import COMPLETED, FAILED, job_queue
+from app.api.planning import plan_request, plan_setup
+from app.api.request_provisioning import JOB_KIND as PROVISION_JOB
+from app.api.provisioning import user_suffix
+from app.api.setup_graph import compile_graph, run_graph
+from app.api.streaming import stream_list, wants_ndjson
+from app.api.status_cache import status_cache
+from app.api.user_pool import user_pool
+from app.api.user_reconcile import JOB_KIND as RECONCILE_USERS_JOB
+from app.config import Config
+from app.models.inventory import inventory
+from app.models.request_store import LARGE_FIELDS, request_store
+from app.models.user_index import user_index
 from app.models.schemas import TestEnvironmentConfig, TestEnvironmentRequest
 from datetime import datetime
-import logging
+from pydantic import ValidationError
+from urllib.parse import urlencode
+import hashlib
 import json
-import os
+import logging
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -12,32 +32,51 @@ logger = logging.getLogger(__name__)
 # Define Blueprint FIRST
 api_bp = Blueprint('api', __name__)
 
-# Helper functions for request management
-def get_requests_file():
-    return os.path.join(os.path.dirname(__file__), '..', 'data', 'requests.json')
+DEFAULT_PAGE_SIZE = 50
+# Pages are streamed rather than built in memory, so they can be large
+MAX_PAGE_SIZE = 1000
 
-def load_requests():
-    """Load all requests from storage"""
-    try:
-        with open(get_requests_file(), 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-def save_requests(requests):
-    """Save requests to storage"""
-    os.makedirs(os.path.dirname(get_requests_file()), exist_ok=True)
-    with open(get_requests_file(), 'w') as f:
-        json.dump(requests, f, indent=2)
-
-def find_request(request_id):
+# Helper functions for request management
+def find_request(request_id, include=LARGE_FIELDS):
     """Find a specific request by ID"""
-    requests = load_requests()
-    for req in requests:
-        if req['id'] == request_id:
-            return req
+    return request_store.get(request_id, include=include)
+
+def next_page_headers(next_cursor):
+    """Link and X-Next-Cursor headers pointing at the next page, if there is one"""
+    if not next_cursor:
+        return {}
+    args = request.args.to_dict()
+    args['cursor'] = next_cursor
+    return {
+        'Link': f'<{request.base_url}?{urlencode(args)}>; rel="next"',
+        'X-Next-Cursor': next_cursor
+    }
+
+def unknown_environment(env):
+    """404 response for an environment that isn't configured, None for a known one"""
+    if env not in Config.TEST_ENVIRONMENTS:
+        return jsonify({"error": f"Unknown environment: {env}"}), 404
     return None
 
+def job_queued(job_id, **fields):
+    """202 response for a queued job, pointing at its status URL"""
+    status_url = f"/api/jobs/{job_id}"
+    response = jsonify({**fields, "job_id": job_id, "status": "queued", "status_url": status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+def is_dry_run():
+    """Whether the caller only wants the plan (?dry_run=1)"""
+    return request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
+def inventory_status(env):
+    """(status, cache info) from the local inventory, or (None, None) if it hasn't been crawled yet"""
+    status = inventory.status(env)
+    if status is None:
+        return None, None
+    age = (datetime.now() - datetime.fromisoformat(status['synced_at'])).total_seconds()
+    return status, {'cache': 'inventory', 'age': round(age, 1)}
+
 def get_scenario_name(scenario_id):
     """Get friendly name for scenario"""
     names = {
@@ -49,27 +88,6 @@ def get_scenario_name(scenario_id):
     }
     return names.get(scenario_id, scenario_id)
 
-def store_request_details(request_data, results):
-    """Store request details for tracking and cleanup"""
-    request_record = {
-        "id": results['request_id'],
-        "timestamp": datetime.now().isoformat(),
-        "request": request_data,
-        "results": results
-    }
-    
-    # Save to file (in production, use a database)
-    try:
-        with open('request_log.json', 'r') as f:
-            log = json.load(f)
-    except:
-        log = []
-    
-    log.append(request_record)
-    
-    with open('request_log.json', 'w') as f:
-        json.dump(log, f, indent=2)
-
 # Routes
 @api_bp.route('/health', methods=['GET'])
 def health_check():
@@ -81,103 +99,187 @@ def get_environments():
     from app.config import Config
     return jsonify(Config.TEST_ENVIRONMENTS), 200
 
+@api_bp.route('/environments/status', methods=['GET'])
+def get_all_environment_status():
+    """Get the status of every environment in one call.
+    
+    Answered from the local inventory. Environments that haven't been
+    crawled yet are crawled concurrently; those still loading after the
+    deadline (?deadline=<seconds>, default STATUS_DEADLINE) are reported as
+    pending and keep loading in the background for the next call.
+    """
+    try:
+        deadline = min(float(request.args.get('deadline', Config.STATUS_DEADLINE)), 30)
+    except ValueError:
+        return jsonify({"error": "deadline must be a number of seconds"}), 400
+    
+    results = {env: inventory_status(env) for env in Config.TEST_ENVIRONMENTS}
+    # Only environments never crawled go through the cache, which shares and times out their first crawl
+    loaders = {env: (lambda env=env: inventory_sync.status(env))
+               for env, (status, _) in results.items() if status is None}
+    results.update(status_cache.get_many(loaders, timeout=deadline))
+    statuses = {}
+    for env, (status, cache_info) in results.items():
+        if status is None:
+            status = {'status': cache_info['cache']}
+            if cache_info.get('error'):
+                status['error'] = cache_info['error']
+        status['environment'] = env
+        status['cache'] = cache_info
+        statuses[env] = status
+    return jsonify(statuses), 200
+
 @api_bp.route('/environments/<env>/status', methods=['GET'])
 def get_environment_status(env):
-    """Get status of a specific environment"""
+    """Get status of a specific environment from the local inventory"""
+    not_found = unknown_environment(env)
+    if not_found:
+        return not_found
+    
     try:
-        client = CanvasClient()
-        status = client.get_environment_status()
+        status, cache_info = inventory_status(env)
+        if status is None:
+            # Only until the first crawl: the cache makes concurrent callers share it
+            status, cache_info = status_cache.get(env, lambda: inventory_sync.status(env))
         status['environment'] = env
-        return jsonify(status), 200
+        status['cache'] = cache_info
+        response = jsonify(status)
+        response.headers['Age'] = str(int(cache_info['age']))
+        return response, 200
     except Exception as e:
         logger.error(f"Error getting status for {env}: {e}")
         return jsonify({"error": str(e)}), 400
 
+@api_bp.route('/environments/<env>/courses', methods=['GET'])
+def get_environment_courses(env):
+    """Stream a page of an environment's courses from the local inventory, newest first.
+    
+    Supports cursor/limit paging like /api/requests and ?account_id=<id>.
+    The next page is advertised in a Link header. With ?source=canvas every
+    course of the account (the root account by default) is streamed straight
+    from Canvas' paginated listing instead.
+    """
+    not_found = unknown_environment(env)
+    if not_found:
+        return not_found
+    
+    try:
+        account_id = request.args.get('account_id', type=int)
+        if request.args.get('source') == 'canvas':
+            client = get_client(env)
+            if account_id is None:
+                account_id = client.get_root_account()['id']
+            return stream_list(client.iter_account_courses(account_id)), 200
+        
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        courses, next_cursor = inventory.iter_courses(env, account_id=account_id,
+                                                      cursor=request.args.get('cursor'), limit=limit)
+        return stream_list(courses, headers=next_page_headers(next_cursor)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error listing courses for {env}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/environments/<env>/subaccounts', methods=['GET'])
+def get_environment_subaccounts(env):
+    """Stream an environment's subaccounts from the local inventory, or from Canvas with ?source=canvas"""
+    not_found = unknown_environment(env)
+    if not_found:
+        return not_found
+    
+    try:
+        if request.args.get('source') == 'canvas':
+            client = get_client(env)
+            return stream_list(client.iter_subaccounts(client.get_root_account()['id'])), 200
+        return stream_list(inventory.iter_accounts(env)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error listing subaccounts for {env}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/environments/inventory', methods=['GET'])
+def get_inventory_stats():
+    """Get mirrored subaccount and course totals and last sync times per environment"""
+    return jsonify(inventory.stats()), 200
+
+@api_bp.route('/environments/<env>/inventory/sync', methods=['POST'])
+def sync_environment_inventory(env):
+    """Queue an inventory sync of the environment (?full=1 for a full crawl)"""
+    not_found = unknown_environment(env)
+    if not_found:
+        return not_found
+    
+    full = request.args.get('full', '').lower() in ('1', 'true', 'yes') or None
+    job_id = job_queue.enqueue(SYNC_INVENTORY_JOB, {'environment': env, 'full': full})
+    return job_queued(job_id)
+
+@api_bp.route('/environments/status-cache', methods=['GET'])
+def get_status_cache_stats():
+    """Get hit/miss counters and entry ages of the environment status cache"""
+    return jsonify(status_cache.stats()), 200
+
+@api_bp.route('/environments/rate-limits', methods=['GET'])
+def get_rate_limits():
+    """Get the Canvas rate limit budget and adaptive concurrency cap per environment"""
+    return jsonify(registry.rate_limits()), 200
+
+@api_bp.route('/environments/user-pool', methods=['GET'])
+def get_user_pool_stats():
+    """Get depth, refill rate and hit rate of the warm test user pool per environment"""
+    return jsonify(user_pool.stats()), 200
+
+@api_bp.route('/environments/user-index', methods=['GET'])
+def get_user_index_stats():
+    """Get the number of indexed (reusable) and missing test users per environment"""
+    return jsonify(user_index.stats()), 200
+
+@api_bp.route('/environments/<env>/users/reconcile', methods=['POST'])
+def reconcile_user_index(env):
+    """Queue a check of the environment's test user index against Canvas"""
+    not_found = unknown_environment(env)
+    if not_found:
+        return not_found
+    
+    job_id = job_queue.enqueue(RECONCILE_USERS_JOB, {'environment': env})
+    return job_queued(job_id)
+
 @api_bp.route('/setup', methods=['POST'])
 def setup_environment():
-    """Set up a test environment based on configuration"""
+    """Set up a test environment based on configuration.
+    
+    Objects may name themselves with "ref" and point at each other with
+    "@ref" instead of Canvas ids; see app.api.setup_graph.
+    """
     try:
-        config = TestEnvironmentConfig(**request.json)
-        client = CanvasClient()
-        
-        results = {
-            "subaccounts": [],
-            "courses": [],
-            "users": [],
-            "enrollments": [],
-            "errors": []
-        }
-        
-        # Create subaccounts
-        for subaccount in config.subaccounts:
-            try:
-                # Extract positional arguments
-                parent_id = subaccount.pop('parent_account_id', 1)
-                name = subaccount.pop('name')
-                
-                result = client.create_subaccount(parent_id, name, **subaccount)
-                results["subaccounts"].append(result)
-            except Exception as e:
-                error_msg = f"Failed to create subaccount '{name}': {str(e)}"
-                logger.error(error_msg)
-                results["errors"].append(error_msg)
-        
-        # Create courses
-        for course in config.courses:
-            try:
-                # Extract positional arguments
-                account_id = course.pop('account_id', 1)
-                name = course.pop('name')
-                course_code = course.pop('course_code')
-                
-                result = client.create_course(account_id, name, course_code, **course)
-                results["courses"].append(result)
-            except Exception as e:
-                error_msg = f"Failed to create course '{name}': {str(e)}"
-                logger.error(error_msg)
-                results["errors"].append(error_msg)
-        
-        # Create users (if specified)
-        for user in config.users:
-            try:
-                account_id = user.pop('account_id', 1)
-                name = user.pop('name')
-                email = user.pop('email')
-                login_id = user.pop('login_id')
-                
-                result = client.create_user(account_id, name, email, login_id, **user)
-                results["users"].append(result)
-            except Exception as e:
-                error_msg = f"Failed to create user '{name}': {str(e)}"
-                logger.error(error_msg)
-                results["errors"].append(error_msg)
-        
-        # Create enrollments (if specified)
-        for enrollment in config.enrollments:
-            try:
-                course_id = enrollment.pop('course_id')
-                user_id = enrollment.pop('user_id')
-                role = enrollment.pop('role', 'StudentEnrollment')
-                
-                result = client.enroll_user(course_id, user_id, role)
-                results["enrollments"].append(result)
-            except Exception as e:
-                error_msg = f"Failed to create enrollment: {str(e)}"
-                logger.error(error_msg)
-                results["errors"].append(error_msg)
-        
-        return jsonify(results), 200
-        
+        return run_setup(TestEnvironmentConfig(**request.json))
     except Exception as e:
         logger.error(f"Setup failed: {e}")
         return jsonify({"error": str(e)}), 400
 
+def run_setup(config):
+    """Create everything in a config, independent objects in parallel"""
+    client = get_client(config.environment)
+    nodes = compile_graph(config)
+    
+    # Show the cost without touching Canvas, and refuse setups too large to run
+    plan = plan_setup(config)
+    if is_dry_run():
+        return jsonify({"dry_run": True, **plan}), 200
+    if not plan['allowed']:
+        return jsonify({"error": "Setup too large", "plan": plan}), 400
+    
+    results = run_graph(client, nodes)
+    
+    return jsonify(results), 200
+
 @api_bp.route('/cleanup', methods=['POST'])
 def cleanup_environment():
     """Clean up test environment"""
     try:
         data = request.json
-        client = CanvasClient()
+        client = get_client(data.get('environment'))
         
         results = {
             "deleted_courses": [],
@@ -185,13 +287,12 @@ def cleanup_environment():
             "errors": []
         }
         
-        # Delete courses first (they depend on subaccounts)
-        for course_id in data.get('course_ids', []):
-            try:
-                client.delete_course(course_id)
-                results["deleted_courses"].append(course_id)
-            except Exception as e:
-                error_msg = f"Failed to delete course {course_id}: {str(e)}"
+        # Delete courses first (they depend on subaccounts), batched per account
+        for outcome in delete_courses(client, data.get('course_ids', [])):
+            if outcome['deleted']:
+                results["deleted_courses"].append(outcome['course_id'])
+            else:
+                error_msg = f"Failed to delete course {outcome['course_id']}: {outcome['error']}"
                 logger.error(error_msg)
                 results["errors"].append(error_msg)
         
@@ -246,7 +347,6 @@ def get_test_scenarios():
 def setup_scenario(scenario_id):
     """Set up a predefined test scenario"""
     try:
-        client = CanvasClient()
         environment = request.json.get('environment', 'development')
         
         # Define scenario configurations
@@ -254,27 +354,31 @@ def setup_scenario(scenario_id):
             "basic_course": {
                 "subaccounts": [],
                 "courses": [
-                    {"name": "Test Course 101", "course_code": "TEST101", "account_id": 1}
+                    {"name": "Test Course 101", "course_code": "TEST101", "account_id": Config.ROOT_ACCOUNT_ID}
                 ],
                 "users": [
-                    {"name": "Test Teacher", "email": "teacher@test.uva.nl", "login_id": "teacher1", "account_id": 1},
-                    {"name": "Test Student 1", "email": "student1@test.uva.nl", "login_id": "student1", "account_id": 1},
-                    {"name": "Test Student 2", "email": "student2@test.uva.nl", "login_id": "student2", "account_id": 1},
-                    {"name": "Test Student 3", "email": "student3@test.uva.nl", "login_id": "student3", "account_id": 1},
-                    {"name": "Test Student 4", "email": "student4@test.uva.nl", "login_id": "student4", "account_id": 1},
-                    {"name": "Test Student 5", "email": "student5@test.uva.nl", "login_id": "student5", "account_id": 1}
+                    {"ref": "teacher1", "name": "Test Teacher", "email": "teacher@test.uva.nl", "login_id": "teacher1", "account_id": Config.ROOT_ACCOUNT_ID},
+                    {"ref": "student1", "name": "Test Student 1", "email": "student1@test.uva.nl", "login_id": "student1", "account_id": Config.ROOT_ACCOUNT_ID},
+                    {"ref": "student2", "name": "Test Student 2", "email": "student2@test.uva.nl", "login_id": "student2", "account_id": Config.ROOT_ACCOUNT_ID},
+                    {"ref": "student3", "name": "Test Student 3", "email": "student3@test.uva.nl", "login_id": "student3", "account_id": Config.ROOT_ACCOUNT_ID},
+                    {"ref": "student4", "name": "Test Student 4", "email": "student4@test.uva.nl", "login_id": "student4", "account_id": Config.ROOT_ACCOUNT_ID},
+                    {"ref": "student5", "name": "Test Student 5", "email": "student5@test.uva.nl", "login_id": "student5", "account_id": Config.ROOT_ACCOUNT_ID}
                 ],
-                "enrollments": []  # Will be populated after creation
+                "enrollments": [
+                    {"course": "@courses.0", "user": "@teacher1", "role": "TeacherEnrollment"}
+                ] + [
+                    {"course": "@courses.0", "user": f"@student{i}"} for i in range(1, 6)
+                ]
             },
             "department_structure": {
                 "subaccounts": [
-                    {"name": "Test Faculty", "parent_account_id": 1},
-                    {"name": "Test Department", "parent_account_id": 1}  # Will be updated with faculty ID
+                    {"ref": "faculty", "name": "Test Faculty", "parent_account_id": Config.ROOT_ACCOUNT_ID},
+                    {"ref": "department", "name": "Test Department", "account": "@faculty"}
                 ],
                 "courses": [
-                    {"name": "Introduction to Testing", "course_code": "TEST101", "account_id": 1},
-                    {"name": "Advanced Testing", "course_code": "TEST201", "account_id": 1},
-                    {"name": "Testing Practicum", "course_code": "TEST301", "account_id": 1}
+                    {"name": "Introduction to Testing", "course_code": "TEST101", "account": "@department"},
+                    {"name": "Advanced Testing", "course_code": "TEST201", "account": "@department"},
+                    {"name": "Testing Practicum", "course_code": "TEST301", "account": "@department"}
                 ],
                 "users": [],
                 "enrollments": []
@@ -289,21 +393,75 @@ def setup_scenario(scenario_id):
             **scenarios[scenario_id]
         )
         
-        # Use the existing setup_environment logic
-        request.json = config.dict()
-        return setup_environment()
+        # Use the existing setup logic
+        return run_setup(config)
         
     except Exception as e:
         logger.error(f"Scenario setup failed: {e}")
         return jsonify({"error": str(e)}), 400
 
+def parse_request_filters(args):
+    """Translate /requests query parameters into request store filters"""
+    filters = {
+        'requester': args.get('requester') or None,
+        'environment': args.get('environment') or None,
+        'scenario': args.get('scenario') or None,
+        'created_from': args.get('from') or None,
+        'created_to': args.get('to') or None
+    }
+    
+    if args.get('cleaned') in ('true', 'false'):
+        filters['cleaned'] = args.get('cleaned') == 'true'
+    
+    # Status as shown in the requests overview: active, expired or cleaned
+    status = args.get('status')
+    today = datetime.now().date().isoformat()
+    if status == 'cleaned':
+        filters['cleaned'] = True
+    elif status == 'active':
+        filters.update(cleaned=False, end_from=today)
+    elif status == 'expired':
+        filters.update(cleaned=False, end_before=today)
+    
+    return filters
+
 @api_bp.route('/requests', methods=['GET'])
 def get_requests():
-    """Get all test environment requests"""
-    requests = load_requests()
-    # Sort by created date, newest first
-    requests.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    return jsonify(requests), 200
+    """Get a page of test environment requests, newest first.
+    
+    Supports cursor/limit paging, filters on requester, environment,
+    scenario, cleaned, status and created date range, and view=summary
+    (default) or view=full. The next page is advertised in a Link header.
+    """
+    filters = parse_request_filters(request.args)
+    # Nothing changed since the client's copy: skip the query entirely.
+    # JSON and NDJSON bodies of the same page need different tags, and the
+    # active and expired filters move with today's date.
+    day = filters.get('end_from') or filters.get('end_before') or ''
+    etag = hashlib.sha1(
+        f"{request_store.version()}|{request.query_string.decode()}|{wants_ndjson()}|{day}".encode()
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        include = LARGE_FIELDS if request.args.get('view') == 'full' else ()
+        records, next_cursor = request_store.iter_page(
+            filters,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            include=include
+        )
+        response = stream_list(records, headers=next_page_headers(next_cursor))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response, 200
 
 @api_bp.route('/requests/<request_id>', methods=['GET'])
 def get_request(request_id):
@@ -316,53 +474,153 @@ def get_request(request_id):
 @api_bp.route('/requests/<request_id>/cleanup', methods=['POST'])
 def cleanup_request(request_id):
     """Cleanup all resources created by a specific request"""
-    request_obj = find_request(request_id)
+    request_obj = find_request(request_id, include=('created_resources',))
     if not request_obj:
         return jsonify({"error": "Request not found"}), 404
     
     if request_obj.get('cleaned'):
         return jsonify({"error": "Request already cleaned up"}), 400
     
-    client = CanvasClient()
-    results = {
-        "deleted_courses": 0,
-        "deleted_users": 0,
-        "errors": []
-    }
+    try:
+        client = get_client(request_obj.get('environment'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Delete courses
-    for course in request_obj['created_resources'].get('courses', []):
-        try:
-            client.delete_course(course['id'])
-            results['deleted_courses'] += 1
-            logger.info(f"Deleted course {course['id']} from request {request_id}")
-        except Exception as e:
-            error_msg = f"Failed to delete course {course['id']}: {str(e)}"
-            logger.error(error_msg)
-            results['errors'].append(error_msg)
-    
-    # Note: Canvas doesn't allow deleting users via API
-    # We'll mark them as deleted in our tracking
-    results['deleted_users'] = len(request_obj['created_resources'].get('users', []))
-    
-    # Update request status
-    requests = load_requests()
-    for req in requests:
-        if req['id'] == request_id:
-            req['cleaned'] = True
-            req['cleaned_at'] = datetime.now().isoformat()
-            req['cleanup_results'] = results
-            break
-    save_requests(requests)
+    results = cleanup_request_resources(client, request_obj)
     
     return jsonify(results), 200
 
+@api_bp.route('/requests/cleanup-expired', methods=['POST'])
+def cleanup_expired_requests():
+    """Queue a cleanup of expired requests now, outside the sweeper's window"""
+    job_id = job_queue.enqueue_unique(CLEANUP_EXPIRED_JOB, {'limit': Config.CLEANUP_SWEEP_BATCH})
+    if job_id is None:
+        return jsonify({"error": "A cleanup of expired requests is already queued or running"}), 409
+    
+    return job_queued(job_id)
+
+@api_bp.route('/requests/<request_id>/resume', methods=['POST'])
+def resume_request(request_id):
+    """Re-run only the provisioning steps of a request that failed or never ran"""
+    request_obj = find_request(request_id, include=('created_resources',))
+    if not request_obj:
+        return jsonify({"error": "Request not found"}), 404
+    
+    if request_obj.get('cleaned'):
+        return jsonify({"error": "Request already cleaned up"}), 400
+    
+    if request_obj.get('status') in ('queued', 'provisioning'):
+        return jsonify({"error": "Request is still being provisioned", "job_id": request_obj.get('job_id')}), 409
+    
+    resources = request_obj.get('created_resources') or {}
+    if 'checkpoints' not in resources and any(resources.get(name) for name in ('subaccounts', 'courses', 'users')):
+        return jsonify({"error": "Request was provisioned before checkpointing and cannot be resumed"}), 400
+    
+    if request_obj.get('status') == 'completed' and not request_obj.get('resumable'):
+        return jsonify({"error": "Request has no failed steps to resume"}), 400
+    
+    job_id = job_queue.enqueue(PROVISION_JOB, {'request_id': request_id})
+    request_store.update(request_id, {'job_id': job_id, 'status': 'queued'})
+    
+    return job_queued(job_id, request_id=request_id)
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get status, per-phase progress and partial results of a background job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    response = {
+        "id": job['id'],
+        "kind": job['kind'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "result": job['result'],
+        "error": job['error'],
+        "attempts": job['attempts'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at']
+    }
+    
+    request_id = job['payload'].get('request_id')
+    if request_id:
+        record = find_request(request_id, include=('created_resources',))
+        if record:
+            response['request_id'] = request_id
+            response['partial_results'] = record['created_resources']
+    
+    return jsonify(response), 200
+
+@api_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream a job's progress events as Server-Sent Events.
+    
+    Events are read from the job_events table, so any number of watchers
+    in any worker process share the same source. Watchers wait on the
+    process's job_event_hub, which polls for all of them with one query,
+    instead of polling the database each. Each connection stays open for
+    at most SSE_MAX_STREAM_SECONDS and the browser's EventSource then
+    reconnects with Last-Event-ID.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_id = 0
+    
+    # Finished and fully delivered: 204 tells EventSource to stop reconnecting
+    if job['status'] in (COMPLETED, FAILED) and not job_queue.events_since(job_id, last_id, limit=1):
+        return '', 204
+    
+    def generate(cursor):
+        yield f"retry: {Config.SSE_RETRY_MS}\n\n"
+        deadline = time.monotonic() + Config.SSE_MAX_STREAM_SECONDS
+        with job_event_hub.watching(job_id):
+            while True:
+                events = job_queue.events_since(job_id, cursor)
+                for event in events:
+                    cursor = event['id']
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                    if event['type'] == 'job_finished':
+                        return
+                if events:
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if not job_event_hub.wait(job_id, cursor, min(remaining, 10)):
+                    yield ": keep-alive\n\n"
+    
+    return Response(
+        stream_with_context(generate(last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @api_bp.route('/submit-request', methods=['POST'])
 def submit_request():
     """Submit a new test environment request"""
     try:
         data = request.json
         
+        # Reject malformed requests now rather than in the background job
+        try:
+            validated = TestEnvironmentRequest(**data)
+        except ValidationError as e:
+            return jsonify({"error": "Invalid request", "details": e.errors(include_url=False)}), 400
+        
+        # Show the cost without queueing anything, and refuse requests too large to run
+        plan = plan_request(validated.model_dump())
+        if is_dry_run():
+            return jsonify({"dry_run": True, **plan}), 200
+        if not plan['allowed']:
+            return jsonify({"error": "Request too large", "plan": plan}), 400
+        
         # Generate unique request ID
         request_id = f"REQ-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{str(uuid.uuid4())[:8]}"
         
@@ -378,116 +636,25 @@ def submit_request():
             "start_date": data.get('start_date'),
             "end_date": data.get('end_date'),
             "request_data": data,
+            "user_suffix": user_suffix(request_id, data.get('requester')),
+            "estimate": {"calls": plan['total_calls'], "seconds": plan['estimated_seconds']},
             "created_resources": {
                 "subaccounts": [],
                 "courses": [],
                 "users": [],
-                "errors": []
+                "errors": [],
+                "checkpoints": {}
             },
-            "cleaned": False
+            "cleaned": False,
+            "status": "queued"
         }
         
-        client = CanvasClient()
-        
-        # Create subaccount if requested
-        if data['subaccount']['create']:
-            try:
-                subaccount = client.create_subaccount(
-                    parent_id=1,  # Root account
-                    name=data['subaccount']['name']
-                )
-                request_record['created_resources']['subaccounts'].append(subaccount)
-                account_id = subaccount['id']
-            except Exception as e:
-                request_record['created_resources']['errors'].append(f"Failed to create subaccount: {str(e)}")
-                account_id = 1
-        else:
-            account_id = 1
-        
-        # Create admin access
-        for admin_user in data['admin_users']:
-            # In real implementation, grant admin access to the users
-            logger.info(f"Would grant admin access to {admin_user}")
-        
-        # Create courses and users
-        for course_config in data['courses']:
-            try:
-                # Create course
-                course = client.create_course(
-                    account_id=account_id,
-                    name=course_config['name'],
-                    course_code=f"TEST-{request_id[-8:]}"
-                )
-                request_record['created_resources']['courses'].append(course)
-                
-                # Create sections if more than 1
-                if course_config['sections'] > 1:
-                    for i in range(2, course_config['sections'] + 1):
-                        # Canvas API for creating sections
-                        logger.info(f"Would create section {i} for course {course['id']}")
-                
-                # Create test students
-                for i in range(course_config['students']):
-                    user = client.create_user(
-                        account_id=account_id,
-                        name=f"Test Student {i+1} ({request_id[-8:]})",
-                        email=f"test.student{i+1}.{request_id[-8:]}@test.uva.nl",
-                        login_id=f"tstudent{i+1}_{request_id[-8:]}"
-                    )
-                    request_record['created_resources']['users'].append(user)
-                    
-                    # Enroll in course
-                    client.enroll_user(
-                        course_id=course['id'],
-                        user_id=user['id'],
-                        role='StudentEnrollment'
-                    )
-                
-                # Create teachers
-                for i in range(course_config['teachers']):
-                    user = client.create_user(
-                        account_id=account_id,
-                        name=f"Test Teacher {i+1} ({request_id[-8:]})",
-                        email=f"test.teacher{i+1}.{request_id[-8:]}@test.uva.nl",
-                        login_id=f"tteacher{i+1}_{request_id[-8:]}"
-                    )
-                    request_record['created_resources']['users'].append(user)
-                    
-                    # Enroll as teacher
-                    client.enroll_user(
-                        course_id=course['id'],
-                        user_id=user['id'],
-                        role='TeacherEnrollment'
-                    )
-                    
-            except Exception as e:
-                request_record['created_resources']['errors'].append(f"Failed to create course {course_config['name']}: {str(e)}")
-        
-        # Handle additional options
-        if data['options']['configure_terms']:
-            logger.info("Would configure terms")
-        
-        if data['options']['add_apps']:
-            for app_name in data['options']['app_names']:
-                logger.info(f"Would configure app: {app_name}")
-        
-        # Save request record
-        requests = load_requests()
-        requests.append(request_record)
-        save_requests(requests)
-        
-        # Also store in old format for compatibility
-        store_request_details(data, {
-            "request_id": request_id,
-            "status": "completed",
-            "created_resources": request_record['created_resources']
-        })
+        # Provisioning runs in the background; the record tracks its progress
+        request_store.add(request_record)
+        job_id = job_queue.enqueue(PROVISION_JOB, {'request_id': request_id})
+        request_store.update(request_id, {'job_id': job_id})
         
-        return jsonify({
-            "request_id": request_id,
-            "status": "completed",
-            "created_resources": request_record['created_resources']
-        }), 200
+        return job_queued(job_id, request_id=request_id)
         
     except Exception as e:
         logger.error(f"Request submission failed: {e}")
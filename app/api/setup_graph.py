@@ -0,0 +1,152 @@
+"""Run /api/setup configurations as a dependency graph.
+
+Every subaccount, course, user and enrollment in a TestEnvironmentConfig is
+a node. A node can be given a name with "ref" and other nodes can point at
+it with "@name" wherever a Canvas id is expected, e.g.
+
+    {"subaccounts": [{"ref": "faculty", "name": "Faculty"},
+                     {"name": "Department", "account": "@faculty"}],
+     "courses": [{"ref": "intro", "name": "Intro", "course_code": "T1", "account": "@faculty"}],
+     "users": [{"ref": "alice", "name": "Alice", "email": "a@uva.nl", "login_id": "alice"}],
+     "enrollments": [{"course": "@intro", "user": "@alice"}]}
+
+Unnamed nodes can be referenced by position, e.g. "@courses.0". Each node
+runs as soon as the nodes it references have been created, independent
+nodes in parallel. A node whose dependency failed is skipped.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app.api.canvas_client import CanvasClient
+from app.config import Config
+from typing import Any, Dict, Optional
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Config sections in creation order, with the singular used in messages
+SECTIONS = (('subaccounts', 'subaccount'), ('courses', 'course'), ('users', 'user'), ('enrollments', 'enrollment'))
+
+# Short aliases accepted for id fields
+ALIASES = {
+    'subaccounts': {'account': 'parent_account_id', 'parent': 'parent_account_id'},
+    'courses': {'account': 'account_id'},
+    'users': {'account': 'account_id'},
+    'enrollments': {'course': 'course_id', 'user': 'user_id'}
+}
+
+class SetupNode:
+    """One Canvas object to create and the nodes it waits for"""
+
+    def __init__(self, key: str, section: str, index: int, fields: Dict):
+        self.key = key
+        self.section = section
+        self.index = index
+        self.fields = fields
+        self.depends_on = sorted({value[1:] for value in fields.values() if _is_ref(value)})
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return self.fields.get('name') or f"@{self.key}"
+
+def _is_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith('@') and len(value) > 1
+
+def compile_graph(config) -> Dict[str, SetupNode]:
+    """Turn a config into nodes keyed by name; raises ValueError for unknown refs and cycles"""
+    nodes: Dict[str, SetupNode] = {}
+    for section, _ in SECTIONS:
+        for index, item in enumerate(getattr(config, section) or []):
+            fields = dict(item)
+            for alias, field in ALIASES[section].items():
+                if alias in fields:
+                    fields[field] = fields.pop(alias)
+            key = fields.pop('ref', None) or f"{section}.{index}"
+            if key in nodes:
+                raise ValueError(f"Duplicate ref '{key}'")
+            nodes[key] = SetupNode(key, section, index, fields)
+
+    for node in nodes.values():
+        for dependency in node.depends_on:
+            if dependency not in nodes:
+                raise ValueError(f"Unknown reference '@{dependency}' in {_singular(node.section)} '{node.label}'")
+
+    # Kahn's algorithm: anything left over sits on a cycle
+    waiting = {key: len(node.depends_on) for key, node in nodes.items()}
+    ready = [key for key, count in waiting.items() if count == 0]
+    while ready:
+        key = ready.pop()
+        for other in nodes.values():
+            if key in other.depends_on:
+                waiting[other.key] -= 1
+                if waiting[other.key] == 0:
+                    ready.append(other.key)
+    cyclic = sorted(key for key, count in waiting.items() if count > 0)
+    if cyclic:
+        raise ValueError(f"Circular references between {', '.join('@' + key for key in cyclic)}")
+    return nodes
+
+def run_graph(client: CanvasClient, nodes: Dict[str, SetupNode], max_workers: Optional[int] = None) -> Dict:
+    """Create every node once its dependencies exist, in parallel where possible.
+
+    Returns created objects per section in config order, one error per
+    failed or skipped node, and the Canvas id behind every ref.
+    """
+    max_workers = max(1, min(max_workers or Config.PROVISIONING_MAX_WORKERS, len(nodes) or 1))
+    pending = dict(nodes)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='setup') as executor:
+        while pending or running:
+            for key, node in list(pending.items()):
+                dependencies = [nodes[dependency] for dependency in node.depends_on]
+                failed = [dependency for dependency in dependencies if dependency.error]
+                if failed:
+                    node.error = f"Skipped {_singular(node.section)} '{node.label}': @{failed[0].key} was not created"
+                    del pending[key]
+                elif all(dependency.result is not None for dependency in dependencies):
+                    del pending[key]
+                    future = executor.submit(contextvars.copy_context().run, _create, client, node, nodes)
+                    running[future] = node
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    node.result = future.result()
+                except Exception as e:
+                    node.error = f"Failed to create {_singular(node.section)} '{node.label}': {str(e)}"
+                    logger.error(node.error)
+
+    results = {section: [] for section, _ in SECTIONS}
+    results['errors'] = []
+    order = [section for section, _ in SECTIONS]
+    for node in sorted(nodes.values(), key=lambda node: (order.index(node.section), node.index)):
+        if node.result is not None:
+            results[node.section].append(node.result)
+        if node.error:
+            results['errors'].append(node.error)
+    results['refs'] = {key: node.result['id'] for key, node in nodes.items() if node.result is not None}
+    return results
+
+def _singular(section: str) -> str:
+    return dict(SECTIONS)[section]
+
+def _create(client: CanvasClient, node: SetupNode, nodes: Dict[str, SetupNode]) -> Dict:
+    """Resolve a node's refs to Canvas ids and create it"""
+    fields = {name: nodes[value[1:]].result['id'] if _is_ref(value) else value
+              for name, value in node.fields.items()}
+
+    if node.section == 'subaccounts':
+        parent_id = fields.pop('parent_account_id', None) or Config.ROOT_ACCOUNT_ID
+        return client.create_subaccount(parent_id, fields.pop('name'), **fields)
+    if node.section == 'courses':
+        account_id = fields.pop('account_id', None) or Config.ROOT_ACCOUNT_ID
+        return client.create_course(account_id, fields.pop('name'), fields.pop('course_code'), **fields)
+    if node.section == 'users':
+        account_id = fields.pop('account_id', None) or Config.ROOT_ACCOUNT_ID
+        return client.create_user(account_id, fields.pop('name'), fields.pop('email'), fields.pop('login_id'), **fields)
+    return client.enroll_user(fields['course_id'], fields['user_id'], fields.get('role', 'StudentEnrollment'))
@@ -0,0 +1,155 @@
+from app.api.canvas_client import CanvasClient
+from app.api.provisioning import build_user_specs, course_sis_id
+from app.config import Config
+from app.models.user_index import user_index
+from typing import Dict, List, Optional
+import csv
+import io
+import logging
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+SIS_ROLES = {
+    'StudentEnrollment': 'student',
+    'TeacherEnrollment': 'teacher'
+}
+
+CSV_COLUMNS = {
+    'users.csv': ['user_id', 'login_id', 'first_name', 'last_name', 'full_name', 'email', 'status'],
+    'courses.csv': ['course_id', 'short_name', 'long_name', 'account_id', 'status'],
+    'sections.csv': ['section_id', 'course_id', 'name', 'status'],
+    'enrollments.csv': ['course_id', 'user_id', 'role', 'section_id', 'status']
+}
+
+def build_sis_plan(request_id: str, courses: List[Dict], account_sis_id: Optional[str] = None,
+                   user_suffix: Optional[str] = None) -> Dict:
+    """Expand requested courses into SIS rows for users, courses, sections and enrollments.
+
+    Test users share login ids across courses of one request, so a user
+    appears once in users.csv and gets an enrollment row per course.
+    """
+    users = {}
+    plan = {'users.csv': [], 'courses.csv': [], 'sections.csv': [], 'enrollments.csv': []}
+
+    for index, course_config in enumerate(courses, start=1):
+        sis_id = course_sis_id(request_id, index)
+        plan['courses.csv'].append({
+            'course_id': sis_id,
+            'short_name': f"TEST-{request_id[-8:]}",
+            'long_name': course_config['name'],
+            'account_id': account_sis_id or '',
+            'status': 'active'
+        })
+
+        section_ids = [f"{sis_id}-S{n}" for n in range(1, max(course_config.get('sections', 1), 1) + 1)]
+        for n, section_id in enumerate(section_ids, start=1):
+            plan['sections.csv'].append({
+                'section_id': section_id,
+                'course_id': sis_id,
+                'name': f"{course_config['name']} - Section {n}",
+                'status': 'active'
+            })
+
+        students = 0
+        for spec in build_user_specs(request_id, course_config, user_suffix):
+            sis_user_id = spec['sis_user_id']
+            if sis_user_id not in users:
+                first_name, _, last_name = spec['name'].partition(' ')
+                users[sis_user_id] = {
+                    'user_id': sis_user_id,
+                    'login_id': spec['login_id'],
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'full_name': spec['name'],
+                    'email': spec['email'],
+                    'status': 'active'
+                }
+
+            # Spread students over the sections, teachers go in the first one
+            if spec['role'] == 'StudentEnrollment':
+                section_id = section_ids[students % len(section_ids)]
+                students += 1
+            else:
+                section_id = section_ids[0]
+
+            plan['enrollments.csv'].append({
+                'course_id': sis_id,
+                'user_id': sis_user_id,
+                'role': SIS_ROLES[spec['role']],
+                'section_id': section_id,
+                'status': 'active'
+            })
+
+    plan['users.csv'] = list(users.values())
+    return plan
+
+def build_sis_archive(plan: Dict) -> bytes:
+    """Write the SIS plan as CSV files into an in-memory zip"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, columns in CSV_COLUMNS.items():
+            rows = io.StringIO()
+            writer = csv.DictWriter(rows, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(plan[filename])
+            archive.writestr(filename, rows.getvalue())
+    return buffer.getvalue()
+
+def provision_with_sis_import(client: CanvasClient, request_id: str, courses: List[Dict],
+                              root_account_id: Optional[int] = None, account_sis_id: Optional[str] = None,
+                              user_suffix: Optional[str] = None) -> Dict:
+    """Provision courses, sections, users and enrollments with one SIS import.
+
+    Returns created resources in the same shape as the REST flow, mapped
+    back from SIS ids to Canvas ids, plus the final SIS import state.
+    """
+    resources = {'courses': [], 'users': [], 'errors': [], 'sis_import': None}
+    root_account_id = root_account_id or Config.ROOT_ACCOUNT_ID
+
+    plan = build_sis_plan(request_id, courses, account_sis_id, user_suffix)
+    archive = build_sis_archive(plan)
+    logger.info(
+        f"Submitting SIS import for {request_id}: {len(plan['users.csv'])} users, "
+        f"{len(plan['courses.csv'])} courses, {len(plan['enrollments.csv'])} enrollments"
+    )
+
+    sis_import = client.create_sis_import(root_account_id, archive, filename=f"{request_id}.zip")
+    sis_import = client.wait_for_sis_import(root_account_id, sis_import['id'])
+    resources['sis_import'] = sis_import
+
+    for file_name, message in sis_import['processing_errors']:
+        resources['errors'].append(f"SIS import error in {file_name}: {message}")
+
+    if sis_import['workflow_state'] in ('failed', 'failed_with_messages', 'aborted'):
+        resources['errors'].append(f"SIS import {sis_import['id']} {sis_import['workflow_state']}")
+        return resources
+
+    # Map SIS ids back to Canvas ids: one course lookup plus its enrollment pages per course
+    users_by_sis_id = {row['user_id']: row for row in plan['users.csv']}
+    seen_users = set()
+    for course_row in plan['courses.csv']:
+        try:
+            course = client.get_course_by_sis_id(course_row['course_id'])
+            resources['courses'].append(course)
+
+            for enrollment in client.list_course_enrollments(course['id']):
+                user = enrollment['user']
+                row = users_by_sis_id.get(user['sis_user_id'])
+                if row is None or user['id'] in seen_users:
+                    continue
+                seen_users.add(user['id'])
+                resources['users'].append({
+                    'id': user['id'],
+                    'name': row['full_name'],
+                    'email': row['email'],
+                    'login_id': row['login_id'],
+                    'sis_user_id': row['user_id']
+                })
+        except Exception as e:
+            error_msg = f"Failed to map SIS course {course_row['course_id']}: {str(e)}"
+            logger.error(error_msg)
+            resources['errors'].append(error_msg)
+
+    user_index.record(client.environment or 'default', resources['users'])
+    return resources
@@ -0,0 +1,139 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from app.config import Config
+from app.metrics import COUNTER, GAUGE, metrics
+from typing import Any, Callable, Dict, Tuple
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class StatusCache:
+    """In-process TTL cache that serves stale entries while one refresh runs per key.
+
+    Environment status normally comes from the local inventory; this cache
+    only fronts the first crawl of an environment that has none yet.
+    """
+
+    def __init__(self, ttl: float = None, max_stale: float = None, max_workers: int = 4):
+        self.ttl = ttl if ttl is not None else Config.STATUS_CACHE_TTL
+        self.max_stale = max_stale if max_stale is not None else Config.STATUS_CACHE_MAX_STALE
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='status-refresh')
+        self.counters = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Tuple[Any, Dict]:
+        """Return (value, info) for key, loading it with loader when needed.
+
+        Fresh entries are returned directly. Entries past the TTL but within
+        max_stale are returned immediately while a background refresh runs.
+        Missing or too old entries are loaded synchronously, and concurrent
+        callers for the same key wait on that single load.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            age = now - entry[0] if entry else None
+
+            if entry and age < self.ttl:
+                self.counters['hits'] += 1
+                return copy.deepcopy(entry[1]), {'cache': 'hit', 'age': round(age, 1)}
+
+            if entry and age < self.max_stale:
+                self.counters['stale_hits'] += 1
+                self._refresh(key, loader)
+                return copy.deepcopy(entry[1]), {'cache': 'stale', 'age': round(age, 1)}
+
+            self.counters['misses'] += 1
+            future = self._refresh(key, loader)
+
+        value = future.result()
+        return copy.deepcopy(value), {'cache': 'miss', 'age': 0}
+
+    def get_many(self, loaders: Dict[str, Callable[[], Any]], timeout: float) -> Dict[str, Tuple[Any, Dict]]:
+        """Like get for several keys at once, loading the missing ones concurrently.
+
+        Waits at most timeout seconds for loads; keys still loading then are
+        returned as (None, {'cache': 'pending'}) and their load carries on in
+        the background, so a later call finds them cached. Failed loads are
+        returned as (None, {'cache': 'error', 'error': message}).
+        """
+        results = {}
+        futures = {}
+        now = time.monotonic()
+        with self._lock:
+            for key, loader in loaders.items():
+                entry = self._entries.get(key)
+                age = now - entry[0] if entry else None
+                if entry and age < self.ttl:
+                    self.counters['hits'] += 1
+                    results[key] = (copy.deepcopy(entry[1]), {'cache': 'hit', 'age': round(age, 1)})
+                elif entry and age < self.max_stale:
+                    self.counters['stale_hits'] += 1
+                    self._refresh(key, loader)
+                    results[key] = (copy.deepcopy(entry[1]), {'cache': 'stale', 'age': round(age, 1)})
+                else:
+                    self.counters['misses'] += 1
+                    futures[key] = self._refresh(key, loader)
+
+        if futures:
+            wait(futures.values(), timeout=timeout)
+        for key, future in futures.items():
+            if not future.done():
+                results[key] = (None, {'cache': 'pending'})
+            elif future.exception() is not None:
+                results[key] = (None, {'cache': 'error', 'error': str(future.exception())})
+            else:
+                results[key] = (copy.deepcopy(future.result()), {'cache': 'miss', 'age': 0})
+        return results
+
+    def _refresh(self, key: str, loader: Callable[[], Any]) -> Future:
+        """Start a load for key unless one is already running; caller holds the lock"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+
+        self.counters['refreshes'] += 1
+        future = self._executor.submit(self._load, key, loader)
+        self._inflight[key] = future
+        return future
+
+    def _load(self, key: str, loader: Callable[[], Any]) -> Any:
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self.counters['errors'] += 1
+                self._inflight.pop(key, None)
+            logger.exception(f"Status refresh for {key} failed")
+            raise
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._inflight.pop(key, None)
+        return value
+
+    def stats(self) -> Dict:
+        """Counters plus the age of every cached entry"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'max_stale': self.max_stale,
+                **self.counters,
+                'entries': {key: {'age': round(now - stored_at, 1)}
+                            for key, (stored_at, _) in self._entries.items()}
+            }
+
+status_cache = StatusCache()
+
+def _collect_metrics():
+    stats = status_cache.stats()
+    for name in ('hits', 'stale_hits', 'misses', 'refreshes', 'errors'):
+        yield 'status_cache_events_total', COUNTER, 'Environment status cache lookups and refreshes', {'event': name}, stats[name]
+    yield 'status_cache_entries', GAUGE, 'Environments with a cached status', {}, len(stats['entries'])
+
+metrics.collector(_collect_metrics)
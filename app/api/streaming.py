@@ -0,0 +1,63 @@
+"""Streamed JSON list responses.
+
+List endpoints hand an iterator (a storage query or a Canvas pagination
+generator) to stream_list, which writes the items out as they are
+produced, so a response never holds the whole list in memory. Items are
+sent as one JSON array by default, or as NDJSON (one object per line)
+for ?format=ndjson or Accept: application/x-ndjson, which lets clients
+render rows as they arrive. Writing them needs no request context, so
+the generator is not wrapped in stream_with_context.
+"""
+from flask import Response, request
+from typing import Dict, Iterable, Optional
+import itertools
+import json
+
+NDJSON = 'application/x-ndjson'
+
+# Items are written in chunks of about this many bytes rather than one by one
+CHUNK_BYTES = 64 * 1024
+
+_END = object()
+
+def wants_ndjson() -> bool:
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match([NDJSON, 'application/json']) == NDJSON
+
+def stream_list(items: Iterable, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Stream items as a JSON array or NDJSON.
+
+    The first item is produced before the response starts, so errors from
+    the first query or page still turn into an error status in the caller.
+    """
+    items = iter(items)
+    first = next(items, _END)
+    ndjson = wants_ndjson()
+
+    def generate():
+        chunk = [] if ndjson else ['[']
+        size = 0
+        if first is not _END:
+            for index, item in enumerate(itertools.chain([first], items)):
+                line = json.dumps(item)
+                if ndjson:
+                    chunk.append(line + '\n')
+                else:
+                    chunk.append(line if index == 0 else ',' + line)
+                size += len(line)
+                if size >= CHUNK_BYTES:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+        if not ndjson:
+            chunk.append(']')
+        if chunk:
+            yield ''.join(chunk)
+
+    response = Response(generate(), mimetype=NDJSON if ndjson else 'application/json')
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Vary'] = 'Accept'
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
@@ -0,0 +1,260 @@
+"""Warm pool of ready-made, unenrolled test users per environment.
+
+A filler thread keeps USER_POOL_SIZE users available in every pooled
+environment. Provisioning takes generic students from the pool so it
+only has to enroll them. Canvas can't delete users, so cleanup renames a
+request's users and returns them to the pool instead.
+"""
+from app.api.client_registry import get_client
+from app.api.provisioning import run_bounded
+from app.config import Config
+from app.metrics import COUNTER, GAUGE, metrics
+from app.models.database import Database, get_database
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import socket
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pool_users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    environment TEXT NOT NULL,
+    canvas_user_id INTEGER NOT NULL,
+    login_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    request_id TEXT,
+    created_at TEXT NOT NULL,
+    taken_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pool_users_available ON pool_users (environment, status, id);
+CREATE INDEX IF NOT EXISTS idx_pool_users_request ON pool_users (request_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pool_users_canvas ON pool_users (environment, canvas_user_id);
+CREATE TABLE IF NOT EXISTS pool_stats (
+    environment TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    filler TEXT,
+    lease_until TEXT
+);
+"""
+
+AVAILABLE = 'available'
+TAKEN = 'taken'
+
+# Where a pool user came from: created by the filler or recycled by cleanup
+FILLED = 'filled'
+RECYCLED = 'recycled'
+
+POOL_USER_NAME = 'Test Student (pool)'
+
+def pool_environments() -> List[str]:
+    """Environments the filler keeps stocked (by default every one with Canvas credentials)"""
+    if Config.USER_POOL_ENVIRONMENTS:
+        return [env.strip() for env in Config.USER_POOL_ENVIRONMENTS.split(',') if env.strip()]
+    return Config.configured_environments()
+
+def pool_enabled(environment: Optional[str]) -> bool:
+    return Config.USER_POOL_SIZE > 0 and environment in pool_environments()
+
+class UserPool:
+    """SQLite-backed pool of pre-created test users, shared by all processes"""
+
+    def __init__(self, database: Database = None):
+        self._database = database
+        self._thread = None
+        self._stop = threading.Event()
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def db(self) -> Database:
+        database = self._database or get_database()
+        database.ensure_schema('user_pool', SCHEMA)
+        return database
+
+    def take(self, environment: str, count: int, request_id: str, exclude: Iterable[int] = ()) -> List[Dict]:
+        """Hand up to count available users to a request.
+
+        Users this request took before but hasn't recorded (their Canvas ids
+        are not in exclude, e.g. after a crash) are returned first, so
+        retrying a run never drains the pool twice.
+        """
+        now = datetime.now().isoformat()
+        exclude = set(exclude)
+        with self.db.transaction() as conn:
+            users = [row for row in conn.execute(
+                'SELECT * FROM pool_users WHERE request_id = ? AND status = ? ORDER BY id', (request_id, TAKEN)
+            ) if row['canvas_user_id'] not in exclude][:count]
+            fresh = conn.execute(
+                'SELECT * FROM pool_users WHERE environment = ? AND status = ? ORDER BY id LIMIT ?',
+                (environment, AVAILABLE, count - len(users))
+            ).fetchall()
+            conn.executemany(
+                'UPDATE pool_users SET status = ?, request_id = ?, taken_at = ? WHERE id = ?',
+                [(TAKEN, request_id, now, row['id']) for row in fresh]
+            )
+            self._count(conn, environment, hits=len(fresh), misses=count - len(users) - len(fresh))
+        return [self._user(row) for row in users + fresh]
+
+    def add(self, environment: str, users: List[Dict], source: str = FILLED):
+        """Make users available; pool users coming back keep their original source and creation time"""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.executemany(
+                'INSERT INTO pool_users (environment, canvas_user_id, login_id, name, email, status, source, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (environment, canvas_user_id) DO UPDATE SET status = excluded.status, '
+                'name = excluded.name, request_id = NULL, taken_at = NULL',
+                [(environment, user['id'], user['login_id'], user['name'], user.get('email'), AVAILABLE, source, now)
+                 for user in users]
+            )
+
+    def release(self, environment: str, users: List[Dict], max_workers: int = None) -> Dict:
+        """Rename a cleaned-up request's users and return them to the pool"""
+        client = get_client(environment)
+        recycled = []
+        errors = []
+        for user, renamed, error in run_bounded(
+            lambda user: client.update_user(user['id'], name=POOL_USER_NAME), users, max_workers
+        ):
+            if error is not None:
+                errors.append(f"Failed to recycle user {user.get('login_id', user['id'])}: {error}")
+                continue
+            recycled.append({**user, 'name': POOL_USER_NAME})
+        self.add(environment, recycled, source=RECYCLED)
+        return {'recycled': len(recycled), 'errors': errors}
+
+    def fill(self, environment: str) -> int:
+        """Create up to USER_POOL_REFILL_BATCH users if the environment is below its target depth"""
+        missing = Config.USER_POOL_SIZE - self.depth(environment)
+        if missing <= 0 or not self._claim_filler(environment):
+            return 0
+
+        client = get_client(environment)
+        batch = min(missing, Config.USER_POOL_REFILL_BATCH)
+
+        def create(_):
+            login_id = f"tpool_{uuid.uuid4().hex[:12]}"
+            return client.create_user(
+                account_id=Config.ROOT_ACCOUNT_ID,
+                name=POOL_USER_NAME,
+                email=f"{login_id}@test.uva.nl",
+                login_id=login_id,
+                sis_user_id=login_id
+            )
+
+        created = [user for _, user, error in run_bounded(create, range(batch)) if error is None]
+        self.add(environment, created)
+        if len(created) < batch:
+            logger.warning(f"User pool for {environment}: created {len(created)} of {batch} users")
+        return len(created)
+
+    def depth(self, environment: str) -> int:
+        return self.db.connection().execute(
+            'SELECT COUNT(*) FROM pool_users WHERE environment = ? AND status = ?', (environment, AVAILABLE)
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Dict]:
+        """Depth, refill rate and hit rate per pooled environment"""
+        conn = self.db.connection()
+        hour_ago = (datetime.now() - timedelta(hours=1)).isoformat()
+        result = {}
+        for environment in pool_environments():
+            available, taken, filled_last_hour = conn.execute(
+                'SELECT SUM(status = ?), SUM(status = ?), SUM(source = ? AND created_at >= ?) '
+                'FROM pool_users WHERE environment = ?',
+                (AVAILABLE, TAKEN, FILLED, hour_ago, environment)
+            ).fetchone()
+            counts = conn.execute(
+                'SELECT hits, misses FROM pool_stats WHERE environment = ?', (environment,)
+            ).fetchone()
+            hits, misses = (counts['hits'], counts['misses']) if counts else (0, 0)
+            result[environment] = {
+                'target': Config.USER_POOL_SIZE,
+                'depth': available or 0,
+                'taken': taken or 0,
+                'refilled_last_hour': filled_last_hour or 0,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None
+            }
+        return result
+
+    def start(self):
+        """Start the background filler in this process"""
+        if self._thread or Config.USER_POOL_SIZE <= 0:
+            return
+        self._thread = threading.Thread(target=self._work, name='user-pool-filler', daemon=True)
+        self._thread.start()
+        logger.info(f"Started user pool filler as {self.worker_name}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            for environment in pool_environments():
+                try:
+                    self.fill(environment)
+                except Exception:
+                    logger.exception(f"User pool refill for {environment} failed")
+            self._stop.wait(Config.USER_POOL_REFILL_INTERVAL)
+
+    def _claim_filler(self, environment: str) -> bool:
+        """Let one process at a time refill an environment"""
+        now = datetime.now()
+        with self.db.transaction() as conn:
+            self._count(conn, environment)
+            row = conn.execute(
+                'SELECT filler, lease_until FROM pool_stats WHERE environment = ?', (environment,)
+            ).fetchone()
+            if row['filler'] not in (None, self.worker_name) and row['lease_until'] > now.isoformat():
+                return False
+            lease = now + timedelta(seconds=Config.USER_POOL_REFILL_INTERVAL * 2)
+            conn.execute(
+                'UPDATE pool_stats SET filler = ?, lease_until = ? WHERE environment = ?',
+                (self.worker_name, lease.isoformat(), environment)
+            )
+        return True
+
+    @staticmethod
+    def _count(conn, environment: str, hits: int = 0, misses: int = 0):
+        conn.execute(
+            'INSERT INTO pool_stats (environment, hits, misses) VALUES (?, ?, ?) '
+            'ON CONFLICT (environment) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses',
+            (environment, hits, misses)
+        )
+
+    @staticmethod
+    def _user(row) -> Dict:
+        return {
+            'id': row['canvas_user_id'],
+            'name': row['name'],
+            'email': row['email'],
+            'login_id': row['login_id'],
+            'pool': True
+        }
+
+user_pool = UserPool()
+
+def _collect_metrics():
+    if Config.USER_POOL_SIZE <= 0:
+        return
+    for environment, stats in user_pool.stats().items():
+        labels = {'environment': environment}
+        yield 'user_pool_depth', GAUGE, 'Available pre-created test users', labels, stats['depth']
+        yield 'user_pool_target', GAUGE, 'Target number of available test users', labels, stats['target']
+        yield 'user_pool_taken', GAUGE, 'Pool users currently held by requests', labels, stats['taken']
+        yield 'user_pool_lookups_total', COUNTER, 'Pool users handed out (hit) or missing (miss)', \
+            {**labels, 'result': 'hit'}, stats['hits']
+        yield 'user_pool_lookups_total', COUNTER, 'Pool users handed out (hit) or missing (miss)', \
+            {**labels, 'result': 'miss'}, stats['misses']
+
+metrics.collector(_collect_metrics)
@@ -0,0 +1,41 @@
+"""Background job that checks the test user index against Canvas.
+
+One paginated listing of the root account's users (pages prefetched in
+parallel) replaces a lookup per indexed user. Test users Canvas has but the
+index lacks, e.g. created before the index existed, are adopted so they can
+be reused too.
+"""
+from app.api.client_registry import get_client
+from app.api.jobs import JobContext, job_queue
+from app.config import Config
+from app.models.user_index import user_index
+from typing import Dict
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = 'reconcile_users'
+
+# Logins generated by build_user_specs
+TEST_LOGIN = re.compile(r'^t(student|teacher)\d+_[0-9a-f]{8}$')
+
+def reconcile_users(job: JobContext, payload: Dict) -> Dict:
+    """Job handler: reconcile one environment's user index"""
+    environment = payload['environment']
+    client = get_client(environment)
+
+    job.phase('listing')
+    canvas_users = []
+    for user in client.iter_account_users(Config.ROOT_ACCOUNT_ID):
+        canvas_users.append(user)
+        if len(canvas_users) % 1000 == 0:
+            job.event('users_listed', count=len(canvas_users))
+
+    job.phase('reconcile', 1)
+    counts = user_index.reconcile(environment, canvas_users,
+                                  adopt=lambda user: bool(TEST_LOGIN.match(user['login_id'])))
+    job.advance('reconcile', event='index_reconciled', **counts)
+    return {'environment': environment, 'canvas_users': len(canvas_users), **counts}
+
+job_queue.register(JOB_KIND, reconcile_users)
@@ -15,9 +15,133 @@ class Config:
     CANVAS_API_URL = os.getenv('CANVAS_API_URL')
     CANVAS_API_TOKEN = os.getenv('CANVAS_API_TOKEN')
     
+    # Canvas root account: parent of new subaccounts and default home of courses and users
+    ROOT_ACCOUNT_ID = int(os.getenv('CANVAS_ROOT_ACCOUNT_ID', 1))
+    
     # Test environments
     TEST_ENVIRONMENTS = {
         'acceptatie': os.getenv('TEST_ENV_ACCEPTATIE'),
         'test': os.getenv('TEST_ENV_TEST'),
         'development': os.getenv('TEST_ENV_DEVELOPMENT')
-    }
\ No newline at end of file
+    }
+    
+    # Template courses copied into every course of a scenario, as a Canvas course id
+    # or an 'sis_course_id:...' reference that resolves in each environment
+    SCENARIO_TEMPLATES = {
+        'assignment-workflow': os.getenv('TEMPLATE_COURSE_ASSIGNMENT_WORKFLOW')
+    }
+    
+    # Shared HTTP connection pool per Canvas client, sized to worker concurrency
+    CANVAS_POOL_SIZE = int(os.getenv('CANVAS_POOL_SIZE', os.getenv('GUNICORN_THREADS', 10)))
+
+    # Maximum parallel Canvas calls when provisioning users for a course
+    PROVISIONING_MAX_WORKERS = int(os.getenv('PROVISIONING_MAX_WORKERS', 8))
+
+    # Requests with more test users than this are provisioned through SIS import
+    SIS_IMPORT_THRESHOLD = int(os.getenv('SIS_IMPORT_THRESHOLD', 200))
+    SIS_IMPORT_TIMEOUT = int(os.getenv('SIS_IMPORT_TIMEOUT', 900))
+    SIS_IMPORT_POLL_INTERVAL = float(os.getenv('SIS_IMPORT_POLL_INTERVAL', 2))
+
+    # Environment status cache, used only until an environment's inventory has been crawled
+    # once: fresh for TTL seconds, served stale up to MAX_STALE
+    STATUS_CACHE_TTL = float(os.getenv('STATUS_CACHE_TTL', 60))
+    STATUS_CACHE_MAX_STALE = float(os.getenv('STATUS_CACHE_MAX_STALE', 600))
+    # Seconds /api/environments/status waits before reporting slow environments as pending
+    STATUS_DEADLINE = float(os.getenv('STATUS_DEADLINE', 2))
+
+    # Pages fetched ahead concurrently when listing large collections
+    LISTING_PREFETCH_PAGES = int(os.getenv('LISTING_PREFETCH_PAGES', 4))
+
+    # Embedded database for request records and other local state
+    DATABASE_PATH = os.getenv(
+        'DATABASE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'canvas_test.db')
+    )
+    
+    # Append-only JSONL log of finished requests, relative to the working directory
+    REQUEST_LOG_PATH = os.getenv('REQUEST_LOG_PATH', 'request_log.jsonl')
+
+    # Background job workers per process (0 disables them, e.g. when run separately)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 2))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))
+    JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', 0.5))
+
+    # Server-Sent Events: each stream closes after MAX_STREAM_SECONDS and the browser resumes it
+    SSE_MAX_STREAM_SECONDS = float(os.getenv('SSE_MAX_STREAM_SECONDS', 25))
+    SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 0.5))
+    SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 1000))
+
+    # Batched course deletion: ids per account-level batch call and progress polling
+    COURSE_BATCH_SIZE = int(os.getenv('COURSE_BATCH_SIZE', 500))
+    PROGRESS_TIMEOUT = int(os.getenv('PROGRESS_TIMEOUT', 300))
+    PROGRESS_POLL_INTERVAL = float(os.getenv('PROGRESS_POLL_INTERVAL', 1))
+    
+    # Adaptive Canvas concurrency: the cap on in-flight requests per client grows while
+    # X-Rate-Limit-Remaining stays above LOW_WATER and halves below it or when throttled
+    RATE_LIMIT_INITIAL_CONCURRENCY = int(os.getenv('RATE_LIMIT_INITIAL_CONCURRENCY', 4))
+    RATE_LIMIT_MIN_CONCURRENCY = int(os.getenv('RATE_LIMIT_MIN_CONCURRENCY', 1))
+    RATE_LIMIT_MAX_CONCURRENCY = int(os.getenv('RATE_LIMIT_MAX_CONCURRENCY', 16))
+    RATE_LIMIT_LOW_WATER = float(os.getenv('RATE_LIMIT_LOW_WATER', 200))
+    RATE_LIMIT_PACING_DELAY = float(os.getenv('RATE_LIMIT_PACING_DELAY', 1))
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', 5))
+    RATE_LIMIT_BACKOFF_BASE = float(os.getenv('RATE_LIMIT_BACKOFF_BASE', 1))
+    RATE_LIMIT_BACKOFF_MAX = float(os.getenv('RATE_LIMIT_BACKOFF_MAX', 30))
+    
+    # Warm pool of pre-created test users per environment (USER_POOL_SIZE=0 disables it);
+    # the filler creates up to REFILL_BATCH users per environment every REFILL_INTERVAL seconds
+    USER_POOL_SIZE = int(os.getenv('USER_POOL_SIZE', 0))
+    USER_POOL_REFILL_BATCH = int(os.getenv('USER_POOL_REFILL_BATCH', 20))
+    USER_POOL_REFILL_INTERVAL = float(os.getenv('USER_POOL_REFILL_INTERVAL', 60))
+    USER_POOL_ENVIRONMENTS = os.getenv('USER_POOL_ENVIRONMENTS', '')
+    
+    # Content migrations from template courses may take a while on large templates
+    CONTENT_MIGRATION_TIMEOUT = int(os.getenv('CONTENT_MIGRATION_TIMEOUT', 900))
+
+    # Test user logins per 'requester' (reused by their next requests) or per 'request'
+    USER_IDENTITY_SCOPE = os.getenv('USER_IDENTITY_SCOPE', 'requester')
+    
+    # Requests whose plan exceeds these are refused before any Canvas call (0 disables a limit)
+    PLAN_MAX_CANVAS_CALLS = int(os.getenv('PLAN_MAX_CANVAS_CALLS', 20000))
+    PLAN_MAX_SECONDS = float(os.getenv('PLAN_MAX_SECONDS', 7200))
+    
+    # Catch the local inventory up with Canvas every SYNC_INTERVAL seconds (0 disables the
+    # background sync) and replace it with a full crawl every FULL_SYNC_INTERVAL seconds
+    INVENTORY_SYNC_INTERVAL = float(os.getenv('INVENTORY_SYNC_INTERVAL', 300))
+    INVENTORY_FULL_SYNC_INTERVAL = float(os.getenv('INVENTORY_FULL_SYNC_INTERVAL', 86400))
+    
+    # Stored created_resources of at least this many bytes are zlib compressed (0 disables it)
+    RESOURCES_COMPRESS_MIN_BYTES = int(os.getenv('RESOURCES_COMPRESS_MIN_BYTES', 16384))
+    
+    # Expired, uncleaned requests are cleaned up every SWEEP_INTERVAL seconds (0 disables it)
+    # inside CLEANUP_WINDOW (local "HH:MM-HH:MM", empty for any time): up to SWEEP_BATCH
+    # requests per sweep, CLEANUP_MAX_WORKERS at a time, giving up on a request after MAX_ATTEMPTS
+    CLEANUP_SWEEP_INTERVAL = float(os.getenv('CLEANUP_SWEEP_INTERVAL', 900))
+    CLEANUP_WINDOW = os.getenv('CLEANUP_WINDOW', '22:00-06:00')
+    CLEANUP_SWEEP_BATCH = int(os.getenv('CLEANUP_SWEEP_BATCH', 20))
+    CLEANUP_MAX_WORKERS = int(os.getenv('CLEANUP_MAX_WORKERS', 2))
+    CLEANUP_MAX_ATTEMPTS = int(os.getenv('CLEANUP_MAX_ATTEMPTS', 3))
+    
+    # Start the job workers, pool filler, inventory sync and expiry sweeper with the web server
+    BACKGROUND_WORKERS = os.getenv('BACKGROUND_WORKERS', 'true').lower() == 'true'
+    
+    @classmethod
+    def canvas_credentials(cls, environment: str = None):
+        """Resolve the Canvas base URL and token for an environment.
+        
+        CANVAS_API_URL_<ENV> / CANVAS_API_TOKEN_<ENV> (e.g. CANVAS_API_TOKEN_TEST)
+        come first, then the environment's TEST_ENV_<ENV> URL, then the global
+        CANVAS_API_URL / CANVAS_API_TOKEN, all read from os.environ on every call.
+        """
+        url = os.getenv('CANVAS_API_URL', cls.CANVAS_API_URL)
+        token = os.getenv('CANVAS_API_TOKEN', cls.CANVAS_API_TOKEN)
+        if environment:
+            suffix = environment.upper()
+            url = os.getenv(f'CANVAS_API_URL_{suffix}') or os.getenv(f'TEST_ENV_{suffix}') or url
+            token = os.getenv(f'CANVAS_API_TOKEN_{suffix}') or token
+        return url, token
+    
+    @classmethod
+    def configured_environments(cls):
+        """Test environments with both a Canvas URL and a token"""
+        return [env for env in cls.TEST_ENVIRONMENTS if all(cls.canvas_credentials(env))]
@@ -1,10 +1,16 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, Response, g, render_template, request, redirect, url_for
 from flask_cors import CORS
 from flask_httpauth import HTTPBasicAuth
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.api.expiry_sweeper import expiry_sweeper
+from app.api.inventory_sync import inventory_sync
+from app.api.jobs import job_queue
 from app.api.routes import api_bp
+from app.api.user_pool import user_pool
 from app.config import Config
+from app.metrics import metrics
 import os
+import time
 
 # Create Flask app
 app = Flask(__name__)
@@ -31,6 +37,39 @@ def verify_password(username, password):
 # Register blueprints
 app.register_blueprint(api_bp, url_prefix='/api')
 
+def start_background_workers():
+    """Start this process's background threads; run.py calls it, importing the app does not"""
+    if not Config.BACKGROUND_WORKERS:
+        return
+
+    # Background workers for queued provisioning jobs (JOB_WORKERS=0 to run them elsewhere)
+    job_queue.start()
+
+    # Keep the warm test user pools stocked (only when USER_POOL_SIZE > 0)
+    user_pool.start()
+
+    # Catch the local inventory up with changes made outside the app (INVENTORY_SYNC_INTERVAL=0 disables it)
+    inventory_sync.start()
+
+    # Clean up expired requests during the off-peak window (CLEANUP_SWEEP_INTERVAL=0 disables it)
+    expiry_sweeper.start()
+
+# Latency of every route, registered before auth so rejected requests are timed too
+metrics.histogram('http_request_seconds', 'Duration of HTTP requests by route, method and status')
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_seconds', time.perf_counter() - started,
+                        route=route, method=request.method, status=response.status_code)
+    return response
+
 # Apply auth to all routes
 @app.before_request
 @auth.login_required
@@ -67,6 +106,11 @@ def requests_list():
 def request_details(request_id):
     return redirect(url_for('requests_list'))
 
+@app.route('/metrics')
+@auth.login_required
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def not_found(error):
     return {"error": "Resource not found"}, 404
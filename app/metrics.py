@@ -0,0 +1,228 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms are declared once per process and served at
+/metrics. Collectors add values computed at scrape time (rate limit
+budgets, pool depths, cache counters).
+
+Timings recorded with timed() also feed the current TimingBreakdown, if
+one is tracked (see track_timings), so a single unit of work such as one
+provisioning run can report where its time went.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from quick SQLite reads to slow Canvas batch calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Weight of the newest observation in the recent mean of a series
+RECENT_WEIGHT = 0.2
+
+# A scrape-time sample: (name, type, help, labels, value)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._values: Dict[str, Dict[Tuple, object]] = {}
+        self._recent: Dict[Tuple[str, Tuple], float] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, help: str):
+        self._declare(name, COUNTER, help)
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._declare(name, HISTOGRAM, help)
+        self._buckets[name] = tuple(sorted(buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Sample]]):
+        """Register a function returning samples computed at scrape time"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        buckets = self._buckets[name]
+        with self._lock:
+            series = self._values[name]
+            counts, total, observed = series.get(key, ([0] * len(buckets), 0.0, 0))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[key] = (counts, total + value, observed + 1)
+            previous = self._recent.get((name, key))
+            self._recent[(name, key)] = value if previous is None else previous + RECENT_WEIGHT * (value - previous)
+
+    def recent(self, name: str, **labels) -> Optional[float]:
+        """Exponentially weighted mean of a histogram series' recent observations, None if never observed"""
+        with self._lock:
+            return self._recent.get((name, _label_key(labels)))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            snapshot = {
+                name: {key: (list(value[0]), *value[1:]) if isinstance(value, tuple) else value
+                       for key, value in series.items()}
+                for name, series in self._values.items()
+            }
+            collectors = list(self._collectors)
+
+        for name, series in snapshot.items():
+            kind, help = self._meta[name]
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(series.items()):
+                if kind == HISTOGRAM:
+                    lines.extend(self._histogram_lines(name, key, *value))
+                else:
+                    lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+
+        # Samples of one metric must be listed together, whichever order collectors yield them in
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collect in collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                logger.exception(f"Metrics collector {collect.__module__}.{collect.__name__} failed")
+                continue
+            for name, kind, help, labels, value in samples:
+                if value is not None:
+                    family = families.setdefault(name, (kind, help, []))
+                    family[2].append(f'{name}{_format_labels(_label_key(labels))} {_format_value(value)}')
+        for name, (kind, help, samples) in families.items():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, name: str, key: Tuple, counts: List[int], total: float, observed: int) -> List[str]:
+        lines = []
+        for bound, count in zip(self._buckets[name], counts):
+            lines.append(f'{name}_bucket{_format_labels(key + (("le", _format_value(bound)),))} {count}')
+        lines.append(f'{name}_bucket{_format_labels(key + (("le", "+Inf"),))} {observed}')
+        lines.append(f'{name}_sum{_format_labels(key)} {_format_value(round(total, 6))}')
+        lines.append(f'{name}_count{_format_labels(key)} {observed}')
+        return lines
+
+    def _declare(self, name: str, kind: str, help: str):
+        with self._lock:
+            self._meta[name] = (kind, help)
+            self._values.setdefault(name, {})
+
+class TimingBreakdown:
+    """Seconds and call counts per category (and operation) for one unit of work.
+
+    Work fanned out to other threads is summed, so categories can add up to
+    more than the wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._categories: Dict[str, Dict] = {}
+
+    def add(self, category: str, seconds: float, operation: Optional[str] = None, error: bool = False):
+        with self._lock:
+            entry = self._categories.setdefault(category, {'calls': 0, 'errors': 0, 'seconds': 0.0, 'operations': {}})
+            entries = [entry]
+            if operation:
+                entries.append(entry['operations'].setdefault(operation, {'calls': 0, 'errors': 0, 'seconds': 0.0}))
+            for item in entries:
+                item['calls'] += 1
+                item['errors'] += int(error)
+                item['seconds'] += seconds
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            categories = {
+                category: {
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'seconds': round(entry['seconds'], 3),
+                    'operations': {
+                        operation: {**stats, 'seconds': round(stats['seconds'], 3)}
+                        for operation, stats in sorted(entry['operations'].items(),
+                                                       key=lambda item: -item[1]['seconds'])
+                    }
+                }
+                for category, entry in self._categories.items()
+            }
+        return {'total_seconds': round(time.perf_counter() - self._started, 3), 'categories': categories}
+
+_breakdown: ContextVar[Optional[TimingBreakdown]] = ContextVar('timing_breakdown', default=None)
+_active_categories: ContextVar[frozenset] = ContextVar('active_timing_categories', default=frozenset())
+
+@contextmanager
+def track_timings():
+    """Collect a TimingBreakdown for everything timed in this context (and run_bounded workers)"""
+    breakdown = TimingBreakdown()
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+def record_timing(category: str, seconds: float, operation: Optional[str] = None, error: bool = False):
+    """Add time to the current breakdown, if one is tracked"""
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.add(category, seconds, operation, error)
+
+@contextmanager
+def timed(histogram: str, category: str, operation: str, **labels):
+    """Observe the duration of a block in histogram and the current breakdown.
+
+    Usable as a decorator as well. Calls nested in a block of the same
+    category (a wait polling a get) only count once in the breakdown.
+    """
+    active = _active_categories.get()
+    token = _active_categories.set(active | {category})
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        _active_categories.reset(token)
+        metrics.observe(histogram, seconds, operation=operation, outcome='error' if error else 'ok', **labels)
+        if category not in active:
+            record_timing(category, seconds, operation, error)
+
+metrics = Metrics()
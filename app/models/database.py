@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from app.config import Config
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+class Database:
+    """Embedded SQLite database shared by the app's stores.
+
+    Each thread gets its own connection. WAL mode lets readers run while one
+    writer commits, and the busy timeout makes concurrent gunicorn workers
+    wait for the write lock instead of failing.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.DATABASE_PATH
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schemas = set()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def snapshot(self) -> sqlite3.Connection:
+        """A separate connection in a read transaction, for reads that must see the same data.
+
+        The snapshot is taken by the first query and held until the caller
+        closes the connection, without blocking the thread's own connection.
+        """
+        conn = self._connect()
+        conn.execute('BEGIN')
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in one write transaction, taking the write lock up front"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def ensure_schema(self, name: str, statements: str):
+        """Create tables and indexes for a store once per process"""
+        if name in self._schemas:
+            return
+        with self._schema_lock:
+            if name in self._schemas:
+                return
+            self.connection().executescript(statements)
+            self._schemas.add(name)
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+def get_database(path: str = None) -> Database:
+    """Get the shared Database for a path (defaults to Config.DATABASE_PATH)"""
+    path = path or Config.DATABASE_PATH
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path)
+        return _databases[path]
@@ -0,0 +1,271 @@
+"""Local mirror of the subaccounts and courses in each Canvas environment.
+
+CanvasClient records the subaccounts and courses it creates, finds and
+deletes here, and the inventory sync (app.api.inventory_sync) catches up
+with changes made outside the app. Per-environment totals are kept in
+inventory_state as rows change, so environment status is a single row read.
+"""
+from app.models.database import Database, get_database
+from app.models.paging import keyset_page
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_accounts (
+    environment TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    parent_account_id INTEGER,
+    workflow_state TEXT,
+    seen_at TEXT NOT NULL,
+    PRIMARY KEY (environment, id)
+);
+CREATE TABLE IF NOT EXISTS inventory_courses (
+    environment TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    course_code TEXT,
+    sis_course_id TEXT,
+    account_id INTEGER,
+    workflow_state TEXT,
+    created_at TEXT,
+    seen_at TEXT NOT NULL,
+    PRIMARY KEY (environment, id)
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_courses_created ON inventory_courses (environment, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_inventory_courses_account ON inventory_courses (environment, account_id, created_at, id);
+CREATE TABLE IF NOT EXISTS inventory_state (
+    environment TEXT PRIMARY KEY,
+    root_account_id INTEGER,
+    subaccounts INTEGER NOT NULL DEFAULT 0,
+    courses INTEGER NOT NULL DEFAULT 0,
+    last_created_at TEXT,
+    course_watermark TEXT,
+    synced_at TEXT,
+    full_synced_at TEXT
+);
+"""
+
+class Inventory:
+    """SQLite-backed subaccount and course mirror per environment"""
+
+    def __init__(self, database: Database = None):
+        self._database = database
+
+    @property
+    def db(self) -> Database:
+        database = self._database or get_database()
+        database.ensure_schema('inventory', SCHEMA)
+        return database
+
+    def add_accounts(self, environment: str, accounts: Iterable[Dict]):
+        """Add or refresh subaccounts that exist in Canvas"""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            self._state(conn, environment)
+            added = 0
+            for account in accounts:
+                added += conn.execute(
+                    'INSERT INTO inventory_accounts (environment, id, name, parent_account_id, workflow_state, seen_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (environment, id) DO NOTHING',
+                    (environment, account['id'], account.get('name'), account.get('parent_account_id'),
+                     account.get('workflow_state'), now)
+                ).rowcount
+                conn.execute(
+                    'UPDATE inventory_accounts SET name = ?, parent_account_id = ?, workflow_state = ?, seen_at = ? '
+                    'WHERE environment = ? AND id = ?',
+                    (account.get('name'), account.get('parent_account_id'), account.get('workflow_state'), now,
+                     environment, account['id'])
+                )
+            conn.execute('UPDATE inventory_state SET subaccounts = subaccounts + ? WHERE environment = ?',
+                         (added, environment))
+
+    def add_courses(self, environment: str, courses: Iterable[Dict]) -> int:
+        """Add or refresh courses that exist in Canvas; returns how many were new"""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            self._state(conn, environment)
+            added = 0
+            newest = None
+            for course in courses:
+                added += conn.execute(
+                    'INSERT INTO inventory_courses (environment, id, name, course_code, sis_course_id, account_id, '
+                    'workflow_state, created_at, seen_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (environment, id) DO NOTHING',
+                    (environment, course['id'], course.get('name'), course.get('course_code'),
+                     course.get('sis_course_id'), course.get('account_id'), course.get('workflow_state'),
+                     course.get('created_at'), now)
+                ).rowcount
+                conn.execute(
+                    'UPDATE inventory_courses SET name = ?, course_code = ?, '
+                    'sis_course_id = COALESCE(?, sis_course_id), account_id = COALESCE(?, account_id), '
+                    'workflow_state = ?, created_at = COALESCE(created_at, ?), seen_at = ? '
+                    'WHERE environment = ? AND id = ?',
+                    (course.get('name'), course.get('course_code'), course.get('sis_course_id'),
+                     course.get('account_id'), course.get('workflow_state'), course.get('created_at'), now,
+                     environment, course['id'])
+                )
+                if course.get('created_at') and (newest is None or course['created_at'] > newest):
+                    newest = course['created_at']
+            conn.execute(
+                'UPDATE inventory_state SET courses = courses + ?, '
+                'last_created_at = COALESCE(MAX(COALESCE(last_created_at, ?), ?), last_created_at) '
+                'WHERE environment = ?',
+                (added, newest, newest, environment)
+            )
+        return added
+
+    def remove_courses(self, environment: str, course_ids: Iterable[int]) -> int:
+        """Forget deleted courses; returns how many were known"""
+        course_ids = list(course_ids)
+        removed = 0
+        with self.db.transaction() as conn:
+            self._state(conn, environment)
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(course_ids), 500):
+                chunk = course_ids[start:start + 500]
+                removed += conn.execute(
+                    f"DELETE FROM inventory_courses WHERE environment = ? AND id IN ({', '.join('?' * len(chunk))})",
+                    [environment] + chunk
+                ).rowcount
+            if removed:
+                # Indexed, so finding the new newest course doesn't scan the table
+                conn.execute(
+                    'UPDATE inventory_state SET courses = courses - ?, last_created_at = '
+                    '(SELECT MAX(created_at) FROM inventory_courses WHERE environment = ?) WHERE environment = ?',
+                    (removed, environment, environment)
+                )
+        return removed
+
+    def replace(self, environment: str, root_account_id: int, accounts: List[Dict], courses: List[Dict]) -> Dict:
+        """Replace an environment's mirror with a full crawl of Canvas.
+
+        Returns how far the mirror had drifted: subaccounts and courses that
+        were added or removed outside of the app since the last crawl.
+        """
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            known_accounts = {row[0] for row in conn.execute(
+                'SELECT id FROM inventory_accounts WHERE environment = ?', (environment,))}
+            known_courses = {row[0] for row in conn.execute(
+                'SELECT id FROM inventory_courses WHERE environment = ?', (environment,))}
+            conn.execute('DELETE FROM inventory_accounts WHERE environment = ?', (environment,))
+            conn.execute('DELETE FROM inventory_courses WHERE environment = ?', (environment,))
+            conn.executemany(
+                'INSERT INTO inventory_accounts (environment, id, name, parent_account_id, workflow_state, seen_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(environment, account['id'], account.get('name'), account.get('parent_account_id'),
+                  account.get('workflow_state'), now) for account in accounts]
+            )
+            conn.executemany(
+                'INSERT INTO inventory_courses (environment, id, name, course_code, sis_course_id, account_id, '
+                'workflow_state, created_at, seen_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(environment, course['id'], course.get('name'), course.get('course_code'),
+                  course.get('sis_course_id'), course.get('account_id'), course.get('workflow_state'),
+                  course.get('created_at'), now) for course in courses]
+            )
+            newest = max((course['created_at'] for course in courses if course.get('created_at')), default=None)
+            self._state(conn, environment)
+            conn.execute(
+                'UPDATE inventory_state SET root_account_id = ?, subaccounts = ?, courses = ?, last_created_at = ?, '
+                'course_watermark = ?, synced_at = ?, full_synced_at = ? WHERE environment = ?',
+                (root_account_id, len(accounts), len(courses), newest, newest, now, now, environment)
+            )
+
+        account_ids = {account['id'] for account in accounts}
+        course_ids = {course['id'] for course in courses}
+        return {
+            'subaccounts_added': len(account_ids - known_accounts),
+            'subaccounts_removed': len(known_accounts - account_ids),
+            'courses_added': len(course_ids - known_courses),
+            'courses_removed': len(known_courses - course_ids)
+        }
+
+    def mark_synced(self, environment: str, course_watermark: Optional[str]):
+        """Record an incremental sync that saw every course created up to course_watermark"""
+        with self.db.transaction() as conn:
+            self._state(conn, environment)
+            conn.execute(
+                'UPDATE inventory_state SET synced_at = ?, '
+                'course_watermark = COALESCE(MAX(COALESCE(course_watermark, ?), ?), course_watermark) '
+                'WHERE environment = ?',
+                (datetime.now().isoformat(), course_watermark, course_watermark, environment)
+            )
+
+    def state(self, environment: str) -> Optional[Dict]:
+        row = self.db.connection().execute(
+            'SELECT * FROM inventory_state WHERE environment = ?', (environment,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def status(self, environment: str) -> Optional[Dict]:
+        """Environment status from the mirror, None until it has been crawled once"""
+        state = self.state(environment)
+        if state is None or state['full_synced_at'] is None:
+            return None
+        return {
+            'subaccounts': state['subaccounts'],
+            'courses': state['courses'],
+            'lastActivity': state['last_created_at'],
+            'status': 'in-use' if (state['subaccounts'] or state['courses']) else 'clean',
+            'synced_at': state['synced_at'],
+            'full_synced_at': state['full_synced_at']
+        }
+
+    def iter_courses(self, environment: str, account_id: int = None, cursor: str = None,
+                     limit: int = 50) -> Tuple[Iterator[Dict], Optional[str]]:
+        """One page of mirrored courses, newest first, read while the caller iterates, and the next page's cursor"""
+        conditions = ['environment = ?']
+        params = [environment]
+        if account_id is not None:
+            conditions.append('account_id = ?')
+            params.append(account_id)
+        return keyset_page(self.db, 'inventory_courses', '*', conditions, params, cursor, limit,
+                           self._course, created_at="COALESCE(created_at, '')")
+
+    def iter_accounts(self, environment: str) -> Iterator[Dict]:
+        """All mirrored subaccounts of an environment, by id"""
+        for row in self.db.connection().execute(
+            'SELECT * FROM inventory_accounts WHERE environment = ? ORDER BY id', (environment,)
+        ):
+            yield {
+                'id': row['id'],
+                'name': row['name'],
+                'parent_account_id': row['parent_account_id'],
+                'workflow_state': row['workflow_state']
+            }
+
+    def stats(self) -> Dict[str, Dict]:
+        """Mirrored totals and sync times per environment"""
+        return {
+            row['environment']: {
+                'subaccounts': row['subaccounts'],
+                'courses': row['courses'],
+                'course_watermark': row['course_watermark'],
+                'synced_at': row['synced_at'],
+                'full_synced_at': row['full_synced_at']
+            }
+            for row in self.db.connection().execute('SELECT * FROM inventory_state ORDER BY environment')
+        }
+
+    @staticmethod
+    def _state(conn, environment: str):
+        conn.execute('INSERT INTO inventory_state (environment) VALUES (?) ON CONFLICT (environment) DO NOTHING',
+                     (environment,))
+
+    @staticmethod
+    def _course(row) -> Dict:
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'course_code': row['course_code'],
+            'sis_course_id': row['sis_course_id'],
+            'account_id': row['account_id'],
+            'workflow_state': row['workflow_state'],
+            'created_at': row['created_at']
+        }
+
+inventory = Inventory()
@@ -0,0 +1,57 @@
+"""Keyset paging, newest first on (created_at, id), shared by the stores."""
+from app.models.database import Database
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import base64
+import json
+
+def encode_cursor(created_at: str, row_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return created_at, row_id
+
+def keyset_page(db: Database, table: str, columns: str, conditions: List[str], params: List,
+              cursor: Optional[str], limit: int, convert: Callable[..., Dict],
+              created_at: str = 'created_at') -> Tuple[Iterator[Dict], Optional[str]]:
+    """One page of rows, converted while the caller iterates, and the cursor for the next page.
+
+    The next cursor comes from an index-only lookup of the page's last row,
+    so it is known before any row is read. Both queries run in one read
+    snapshot, so the cursor always matches the rows returned even while
+    other threads write; the snapshot is released once the rows are read.
+    created_at is the SQL expression rows are ordered by.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        conditions.append(f'({created_at} < ? OR ({created_at} = ? AND id < ?))')
+        params.extend([cursor_created_at, cursor_created_at, cursor_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    order = f'ORDER BY {created_at} DESC, id DESC'
+    conn = db.snapshot()
+    try:
+        # The page's last row and the row after it, if there is one
+        boundary = conn.execute(
+            f'SELECT {created_at} AS created_at, id FROM {table} {where} {order} LIMIT 2 OFFSET ?',
+            params + [limit - 1]
+        ).fetchall()
+        next_cursor = encode_cursor(boundary[0]['created_at'], boundary[0]['id']) if len(boundary) > 1 else None
+        rows = conn.execute(f'SELECT {columns} FROM {table} {where} {order} LIMIT ?', params + [limit])
+    except Exception:
+        conn.close()
+        raise
+
+    def items():
+        try:
+            for row in rows:
+                yield convert(row)
+        finally:
+            conn.close()
+
+    return items(), next_cursor
@@ -0,0 +1,256 @@
+"""SQLite-backed storage for test environment request records.
+
+Migrate the legacy JSON files with:
+
+    python -m app.models.request_store migrate app/data/requests.json request_log.json
+"""
+from app.metrics import metrics, timed
+from app.models.database import Database, get_database
+from app.models.paging import keyset_page
+from app.models.resources import dump_resources, expand_resources, load_resources
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+metrics.histogram('request_store_seconds', 'Duration of request store operations')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    environment TEXT,
+    requester TEXT,
+    scenario TEXT,
+    end_date TEXT,
+    cleaned INTEGER NOT NULL DEFAULT 0,
+    record TEXT NOT NULL,
+    request_data TEXT,
+    created_resources TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_requests_created_at ON requests (created_at);
+CREATE INDEX IF NOT EXISTS idx_requests_created_id ON requests (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_requests_environment ON requests (environment, created_at);
+CREATE INDEX IF NOT EXISTS idx_requests_requester ON requests (requester, created_at);
+CREATE INDEX IF NOT EXISTS idx_requests_updated_at ON requests (updated_at);
+CREATE INDEX IF NOT EXISTS idx_requests_expiry ON requests (cleaned, end_date);
+"""
+
+# Large parts of a record kept in their own columns so they are only read on demand
+LARGE_FIELDS = ('request_data', 'created_resources')
+
+# Filters accepted by RequestStore.iter_page, mapped to SQL conditions
+FILTERS = {
+    'requester': 'requester = ?',
+    'environment': 'environment = ?',
+    'scenario': 'scenario = ?',
+    'cleaned': 'cleaned = ?',
+    'created_from': 'created_at >= ?',
+    'created_to': 'created_at < ?',
+    'end_before': 'end_date < ?',
+    'end_from': 'end_date >= ?'
+}
+
+class RequestStore:
+    """Indexed, concurrency-safe store of request records"""
+
+    def __init__(self, database: Database = None):
+        self._database = database
+
+    @property
+    def db(self) -> Database:
+        database = self._database or get_database()
+        database.ensure_schema('requests', SCHEMA)
+        return database
+
+    @timed('request_store_seconds', 'store', 'add')
+    def add(self, record: Dict):
+        """Insert a new request record"""
+        with self.db.transaction() as conn:
+            conn.execute(
+                'INSERT INTO requests (id, created_at, updated_at, environment, requester, scenario, end_date, '
+                'cleaned, record, request_data, created_resources) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                self._row(record)
+            )
+
+    @timed('request_store_seconds', 'store', 'get')
+    def get(self, request_id: str, include: Iterable[str] = LARGE_FIELDS) -> Optional[Dict]:
+        """Load one record; pass include=() to skip the large fields"""
+        include = [field for field in include if field in LARGE_FIELDS]
+        columns = ', '.join(['record'] + include)
+        row = self.db.connection().execute(
+            f'SELECT {columns} FROM requests WHERE id = ?', (request_id,)
+        ).fetchone()
+        return self._record(row, include) if row else None
+
+    @timed('request_store_seconds', 'store', 'update')
+    def update(self, request_id: str, changes: Dict) -> bool:
+        """Apply top-level field changes to one record in a single transaction"""
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                'SELECT record, request_data, created_resources FROM requests WHERE id = ?', (request_id,)
+            ).fetchone()
+            if row is None:
+                return False
+
+            # Replaced resources don't need expanding first
+            record = self._record(row, [field for field in LARGE_FIELDS if field not in changes])
+            record.update(changes)
+            values = self._row(record)
+            conn.execute(
+                'UPDATE requests SET created_at = ?, updated_at = ?, environment = ?, requester = ?, scenario = ?, '
+                'end_date = ?, cleaned = ?, record = ?, request_data = ?, created_resources = ? WHERE id = ?',
+                values[1:] + (request_id,)
+            )
+        return True
+
+    def iter_page(self, filters: Dict = None, cursor: str = None, limit: int = 50,
+                  include: Iterable[str] = LARGE_FIELDS) -> Tuple[Iterator[Dict], Optional[str]]:
+        """One page of records, newest first, read while the caller iterates, and the next page's cursor"""
+        include = [field for field in include if field in LARGE_FIELDS]
+        conditions = []
+        params = []
+        for name, value in (filters or {}).items():
+            if value is None or name not in FILTERS:
+                continue
+            conditions.append(FILTERS[name])
+            params.append(int(value) if name == 'cleaned' else value)
+        columns = ', '.join(['record'] + include)
+        return keyset_page(self.db, 'requests', columns, conditions, params, cursor, limit,
+                           lambda row: self._record(row, include))
+
+    @timed('request_store_seconds', 'store', 'expired')
+    def expired(self, before: str, limit: int, max_attempts: int = None) -> List[Dict]:
+        """Uncleaned records whose end_date lies before the given date, oldest end_date first.
+
+        Records still being provisioned are skipped, and so are records whose
+        automatic cleanup already failed max_attempts times.
+        """
+        conditions = ['cleaned = 0', 'end_date IS NOT NULL', 'end_date < ?',
+                      "COALESCE(json_extract(record, '$.status'), '') NOT IN ('queued', 'provisioning')"]
+        params = [before]
+        if max_attempts:
+            conditions.append("COALESCE(json_extract(record, '$.cleanup_attempts'), 0) < ?")
+            params.append(max_attempts)
+        rows = self.db.connection().execute(
+            f"SELECT record FROM requests WHERE {' AND '.join(conditions)} ORDER BY end_date LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [self._record(row, ()) for row in rows]
+
+    @timed('request_store_seconds', 'store', 'version')
+    def version(self) -> str:
+        """Cheap fingerprint that changes whenever any record is written"""
+        count, last_update = self.db.connection().execute(
+            'SELECT COUNT(*), MAX(updated_at) FROM requests'
+        ).fetchone()
+        return f"{count}-{last_update}"
+
+    @timed('request_store_seconds', 'store', 'migrate')
+    def migrate(self, records: Iterable[Dict]) -> int:
+        """Import legacy records, skipping ids that are already stored"""
+        imported = 0
+        with self.db.transaction() as conn:
+            for record in records:
+                if not record.get('id'):
+                    continue
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO requests (id, created_at, updated_at, environment, requester, scenario, '
+                    'end_date, cleaned, record, request_data, created_resources) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    self._row(record)
+                )
+                imported += cursor.rowcount
+        return imported
+
+    @staticmethod
+    def _row(record: Dict) -> tuple:
+        small = {k: v for k, v in record.items() if k not in LARGE_FIELDS}
+        # Keep resource counts with the small fields so summaries never read the lists
+        resources = record.get('created_resources') or {}
+        small['resource_counts'] = {
+            name: len(resources.get(name) or [])
+            for name in ('subaccounts', 'courses', 'users', 'errors')
+        }
+        return (
+            record['id'],
+            record.get('created_at') or datetime.now().isoformat(),
+            datetime.now().isoformat(),
+            record.get('environment'),
+            record.get('requester'),
+            record.get('scenario'),
+            record.get('end_date'),
+            1 if record.get('cleaned') else 0,
+            json.dumps(small),
+            json.dumps(record.get('request_data')),
+            dump_resources(record.get('created_resources'))
+        )
+
+    @staticmethod
+    def _record(row, include: Iterable[str]) -> Dict:
+        record = json.loads(row['record'])
+        for field in include:
+            if field == 'created_resources':
+                record[field] = load_resources(row[field])
+            else:
+                record[field] = json.loads(row[field]) if row[field] is not None else None
+        return record
+
+request_store = RequestStore()
+
+def read_legacy_records(path: str) -> List[Dict]:
+    """Read request records from requests.json, request_log.json or a JSONL log"""
+    with open(path, 'r') as f:
+        content = f.read().strip()
+    if not content:
+        return []
+
+    if content.startswith('['):
+        entries = json.loads(content)
+    else:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    records = []
+    for entry in entries:
+        if 'results' in entry and 'request' in entry:
+            # Old request_log format: {id, timestamp, request, results}
+            data = entry['request'] or {}
+            records.append({
+                'id': entry['id'],
+                'created_at': entry.get('timestamp'),
+                'scenario': data.get('scenario'),
+                'requester': data.get('requester'),
+                'topdesk_number': data.get('topdesk_number'),
+                'environment': data.get('environment'),
+                'start_date': data.get('start_date'),
+                'end_date': data.get('end_date'),
+                'request_data': data,
+                'created_resources': expand_resources(entry['results'].get('created_resources', {})),
+                'cleaned': False
+            })
+        else:
+            records.append({**entry, 'created_resources': expand_resources(entry.get('created_resources'))})
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the request store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='Import legacy JSON/JSONL request files')
+    migrate.add_argument('paths', nargs='+', help='requests.json, request_log.json or JSONL files')
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        try:
+            records = read_legacy_records(path)
+        except FileNotFoundError:
+            logger.warning(f"Skipping missing file {path}")
+            continue
+        imported = request_store.migrate(records)
+        logger.info(f"Imported {imported} of {len(records)} records from {path}")
+
+if __name__ == '__main__':
+    main()
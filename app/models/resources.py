@@ -0,0 +1,184 @@
+"""Compact storage form of a request's created_resources.
+
+Generated test users follow fixed naming patterns (see user_fields), so a
+run of them is stored as its kind, login suffix, numbers and Canvas ids,
+and their names and emails are regenerated when the record is expanded.
+Checkpoint keys that differ only in a user's number are stored the same
+way. Everything else is kept as it is, and users keep their order, so
+expanding is lossless:
+
+    {"users": [{"id": 11, "name": "Test Student 1 (ab12cd34)", ...}, ...]}
+
+becomes
+
+    {"compact": 1, "users": {"runs": [{"kind": "student", "suffix": "ab12cd34",
+                                       "n": [[1, 2000]], "ids": [11, ...]}],
+                             "other": []}, ...}
+
+Stored values at least RESOURCES_COMPRESS_MIN_BYTES long are also zlib
+compressed. Records written before this format are read as they are.
+"""
+from app.config import Config
+from typing import Dict, List, Optional, Union
+import json
+import re
+import zlib
+
+COMPACT_VERSION = 1
+
+USER_KINDS = ('student', 'teacher')
+
+# The user number in a generated login, e.g. tstudent12_ab12cd34
+NUMBERED_LOGIN = re.compile(r't(student|teacher)(\d+)_([0-9a-z]+)')
+
+PLACEHOLDER = '{n}'
+
+def user_fields(kind: str, number: int, suffix: str) -> Dict:
+    """Name, email, login and SIS id of the number-th generated test student or teacher"""
+    login_id = f"t{kind}{number}_{suffix}"
+    return {
+        'name': f"Test {kind.title()} {number} ({suffix})",
+        'email': f"test.{kind}{number}.{suffix}@test.uva.nl",
+        'login_id': login_id,
+        'sis_user_id': login_id
+    }
+
+def _ranges(numbers: List[int]) -> List:
+    """[1, 2, 3, 7] -> [[1, 3], 7]"""
+    ranges = []
+    for number in numbers:
+        last = ranges[-1] if ranges else None
+        if isinstance(last, list) and last[1] + 1 == number:
+            last[1] = number
+        elif isinstance(last, int) and last + 1 == number:
+            ranges[-1] = [last, number]
+        else:
+            ranges.append(number)
+    return ranges
+
+def _numbers(ranges: List) -> List[int]:
+    numbers = []
+    for item in ranges:
+        if isinstance(item, list):
+            numbers.extend(range(item[0], item[1] + 1))
+        else:
+            numbers.append(item)
+    return numbers
+
+def _generated(user: Dict) -> Optional[tuple]:
+    """(kind, number, suffix) if the user is exactly a generated test user, else None"""
+    match = NUMBERED_LOGIN.fullmatch(user.get('login_id') or '')
+    if not match or set(user) - {'id', 'name', 'email', 'login_id', 'sis_user_id', 'reused'}:
+        return None
+    kind, number, suffix = match.group(1), int(match.group(2)), match.group(3)
+    fields = user_fields(kind, number, suffix)
+    if any(user.get(name) != value for name, value in fields.items()):
+        return None
+    return kind, number, suffix
+
+def compact_users(users: List[Dict]) -> Dict:
+    runs: List[Dict] = []
+    other = []
+    positions = []
+    for position, user in enumerate(users):
+        generated = _generated(user)
+        if generated is None:
+            other.append(user)
+            positions.append(position)
+            continue
+        kind, number, suffix = generated
+        # A run holds consecutive generated users, so expanding keeps their order
+        run = runs[-1] if runs and (runs[-1]['kind'], runs[-1]['suffix']) == (kind, suffix) else None
+        if run is None:
+            run = {'kind': kind, 'suffix': suffix, 'n': [], 'ids': []}
+            runs.append(run)
+        run['n'].append(number)
+        run['ids'].append(user['id'])
+        if user.get('reused'):
+            run.setdefault('reused', []).append(number)
+    for run in runs:
+        run['n'] = _ranges(run['n'])
+    compact = {'runs': runs, 'other': other}
+    # Where the other users sit among the generated ones; without it they follow them
+    if positions != list(range(len(users) - len(other), len(users))):
+        compact['at'] = positions
+    return compact
+
+def expand_users(compact: Dict) -> List[Dict]:
+    generated = []
+    for run in compact.get('runs', []):
+        reused = set(run.get('reused', []))
+        for number, user_id in zip(_numbers(run['n']), run['ids']):
+            user = {'id': user_id, **user_fields(run['kind'], number, run['suffix'])}
+            if number in reused:
+                user['reused'] = True
+            generated.append(user)
+    other = compact.get('other', [])
+    if 'at' not in compact:
+        return generated + other
+    placed = dict(zip(compact['at'], other))
+    remaining = iter(generated)
+    return [placed[position] if position in placed else next(remaining)
+            for position in range(len(generated) + len(other))]
+
+def compact_checkpoints(checkpoints: Dict) -> Dict:
+    runs: Dict[str, Dict] = {}
+    other = {}
+    for key, value in checkpoints.items():
+        match = NUMBERED_LOGIN.search(key)
+        # Numbers with leading zeros would not come back the same
+        if not match or PLACEHOLDER in key or not isinstance(value, int) or match.group(2).startswith('0'):
+            other[key] = value
+            continue
+        template = key[:match.start(2)] + PLACEHOLDER + key[match.end(2):]
+        run = runs.setdefault(template, {'template': template, 'n': [], 'ids': []})
+        run['n'].append(int(match.group(2)))
+        run['ids'].append(value)
+    for run in runs.values():
+        run['n'] = _ranges(run['n'])
+    return {'runs': list(runs.values()), 'other': other}
+
+def expand_checkpoints(compact: Dict) -> Dict:
+    checkpoints = {}
+    for run in compact.get('runs', []):
+        for number, value in zip(_numbers(run['n']), run['ids']):
+            checkpoints[run['template'].replace(PLACEHOLDER, str(number))] = value
+    checkpoints.update(compact.get('other', {}))
+    return checkpoints
+
+def compact_resources(resources: Optional[Dict]) -> Optional[Dict]:
+    """The compact form of created_resources (plain JSON, not compressed)"""
+    if not resources or resources.get('compact'):
+        return resources
+    compact = {**resources, 'compact': COMPACT_VERSION}
+    if isinstance(resources.get('users'), list):
+        compact['users'] = compact_users(resources['users'])
+    if isinstance(resources.get('checkpoints'), dict):
+        compact['checkpoints'] = compact_checkpoints(resources['checkpoints'])
+    return compact
+
+def expand_resources(resources: Optional[Dict]) -> Optional[Dict]:
+    """Full created_resources from either form"""
+    if not resources or not resources.get('compact'):
+        return resources
+    expanded = {key: value for key, value in resources.items() if key != 'compact'}
+    if isinstance(resources.get('users'), dict):
+        expanded['users'] = expand_users(resources['users'])
+    if isinstance(resources.get('checkpoints'), dict) and 'runs' in resources['checkpoints']:
+        expanded['checkpoints'] = expand_checkpoints(resources['checkpoints'])
+    return expanded
+
+def dump_resources(resources: Optional[Dict]) -> Union[str, bytes]:
+    """Serialise created_resources for storage, compressing large values"""
+    text = json.dumps(compact_resources(resources), separators=(',', ':'))
+    if Config.RESOURCES_COMPRESS_MIN_BYTES and len(text) >= Config.RESOURCES_COMPRESS_MIN_BYTES:
+        return zlib.compress(text.encode())
+    return text
+
+def load_resources(value: Union[str, bytes, None]) -> Optional[Dict]:
+    """Read a stored created_resources value in any of its forms"""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = zlib.decompress(value).decode()
+    return expand_resources(json.loads(value))
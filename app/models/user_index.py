@@ -0,0 +1,161 @@
+"""Index of the test users created in each Canvas environment.
+
+Maps login ids and SIS user ids to Canvas user ids, so creating a user that
+already exists reuses it instead of adding another account Canvas can never
+delete. The reconcile job (app.api.user_reconcile) checks it against Canvas.
+"""
+from app.models.database import Database, get_database
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_identities (
+    environment TEXT NOT NULL,
+    login_id TEXT NOT NULL,
+    sis_user_id TEXT,
+    canvas_user_id INTEGER NOT NULL,
+    name TEXT,
+    email TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_used_at TEXT,
+    verified_at TEXT,
+    PRIMARY KEY (environment, login_id)
+);
+CREATE INDEX IF NOT EXISTS idx_user_identities_sis ON user_identities (environment, sis_user_id);
+CREATE INDEX IF NOT EXISTS idx_user_identities_canvas ON user_identities (environment, canvas_user_id);
+"""
+
+ACTIVE = 'active'
+# Not found in Canvas by the last reconcile; never handed out again
+MISSING = 'missing'
+
+class UserIndex:
+    """SQLite-backed login/SIS id -> Canvas user id index per environment"""
+
+    def __init__(self, database: Database = None):
+        self._database = database
+
+    @property
+    def db(self) -> Database:
+        database = self._database or get_database()
+        database.ensure_schema('user_index', SCHEMA)
+        return database
+
+    def lookup(self, environment: str, login_id: str = None, sis_user_id: str = None) -> Optional[Dict]:
+        """Find an active user by login id or SIS id and mark it used"""
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                'SELECT * FROM user_identities WHERE environment = ? AND status = ? AND (login_id = ? OR sis_user_id = ?)',
+                (environment, ACTIVE, login_id, sis_user_id)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE user_identities SET last_used_at = ? WHERE environment = ? AND login_id = ?',
+                (datetime.now().isoformat(), environment, row['login_id'])
+            )
+        return self._user(row)
+
+    def record(self, environment: str, users: Iterable[Dict]):
+        """Add or refresh users that exist in Canvas"""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.executemany(
+                'INSERT INTO user_identities (environment, login_id, sis_user_id, canvas_user_id, name, email, '
+                'status, created_at, last_used_at, verified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (environment, login_id) DO UPDATE SET sis_user_id = excluded.sis_user_id, '
+                'canvas_user_id = excluded.canvas_user_id, name = excluded.name, '
+                'email = COALESCE(excluded.email, email), status = excluded.status, '
+                'last_used_at = excluded.last_used_at, verified_at = COALESCE(excluded.verified_at, verified_at)',
+                [(environment, user['login_id'], user.get('sis_user_id'), user['id'], user.get('name'),
+                  user.get('email'), ACTIVE, now, now, user.get('verified_at')) for user in users if user.get('login_id')]
+            )
+
+    def known_logins(self, environment: str, login_ids: Iterable[str]) -> List[str]:
+        """Which of these login ids already have an active user"""
+        login_ids = list(login_ids)
+        known = []
+        conn = self.db.connection()
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(login_ids), 500):
+            chunk = login_ids[start:start + 500]
+            known.extend(row['login_id'] for row in conn.execute(
+                f"SELECT login_id FROM user_identities WHERE environment = ? AND status = ? "
+                f"AND login_id IN ({', '.join('?' * len(chunk))})",
+                [environment, ACTIVE] + chunk
+            ))
+        return known
+
+    def reconcile(self, environment: str, canvas_users: Iterable[Dict], adopt=None) -> Dict:
+        """Bring the index in line with a full listing of Canvas users.
+
+        Entries whose login now belongs to another Canvas user are relinked,
+        entries Canvas no longer has are marked missing, and unindexed Canvas
+        users for which adopt(user) is true are added.
+        """
+        now = datetime.now().isoformat()
+        by_login = {user['login_id']: user for user in canvas_users if user.get('login_id')}
+        counts = {'verified': 0, 'relinked': 0, 'missing': 0, 'adopted': 0}
+
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                'SELECT login_id, canvas_user_id, status FROM user_identities WHERE environment = ?', (environment,)
+            ).fetchall()
+            indexed = set()
+            for row in rows:
+                indexed.add(row['login_id'])
+                user = by_login.get(row['login_id'])
+                if user is None:
+                    if row['status'] != MISSING:
+                        counts['missing'] += 1
+                    conn.execute('UPDATE user_identities SET status = ? WHERE environment = ? AND login_id = ?',
+                                 (MISSING, environment, row['login_id']))
+                    continue
+                counts['relinked' if user['id'] != row['canvas_user_id'] or row['status'] != ACTIVE else 'verified'] += 1
+                conn.execute(
+                    'UPDATE user_identities SET canvas_user_id = ?, sis_user_id = ?, status = ?, verified_at = ? '
+                    'WHERE environment = ? AND login_id = ?',
+                    (user['id'], user.get('sis_user_id'), ACTIVE, now, environment, row['login_id'])
+                )
+
+            orphans = [user for login_id, user in by_login.items()
+                       if login_id not in indexed and adopt is not None and adopt(user)]
+            conn.executemany(
+                'INSERT INTO user_identities (environment, login_id, sis_user_id, canvas_user_id, name, email, '
+                'status, created_at, verified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(environment, user['login_id'], user.get('sis_user_id'), user['id'], user.get('name'),
+                  user.get('email'), ACTIVE, now, now) for user in orphans]
+            )
+            counts['adopted'] = len(orphans)
+
+        logger.info(f"Reconciled user index for {environment}: {counts}")
+        return counts
+
+    def stats(self) -> Dict[str, Dict]:
+        """Indexed users per environment and status"""
+        result = {}
+        for row in self.db.connection().execute(
+            'SELECT environment, status, COUNT(*) AS users, MAX(verified_at) AS verified_at '
+            'FROM user_identities GROUP BY environment, status'
+        ):
+            entry = result.setdefault(row['environment'], {ACTIVE: 0, MISSING: 0, 'last_verified_at': None})
+            entry[row['status']] = row['users']
+            if row['verified_at'] and (entry['last_verified_at'] or '') < row['verified_at']:
+                entry['last_verified_at'] = row['verified_at']
+        return result
+
+    @staticmethod
+    def _user(row) -> Dict:
+        return {
+            'id': row['canvas_user_id'],
+            'name': row['name'],
+            'email': row['email'],
+            'login_id': row['login_id'],
+            'sis_user_id': row['sis_user_id']
+        }
+
+user_index = UserIndex()
@@ -2,55 +2,67 @@
 document.addEventListener('DOMContentLoaded', function() {
     // Check status of each environment
     checkEnvironmentStatus();
+    checkUserPools();
     
     // Refresh every 30 seconds
     setInterval(checkEnvironmentStatus, 30000);
+    setInterval(checkUserPools, 30000);
 });
 
-async function checkEnvironmentStatus() {
-    const environments = ['acceptatie', 'test', 'development'];
-    
-    for (const env of environments) {
-        try {
-            // For now, we'll simulate the status check
-            // Later, this will call your actual API
-            const status = await getEnvironmentStatus(env);
-            updateEnvironmentCard(env, status);
-        } catch (error) {
-            console.error(`Error checking ${env}:`, error);
-            updateEnvironmentCard(env, { error: true });
+async function checkUserPools() {
+    try {
+        const response = await fetch('/api/environments/user-pool');
+        if (!response.ok) return;
+        const pools = await response.json();
+        
+        for (const [env, pool] of Object.entries(pools)) {
+            const element = document.getElementById(`${env}-pool`);
+            if (!element) continue;
+            
+            if (!pool.target) {
+                element.textContent = 'Off';
+                continue;
+            }
+            const hitRate = pool.hit_rate === null ? '-' : `${Math.round(pool.hit_rate * 100)}%`;
+            element.textContent = `${pool.depth}/${pool.target} ready · +${pool.refilled_last_hour}/h · ${hitRate} hits`;
         }
+    } catch (error) {
+        console.error('Error checking user pools:', error);
     }
 }
 
-async function getEnvironmentStatus(environment) {
-    // TODO: Replace with actual API call
-    // Simulated data for now
-    const mockData = {
-        acceptatie: {
-            subaccounts: Math.floor(Math.random() * 5),
-            courses: Math.floor(Math.random() * 10),
-            lastActivity: new Date(Date.now() - Math.random() * 86400000).toISOString(),
-            status: 'clean'
-        },
-        test: {
-            subaccounts: Math.floor(Math.random() * 3),
-            courses: Math.floor(Math.random() * 15),
-            lastActivity: new Date(Date.now() - Math.random() * 172800000).toISOString(),
-            status: 'in-use'
-        },
-        development: {
-            subaccounts: 2,
-            courses: 0,
-            lastActivity: new Date().toISOString(),
-            status: 'in-use'
-        }
-    };
-    
-    // Simulate API delay
-    await new Promise(resolve => setTimeout(resolve, 500));
+let statusRetry = null;
+
+async function checkEnvironmentStatus() {
+    const environments = ['acceptatie', 'test', 'development'];
+    clearTimeout(statusRetry);
     
-    return mockData[environment];
+    try {
+        // One call for all environments; slow ones come back as pending
+        const response = await fetch('/api/environments/status');
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const statuses = await response.json();
+        
+        let pending = false;
+        for (const env of environments) {
+            const status = statuses[env];
+            if (!status || status.status === 'error') {
+                updateEnvironmentCard(env, { error: true });
+            } else if (status.status === 'pending') {
+                pending = true;
+            } else {
+                updateEnvironmentCard(env, status);
+            }
+        }
+        
+        // Pending environments keep loading on the server; pick them up shortly
+        if (pending) {
+            statusRetry = setTimeout(checkEnvironmentStatus, 3000);
+        }
+    } catch (error) {
+        console.error('Error checking environments:', error);
+        environments.forEach(env => updateEnvironmentCard(env, { error: true }));
+    }
 }
 
 function updateEnvironmentCard(environment, data) {
@@ -317,13 +317,10 @@ document.addEventListener('DOMContentLoaded', function() {
             });
             
             if (response.ok) {
+                // Provisioning continues in the background (202 + job id)
                 const result = await response.json();
-                showToast('Request submitted successfully!', 'success');
-                
-                // Redirect to dashboard or show success page
-                setTimeout(() => {
-                    window.location.href = '/';
-                }, 2000);
+                showToast(`Request ${result.request_id} queued for provisioning`, 'success');
+                watchProvisioning(result.request_id, result.job_id);
             } else {
                 throw new Error('Failed to submit request');
             }
@@ -337,6 +334,75 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Follow provisioning live over Server-Sent Events
+    function watchProvisioning(requestId, jobId) {
+        const panel = document.getElementById('provisioning-progress');
+        const bar = document.getElementById('progress-bar');
+        const lastEvent = document.getElementById('progress-last-event');
+        
+        panel.style.display = 'block';
+        submitButton.style.display = 'none';
+        backToForm.style.display = 'none';
+        document.getElementById('progress-request-id').textContent = requestId;
+        
+        const source = new EventSource(`/api/jobs/${jobId}/events`);
+        
+        const update = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.total) {
+                bar.style.width = `${Math.min(100, Math.round(data.done / data.total * 100))}%`;
+                document.getElementById('progress-count').textContent = `${data.done} / ${data.total}`;
+            }
+            document.getElementById('progress-throughput').textContent = `${data.throughput} items/s`;
+            document.getElementById('progress-eta').textContent = 
+                data.eta_seconds !== null ? `ETA ${Math.ceil(data.eta_seconds)}s` : 'ETA -';
+            lastEvent.textContent = describeEvent(event.type, data);
+        };
+        
+        ['subaccount_created', 'subaccount_failed', 'course_created', 'course_failed',
+         'user_created', 'user_failed', 'enrollment_created', 'enrollment_failed',
+         'sis_import_finished', 'sis_import_failed', 'content_copied', 'content_failed',
+         'pool_users_taken'].forEach(type => source.addEventListener(type, update));
+        
+        source.addEventListener('job_finished', (event) => {
+            const data = JSON.parse(event.data);
+            source.close();
+            if (data.status === 'completed') {
+                bar.style.width = '100%';
+                lastEvent.textContent = 'Provisioning completed';
+                showToast('Test environment is ready!', 'success');
+            } else {
+                bar.classList.add('failed');
+                lastEvent.textContent = `Provisioning failed: ${data.error}`;
+                showToast('Provisioning failed: ' + data.error, 'error');
+            }
+            setTimeout(() => {
+                window.location.href = '/requests';
+            }, 3000);
+        });
+    }
+    
+    function describeEvent(type, data) {
+        const labels = {
+            subaccount_created: `Created subaccount ${data.name}`,
+            subaccount_failed: `Subaccount failed: ${data.error}`,
+            course_created: `Created course ${data.name}`,
+            course_failed: `Course ${data.name} failed: ${data.error}`,
+            user_created: `Created user ${data.login_id}`,
+            user_failed: data.retried
+                ? `User ${data.login_id} failed, retrying with the next course: ${data.error}`
+                : `User ${data.login_id} failed: ${data.error}`,
+            enrollment_created: `Enrolled ${data.login_id}`,
+            enrollment_failed: `Enrollment of ${data.login_id} failed: ${data.error}`,
+            sis_import_finished: `SIS import ${data.state}: ${data.courses} courses, ${data.users} users`,
+            sis_import_failed: `SIS import failed: ${data.error}`,
+            content_copied: `Copied template content into course ${data.course_id}`,
+            content_failed: `Copying template content into course ${data.course_id} failed: ${data.error}`,
+            pool_users_taken: `Took ${data.count} of ${data.requested} students from the user pool`
+        };
+        return labels[type] || type;
+    }
+    
     function collectFormData() {
         // Collect all form data for submission
         const courses = [];
@@ -1,63 +1,139 @@
+const PAGE_SIZE = 50;
+let nextCursor = null;
+let currentLoad = 0;
+
 document.addEventListener('DOMContentLoaded', function() {
+    // Preselect the environment when coming from the dashboard
+    const params = new URLSearchParams(window.location.search);
+    if (params.get('env')) {
+        document.getElementById('env-filter').value = params.get('env');
+    }
+    
+    document.getElementById('env-filter').addEventListener('change', () => loadRequests());
+    document.getElementById('status-filter').addEventListener('change', () => loadRequests());
+    
     loadRequests();
 });
 
-async function loadRequests() {
+function buildRequestsQuery(cursor) {
+    const query = new URLSearchParams({ view: 'summary', limit: PAGE_SIZE });
+    const environment = document.getElementById('env-filter').value;
+    const status = document.getElementById('status-filter').value;
+    
+    if (environment) query.set('environment', environment);
+    if (status) query.set('status', status);
+    if (cursor) query.set('cursor', cursor);
+    
+    return query.toString();
+}
+
+async function loadRequests(cursor = null) {
+    // A newer load (e.g. a filter change) stops rendering the rows of this one
+    const load = ++currentLoad;
     try {
-        const response = await fetch('/api/requests');
-        const requests = await response.json();
-        displayRequests(requests);
+        // The server answers 304 via ETag when nothing changed; the browser reuses its copy
+        const response = await fetch(`/api/requests?${buildRequestsQuery(cursor)}`, {
+            headers: { 'Accept': 'application/x-ndjson' }
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        if (load !== currentLoad) return;
+        
+        nextCursor = response.headers.get('X-Next-Cursor');
+        const grid = document.getElementById('requests-grid');
+        const loadMore = document.getElementById('load-more-requests');
+        if (loadMore) loadMore.remove();
+        if (!cursor) grid.innerHTML = '';
+        
+        // Cards are added as their rows arrive rather than after the whole page
+        let count = 0;
+        await readNdjson(response, req => {
+            if (load !== currentLoad) return false;
+            grid.insertAdjacentHTML('beforeend', renderRequestCard(req));
+            count++;
+        });
+        if (load !== currentLoad) return;
+        
+        if (!cursor && count === 0) {
+            grid.innerHTML = '<p class="no-requests">No active requests found</p>';
+        }
+        if (nextCursor) {
+            grid.insertAdjacentHTML('beforeend', `
+                <div class="load-more" id="load-more-requests">
+                    <button class="btn-small btn-secondary" onclick="loadRequests(nextCursor)">Load more</button>
+                </div>
+            `);
+        }
     } catch (error) {
         console.error('Failed to load requests:', error);
     }
 }
 
-function displayRequests(requests) {
-    const grid = document.getElementById('requests-grid');
+async function readNdjson(response, onItem) {
+    // Calls onItem for each line of an NDJSON body as it streams in; onItem returns false to stop
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
     
-    if (requests.length === 0) {
-        grid.innerHTML = '<p class="no-requests">No active requests found</p>';
-        return;
+    while (true) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = done ? '' : lines.pop();
+        for (const line of lines) {
+            if (line.trim() && onItem(JSON.parse(line)) === false) {
+                reader.cancel();
+                return;
+            }
+        }
+        if (done) return;
     }
+}
+
+function renderRequestCard(req) {
+    const isExpired = new Date(req.end_date) < new Date();
+    const status = req.cleaned ? 'cleaned' : (isExpired ? 'expired' : 'active');
+    const counts = req.resource_counts || {};
     
-    grid.innerHTML = requests.map(req => {
-        const isExpired = new Date(req.end_date) < new Date();
-        const status = req.cleaned ? 'cleaned' : (isExpired ? 'expired' : 'active');
-        
-        return `
-            <div class="request-card ${status}">
-                <div class="request-header">
-                    <h3>${req.scenario_name || req.scenario}</h3>
-                    <span class="request-status status-${status}">${status}</span>
-                </div>
-                <div class="request-info">
-                    <p><strong>Request ID:</strong> ${req.id}</p>
-                    <p><strong>Requester:</strong> ${req.requester}</p>
-                    <p><strong>Environment:</strong> ${req.environment}</p>
-                    <p><strong>Period:</strong> ${formatDate(req.start_date)} - ${formatDate(req.end_date)}</p>
-                    <p><strong>Created:</strong></p>
-                    <ul>
-                        ${req.created_resources.subaccounts.length > 0 ? 
-                            `<li>${req.created_resources.subaccounts.length} subaccounts</li>` : ''}
-                        ${req.created_resources.courses.length > 0 ? 
-                            `<li>${req.created_resources.courses.length} courses</li>` : ''}
-                        ${req.created_resources.users.length > 0 ? 
-                            `<li>${req.created_resources.users.length} users</li>` : ''}
-                    </ul>
-                </div>
-                <div class="request-actions">
-                    <button class="btn-small btn-secondary" onclick="viewRequestDetails('${req.id}')">
-                        View Details
+    return `
+        <div class="request-card ${status}">
+            <div class="request-header">
+                <h3>${req.scenario_name || req.scenario}</h3>
+                <span class="request-status status-${status}">${status}</span>
+            </div>
+            <div class="request-info">
+                <p><strong>Request ID:</strong> ${req.id}</p>
+                <p><strong>Requester:</strong> ${req.requester}</p>
+                <p><strong>Environment:</strong> ${req.environment}</p>
+                ${req.status && req.status !== 'completed' ? 
+                    `<p><strong>Provisioning:</strong> ${req.status}</p>` : ''}
+                <p><strong>Period:</strong> ${formatDate(req.start_date)} - ${formatDate(req.end_date)}</p>
+                <p><strong>Created:</strong></p>
+                <ul>
+                    ${counts.subaccounts > 0 ? 
+                        `<li>${counts.subaccounts} subaccounts</li>` : ''}
+                    ${counts.courses > 0 ? 
+                        `<li>${counts.courses} courses</li>` : ''}
+                    ${counts.users > 0 ? 
+                        `<li>${counts.users} users</li>` : ''}
+                </ul>
+            </div>
+            <div class="request-actions">
+                <button class="btn-small btn-secondary" onclick="viewRequestDetails('${req.id}')">
+                    View Details
+                </button>
+                ${!req.cleaned && (req.status === 'failed' || req.resumable) ? `
+                    <button class="btn-small btn-secondary" onclick="resumeRequest('${req.id}')">
+                        Resume
                     </button>
-                    ${!req.cleaned ? `
-                        <button class="btn-small btn-danger" onclick="cleanupRequest('${req.id}')">
-                            Cleanup
-                        </button>
-                    ` : ''}
-                </div>
+                ` : ''}
+                ${!req.cleaned ? `
+                    <button class="btn-small btn-danger" onclick="cleanupRequest('${req.id}')">
+                        Cleanup
+                    </button>
+                ` : ''}
             </div>
-        `;
-    }).join('');
+        </div>
+    `;
 }
 
 async function cleanupRequest(requestId) {
@@ -72,7 +148,11 @@ async function cleanupRequest(requestId) {
         
         if (response.ok) {
             const result = await response.json();
-            showToast(`Cleaned up: ${result.deleted_courses} courses, ${result.deleted_users} users`, 'success');
+            if (result.cleaned === false) {
+                showToast(`Deleted ${result.deleted_courses} courses, but ${result.errors.length} could not be deleted; try again`, 'error');
+            } else {
+                showToast(`Cleaned up: ${result.deleted_courses} courses, ${result.deleted_users} users`, 'success');
+            }
             loadRequests(); // Reload the list
         } else {
             throw new Error('Cleanup failed');
@@ -82,6 +162,24 @@ async function cleanupRequest(requestId) {
     }
 }
 
+async function resumeRequest(requestId) {
+    try {
+        const response = await fetch(`/api/requests/${requestId}/resume`, {
+            method: 'POST'
+        });
+        const result = await response.json();
+        
+        if (response.ok) {
+            showToast(`Resuming ${requestId}: only the missing steps will run`, 'success');
+            loadRequests(); // Reload the list
+        } else {
+            throw new Error(result.error || 'Resume failed');
+        }
+    } catch (error) {
+        showToast('Failed to resume request: ' + error.message, 'error');
+    }
+}
+
 function viewRequestDetails(requestId) {
     window.location.href = `/request/${requestId}`;
 }
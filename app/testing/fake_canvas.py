@@ -0,0 +1,574 @@
+"""In-memory stand-in for the parts of the Canvas REST API this app uses.
+
+Run it standalone and point CANVAS_API_URL at it to work offline:
+
+    python -m app.testing.fake_canvas --port 5001 --latency 0.05 --bucket-size 700
+
+Besides the endpoints, it mimics Canvas's request-cost rate limiting
+(X-Rate-Limit-Remaining / X-Request-Cost headers and 403 throttling), adds
+configurable latency, injects random server errors and counts every call.
+"""
+from flask import Flask, g, jsonify, request
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+import argparse
+import csv
+import io
+import itertools
+import random
+import threading
+import time
+import zipfile
+
+# Canvas timestamps are UTC with whole seconds
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+class FakeCanvas:
+    """Thread-safe in-memory Canvas state"""
+
+    def __init__(self, import_polls: int = 2, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, bucket_size: float = 0.0, leak_rate: float = 10.0,
+                 request_cost: float = 1.0, seed: Optional[int] = None):
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1000)
+        self.accounts: Dict[int, Dict] = {1: {'id': 1, 'name': 'Root Account', 'parent_account_id': None,
+                                              'workflow_state': 'active', 'sis_account_id': None}}
+        self.courses: Dict[int, Dict] = {}
+        self.sections: Dict[int, Dict] = {}
+        self.users: Dict[int, Dict] = {}
+        self.enrollments: Dict[int, Dict] = {}
+        self.sis_imports: Dict[int, Dict] = {}
+        self.progress: Dict[int, Dict] = {}
+        self.migrations: Dict[int, Dict] = {}
+        # Number of status polls before SIS imports and batch progress report they have finished
+        self.import_polls = import_polls
+        # Sorts honoured by account course listings; others are ignored, as Canvas does
+        self.course_sorts = {'created_at', 'course_name', 'sis_course_id'}
+
+        # Seconds added to every call, plus up to latency_jitter more at random
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        # Fraction of calls that fail with a 500
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+        # Canvas-style leaky bucket: every call adds request_cost, the bucket drains at
+        # leak_rate per second, and calls that would overflow bucket_size are throttled.
+        # bucket_size 0 turns rate limiting off.
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.request_cost = request_cost
+        self._bucket_level = 0.0
+        self._bucket_updated = time.monotonic()
+
+        self.calls = Counter()
+        self.throttled = 0
+        self.injected_errors = 0
+
+    def charge(self) -> Optional[float]:
+        """Charge one call against the rate limit bucket; returns the remaining budget, or None when throttled"""
+        with self.lock:
+            now = time.monotonic()
+            self._bucket_level = max(0.0, self._bucket_level - (now - self._bucket_updated) * self.leak_rate)
+            self._bucket_updated = now
+            if self._bucket_level + self.request_cost > self.bucket_size:
+                self.throttled += 1
+                return None
+            self._bucket_level += self.request_cost
+            return self.bucket_size - self._bucket_level
+
+    def delay(self) -> float:
+        with self.lock:
+            return self.latency + self._random.uniform(0, self.latency_jitter)
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.injected_errors += 1
+                return True
+            return False
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'calls': sum(self.calls.values()),
+                'by_endpoint': dict(self.calls),
+                'throttled': self.throttled,
+                'injected_errors': self.injected_errors
+            }
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def find(self, table: Dict[int, Dict], ref: str, sis_field: str):
+        """Look up a record by Canvas id or by an 'sis_..._id:' reference"""
+        if ':' in ref:
+            return self.find_by(table, sis_field, ref.split(':', 1)[1])
+        try:
+            return table.get(int(ref))
+        except ValueError:
+            return None
+
+    def find_by(self, table: Dict[int, Dict], field: str, value):
+        return next((r for r in table.values() if r.get(field) == value), None)
+
+    def run_sis_import(self, account_id: int, archive: bytes) -> Dict:
+        """Apply a zipped instructure_csv import and return the import record"""
+        errors = []
+        with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+            files = {name: list(csv.DictReader(io.StringIO(zf.read(name).decode('utf-8'))))
+                     for name in zf.namelist()}
+
+        with self.lock:
+            # Like Canvas, rows update the records they name by SIS id (users also by
+            # login id), so importing the same files again changes nothing
+            for row in files.get('users.csv', []):
+                user = self.find_by(self.users, 'sis_user_id', row['user_id']) \
+                    or self.find_by(self.users, 'login_id', row['login_id'])
+                if user is None:
+                    user_id = self.next_id()
+                    user = self.users[user_id] = {'id': user_id}
+                user.update(name=row['full_name'], login_id=row['login_id'], sis_user_id=row['user_id'],
+                            email=row.get('email'))
+
+            for row in files.get('courses.csv', []):
+                account = self.find_by(self.accounts, 'sis_account_id', row['account_id']) if row['account_id'] else None
+                if row['account_id'] and account is None:
+                    errors.append(['courses.csv', f"Account {row['account_id']} not found"])
+                    continue
+                course = self.find_by(self.courses, 'sis_course_id', row['course_id'])
+                if course is None:
+                    course_id = self.next_id()
+                    course = self.courses[course_id] = {
+                        'id': course_id,
+                        'workflow_state': 'available',
+                        'sis_course_id': row['course_id'],
+                        'created_at': datetime.utcnow().strftime(TIME_FORMAT)
+                    }
+                course.update(name=row['long_name'], course_code=row['short_name'],
+                              account_id=account['id'] if account else account_id)
+
+            for row in files.get('sections.csv', []):
+                course = self.find_by(self.courses, 'sis_course_id', row['course_id'])
+                if course is None:
+                    errors.append(['sections.csv', f"Course {row['course_id']} not found"])
+                    continue
+                section = self.find_by(self.sections, 'sis_section_id', row['section_id'])
+                if section is None:
+                    section_id = self.next_id()
+                    section = self.sections[section_id] = {'id': section_id, 'sis_section_id': row['section_id']}
+                section.update(name=row['name'], course_id=course['id'])
+
+            roles = {'student': 'StudentEnrollment', 'teacher': 'TeacherEnrollment'}
+            for row in files.get('enrollments.csv', []):
+                course = self.find_by(self.courses, 'sis_course_id', row['course_id'])
+                user = self.find_by(self.users, 'sis_user_id', row['user_id'])
+                section = self.find_by(self.sections, 'sis_section_id', row['section_id'])
+                if course is None or user is None:
+                    errors.append(['enrollments.csv', f"Unknown course or user in {row}"])
+                    continue
+                role = roles.get(row['role'], 'StudentEnrollment')
+                section_id = section['id'] if section else None
+                if not any(e['course_id'] == course['id'] and e['user_id'] == user['id'] and e['type'] == role
+                           and e['course_section_id'] == section_id for e in self.enrollments.values()):
+                    self.add_enrollment(course['id'], user['id'], role, section_id)
+
+            import_id = self.next_id()
+            self.sis_imports[import_id] = {
+                'id': import_id,
+                'account_id': account_id,
+                'workflow_state': 'created',
+                'progress': 0,
+                'polls': 0,
+                'processing_errors': errors,
+                'processing_warnings': []
+            }
+            return self.sis_imports[import_id]
+
+    def account_tree(self, account_id: int) -> set:
+        """An account id plus the ids of all its sub-accounts"""
+        ids = {account_id}
+        for account in sorted(self.accounts.values(), key=lambda a: a['id']):
+            if account['parent_account_id'] in ids:
+                ids.add(account['id'])
+        return ids
+
+    def batch_update_courses(self, account_id: int, course_ids: List[str], event: str) -> Dict:
+        """Apply an account-level course batch update and return its progress record"""
+        states = {'delete': 'deleted', 'conclude': 'completed', 'offer': 'available', 'claim': 'unpublished'}
+        with self.lock:
+            accounts = self.account_tree(account_id)
+            missing = []
+            processed = 0
+            for course_id in course_ids:
+                course = self.courses.get(int(course_id))
+                if course is None or course['account_id'] not in accounts or course['workflow_state'] == 'deleted':
+                    missing.append(str(course_id))
+                    continue
+                course['workflow_state'] = states[event]
+                processed += 1
+
+            message = f"{processed} courses processed"
+            if missing:
+                message += f"\nThe course was not found: {', '.join(missing)}"
+            return self.start_progress(account_id, 'Account', 'course_batch_update', message)
+
+    def start_progress(self, context_id: int, context_type: str, tag: str, message: str = None) -> Dict:
+        """Create a progress record that completes after import_polls polls; caller holds the lock"""
+        progress_id = self.next_id()
+        self.progress[progress_id] = {
+            'id': progress_id,
+            'context_id': context_id,
+            'context_type': context_type,
+            'tag': tag,
+            'workflow_state': 'queued',
+            'completion': 0,
+            'message': None,
+            'polls': 0,
+            'final_message': message
+        }
+        return self.progress[progress_id]
+
+    def copy_course(self, course_id: int, source_ref: str) -> Dict:
+        """Start a course_copy_importer migration from a template course"""
+        with self.lock:
+            source = self.find(self.courses, source_ref, 'sis_course_id')
+            progress = self.start_progress(course_id, 'ContentMigration', 'content_migration',
+                                           None if source else f"Course {source_ref} not found")
+            migration_id = self.next_id()
+            self.migrations[migration_id] = {
+                'id': migration_id,
+                'migration_type': 'course_copy_importer',
+                'workflow_state': 'running',
+                'source_course_id': source['id'] if source else None,
+                'course_id': course_id,
+                'progress_url': f"/api/v1/progress/{progress['id']}"
+            }
+            if source is None:
+                progress['fails'] = True
+            return self.migrations[migration_id]
+
+    def add_enrollment(self, course_id: int, user_id: int, role: str, section_id: int = None) -> Dict:
+        enrollment_id = self.next_id()
+        self.enrollments[enrollment_id] = {
+            'id': enrollment_id,
+            'course_id': course_id,
+            'user_id': user_id,
+            'course_section_id': section_id,
+            'type': role,
+            'role': role,
+            'enrollment_state': 'active'
+        }
+        return self.enrollments[enrollment_id]
+
+def paginate(items: List[Dict]):
+    """Return one page of items with Canvas-style Link headers"""
+    per_page = min(int(request.args.get('per_page', 10)), 100)
+    page = int(request.args.get('page', 1))
+    last = max(1, -(-len(items) // per_page))
+    start = (page - 1) * per_page
+
+    links = []
+    base = request.base_url
+    # Keep repeated parameters such as state[] in the links, as Canvas does
+    args = [(k, v) for k, v in request.args.items(multi=True) if k not in ('page', 'per_page')]
+    query = ''.join(f"&{k}={v}" for k, v in args)
+    for rel, number in (('current', page), ('first', 1), ('last', last)):
+        links.append(f'<{base}?page={number}&per_page={per_page}{query}>; rel="{rel}"')
+    if page < last:
+        links.append(f'<{base}?page={page + 1}&per_page={per_page}{query}>; rel="next"')
+
+    response = jsonify(items[start:start + per_page])
+    response.headers['Link'] = ', '.join(links)
+    return response
+
+def public_progress(progress: Dict) -> Dict:
+    return {k: v for k, v in progress.items() if k not in ('polls', 'final_message', 'fails')}
+
+def not_found():
+    return jsonify({'errors': [{'message': 'The specified resource does not exist.'}]}), 404
+
+def already_in_use(field: str, value: str):
+    return jsonify({'errors': {field: [{'attribute': field, 'type': 'taken',
+                                        'message': f'ID "{value}" is already in use'}]}}), 400
+
+def create_app(state: FakeCanvas = None) -> Flask:
+    """Build a Flask app serving the fake Canvas API under /api/v1"""
+    state = state or FakeCanvas()
+    app = Flask(__name__)
+    app.config['FAKE_CANVAS'] = state
+
+    @app.before_request
+    def simulate_canvas():
+        endpoint = request.url_rule.rule if request.url_rule else request.path
+        with state.lock:
+            state.calls[f"{request.method} {endpoint}"] += 1
+
+        delay = state.delay()
+        if delay:
+            time.sleep(delay)
+
+        if state.bucket_size:
+            g.remaining = state.charge()
+            if g.remaining is None:
+                g.remaining = 0.0
+                return '403 Forbidden (Rate Limit Exceeded)', 403
+
+        if state.should_fail():
+            return jsonify({'errors': [{'message': 'Injected failure'}]}), 500
+
+    @app.after_request
+    def rate_limit_headers(response):
+        if state.bucket_size:
+            response.headers['X-Request-Cost'] = str(state.request_cost)
+            response.headers['X-Rate-Limit-Remaining'] = str(round(g.get('remaining', state.bucket_size), 3))
+        return response
+
+    @app.route('/api/v1/users/self')
+    def current_user():
+        return jsonify({'id': 1, 'name': 'Fake Admin'})
+
+    @app.route('/api/v1/accounts')
+    def list_accounts():
+        with state.lock:
+            roots = [a for a in state.accounts.values() if a['parent_account_id'] is None]
+        return paginate(roots)
+
+    @app.route('/api/v1/accounts/<int:account_id>/courses', methods=['POST'])
+    def create_course(account_id):
+        if account_id not in state.accounts:
+            return not_found()
+        sis_id = request.form.get('course[sis_course_id]')
+        with state.lock:
+            if sis_id and state.find_by(state.courses, 'sis_course_id', sis_id):
+                return already_in_use('sis_source_id', sis_id)
+            course_id = state.next_id()
+            state.courses[course_id] = {
+                'id': course_id,
+                'name': request.form.get('course[name]'),
+                'course_code': request.form.get('course[course_code]'),
+                'workflow_state': request.form.get('course[workflow_state]', 'unpublished'),
+                'account_id': account_id,
+                'sis_course_id': sis_id,
+                'created_at': datetime.utcnow().strftime(TIME_FORMAT)
+            }
+            return jsonify(state.courses[course_id])
+
+    @app.route('/api/v1/accounts/<int:account_id>/users', methods=['GET'])
+    def list_account_users(account_id):
+        if account_id not in state.accounts:
+            return not_found()
+        with state.lock:
+            users = sorted(state.users.values(), key=lambda user: user['id'])
+        return paginate(users)
+
+    @app.route('/api/v1/accounts/<int:account_id>/users', methods=['POST'])
+    def create_user(account_id):
+        if account_id not in state.accounts:
+            return not_found()
+        login_id = request.form.get('pseudonym[unique_id]')
+        sis_user_id = request.form.get('pseudonym[sis_user_id]')
+        with state.lock:
+            if state.find_by(state.users, 'login_id', login_id):
+                return already_in_use('unique_id', login_id)
+            if sis_user_id and state.find_by(state.users, 'sis_user_id', sis_user_id):
+                return already_in_use('sis_user_id', sis_user_id)
+            user_id = state.next_id()
+            state.users[user_id] = {
+                'id': user_id,
+                'name': request.form.get('user[name]'),
+                'login_id': login_id,
+                'sis_user_id': sis_user_id,
+                'email': request.form.get('communication_channel[address]')
+            }
+            return jsonify(state.users[user_id])
+
+    @app.route('/api/v1/users/<user_ref>', methods=['GET'])
+    def get_user(user_ref):
+        user = state.find(state.users, user_ref, 'sis_user_id')
+        return jsonify(user) if user else not_found()
+
+    @app.route('/api/v1/users/<int:user_id>', methods=['PUT'])
+    def update_user(user_id):
+        with state.lock:
+            user = state.users.get(user_id)
+            if user is None:
+                return not_found()
+            for field in ('name', 'short_name', 'sortable_name'):
+                if f'user[{field}]' in request.form:
+                    user[field] = request.form[f'user[{field}]']
+            return jsonify(user)
+
+    @app.route('/api/v1/accounts/<account_ref>')
+    def get_account(account_ref):
+        account = state.find(state.accounts, account_ref, 'sis_account_id')
+        return jsonify(account) if account else not_found()
+
+    @app.route('/api/v1/accounts/<int:account_id>/sub_accounts', methods=['GET'])
+    def list_subaccounts(account_id):
+        recursive = request.args.get('recursive') == 'true'
+        with state.lock:
+            parents = {account_id}
+            found = []
+            for account in sorted(state.accounts.values(), key=lambda a: a['id']):
+                if account['parent_account_id'] in parents:
+                    found.append(account)
+                    if recursive:
+                        parents.add(account['id'])
+        return paginate(found)
+
+    @app.route('/api/v1/accounts/<int:account_id>/courses', methods=['GET'])
+    def list_account_courses(account_id):
+        states = request.args.getlist('state[]')
+        with state.lock:
+            # Like Canvas, include the courses of every account below this one
+            accounts = state.account_tree(account_id)
+            courses = [c for c in state.courses.values()
+                       if c['account_id'] in accounts and (not states or c['workflow_state'] in states)]
+        sort = request.args.get('sort')
+        if sort in state.course_sorts:
+            field = {'course_name': 'name'}.get(sort, sort)
+            courses.sort(key=lambda c: (c.get(field) or '', c['id']), reverse=request.args.get('order') == 'desc')
+        return paginate(courses)
+
+    @app.route('/api/v1/accounts/<int:account_id>/sub_accounts', methods=['POST'])
+    def create_subaccount(account_id):
+        if account_id not in state.accounts:
+            return not_found()
+        sis_id = request.form.get('account[sis_account_id]')
+        with state.lock:
+            if sis_id and state.find_by(state.accounts, 'sis_account_id', sis_id):
+                return already_in_use('sis_source_id', sis_id)
+            new_id = state.next_id()
+            state.accounts[new_id] = {
+                'id': new_id,
+                'name': request.form.get('account[name]'),
+                'parent_account_id': account_id,
+                'workflow_state': 'active',
+                'sis_account_id': sis_id
+            }
+            return jsonify(state.accounts[new_id])
+
+    @app.route('/api/v1/accounts/<int:account_id>/sis_imports', methods=['POST'])
+    def create_sis_import(account_id):
+        upload = request.files.get('attachment')
+        if upload is None:
+            return jsonify({'errors': [{'message': 'attachment required'}]}), 400
+        sis_import = state.run_sis_import(account_id, upload.read())
+        return jsonify({k: v for k, v in sis_import.items() if k != 'polls'})
+
+    @app.route('/api/v1/accounts/<int:account_id>/sis_imports/<int:import_id>')
+    def get_sis_import(account_id, import_id):
+        with state.lock:
+            sis_import = state.sis_imports.get(import_id)
+            if sis_import is None:
+                return not_found()
+            sis_import['polls'] += 1
+            if sis_import['polls'] >= state.import_polls:
+                sis_import['workflow_state'] = ('imported_with_messages' if sis_import['processing_errors']
+                                                else 'imported')
+                sis_import['progress'] = 100
+            else:
+                sis_import['workflow_state'] = 'importing'
+                sis_import['progress'] = 50
+            return jsonify({k: v for k, v in sis_import.items() if k != 'polls'})
+
+    @app.route('/api/v1/accounts/<int:account_id>/courses', methods=['PUT'])
+    def batch_update_courses(account_id):
+        event = request.form.get('event')
+        if account_id not in state.accounts or event not in ('delete', 'conclude', 'offer', 'claim'):
+            return jsonify({'errors': [{'message': 'invalid batch update'}]}), 400
+        progress = state.batch_update_courses(account_id, request.form.getlist('course_ids[]'), event)
+        return jsonify(public_progress(progress))
+
+    @app.route('/api/v1/progress/<int:progress_id>')
+    def get_progress(progress_id):
+        with state.lock:
+            progress = state.progress.get(progress_id)
+            if progress is None:
+                return not_found()
+            # Like Canvas, the batch job finishes asynchronously after a poll or two
+            progress['polls'] += 1
+            if progress['polls'] >= state.import_polls:
+                progress.update(workflow_state='failed' if progress.get('fails') else 'completed',
+                                completion=100, message=progress['final_message'])
+            else:
+                progress.update(workflow_state='running', completion=50)
+            return jsonify(public_progress(progress))
+
+    @app.route('/api/v1/courses/<course_ref>')
+    def get_course(course_ref):
+        course = state.find(state.courses, course_ref, 'sis_course_id')
+        return jsonify(course) if course else not_found()
+
+    @app.route('/api/v1/courses/<int:course_id>/content_migrations', methods=['POST'])
+    def create_content_migration(course_id):
+        if course_id not in state.courses:
+            return not_found()
+        if request.form.get('migration_type') != 'course_copy_importer':
+            return jsonify({'errors': [{'message': 'unsupported migration type'}]}), 400
+        migration = state.copy_course(course_id, request.form.get('settings[source_course_id]', ''))
+        return jsonify({**migration, 'progress_url': request.host_url.rstrip('/') + migration['progress_url']})
+
+    @app.route('/api/v1/courses/<int:course_id>', methods=['DELETE'])
+    def delete_course(course_id):
+        with state.lock:
+            course = state.courses.get(course_id)
+            if course is None or course['workflow_state'] == 'deleted':
+                return not_found()
+            course['workflow_state'] = 'deleted'
+        return jsonify({'delete': True})
+
+    @app.route('/api/v1/courses/<int:course_id>/enrollments', methods=['POST'])
+    def enroll_user(course_id):
+        with state.lock:
+            if course_id not in state.courses:
+                return not_found()
+            try:
+                user_id = int(request.form.get('enrollment[user_id]', ''))
+            except ValueError:
+                return not_found()
+            if user_id not in state.users:
+                return not_found()
+            role = request.form.get('enrollment[type]', 'StudentEnrollment')
+            # Like Canvas, enrolling someone again returns the existing enrollment
+            existing = next((e for e in state.enrollments.values()
+                             if e['course_id'] == course_id and e['user_id'] == user_id and e['type'] == role), None)
+            return jsonify(existing or state.add_enrollment(course_id, user_id, role))
+
+    @app.route('/api/v1/courses/<int:course_id>/enrollments', methods=['GET'])
+    def list_enrollments(course_id):
+        if course_id not in state.courses:
+            return not_found()
+        with state.lock:
+            enrollments = []
+            for enrollment in state.enrollments.values():
+                if enrollment['course_id'] != course_id:
+                    continue
+                user = state.users[enrollment['user_id']]
+                enrollments.append({**enrollment, 'user': {
+                    'id': user['id'],
+                    'name': user['name'],
+                    'login_id': user['login_id'],
+                    'sis_user_id': user['sis_user_id']
+                }})
+        return paginate(enrollments)
+
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run an offline fake Canvas API')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every call')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='random extra latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with a 500')
+    parser.add_argument('--bucket-size', type=float, default=0.0, help='rate limit bucket (Canvas uses 700); 0 disables')
+    parser.add_argument('--leak-rate', type=float, default=10.0, help='rate limit units drained per second')
+    parser.add_argument('--request-cost', type=float, default=1.0, help='rate limit units charged per call')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    fake = FakeCanvas(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                      bucket_size=args.bucket_size, leak_rate=args.leak_rate, request_cost=args.request_cost,
+                      seed=args.seed)
+    create_app(fake).run(host='127.0.0.1', port=args.port, threaded=True)
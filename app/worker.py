@@ -0,0 +1,29 @@
+"""Standalone background job worker.
+
+Runs queued provisioning, cleanup, inventory sync and user reconcile jobs
+outside the web process (which then runs with JOB_WORKERS=0):
+
+    python -m app.worker
+
+The handler modules register themselves on app.api.jobs.job_queue when
+imported, so they are imported here before the queue is started.
+"""
+import app.api.expiry_sweeper  # noqa: F401
+import app.api.inventory_sync  # noqa: F401
+import app.api.request_provisioning  # noqa: F401
+import app.api.user_reconcile  # noqa: F401
+from app.api.jobs import job_queue
+from app.config import Config
+import time
+
+def main():
+    """Work on queued jobs until interrupted"""
+    job_queue.start(max(Config.JOB_WORKERS, 1))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from app.main import app
+from app.main import app, start_background_workers
 import os
 from dotenv import load_dotenv
 
@@ -7,4 +7,7 @@ load_dotenv()
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("DEBUG", "False").lower() == "true"
+    # With the debug reloader, only the child process that serves requests runs them
+    if not debug or os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        start_background_workers()
     app.run(host="0.0.0.0", port=port, debug=debug)
\ No newline at end of file
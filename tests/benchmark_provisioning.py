@@ -0,0 +1,182 @@
+"""Provisioning benchmark against the offline fake Canvas.
+
+Starts the fake Canvas in-process, then submits requests of increasing size
+through the API, runs the provisioning job and cleans the request up again.
+For every size it reports wall time, the number of Canvas calls and the
+p50/p95 latency of those calls. Run it from the repository root:
+
+    python -m tests.benchmark_provisioning --sizes 10 100 1000 --latency 0.02
+
+Use --backend rest to keep large requests off the SIS import path, and
+--bucket-size 700 to benchmark under Canvas-style rate limiting.
+"""
+import argparse
+import base64
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='students per request')
+    parser.add_argument('--courses', type=int, default=1, help='courses per request')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size')
+    parser.add_argument('--backend', choices=['auto', 'rest', 'sis_import'], default='auto')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--bucket-size', type=float, default=0.0)
+    parser.add_argument('--leak-rate', type=float, default=10.0)
+    parser.add_argument('--request-cost', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+def configure(args, canvas_url):
+    """Point the app at the fake Canvas and a throwaway database and log; must run before importing it"""
+    os.environ['CANVAS_API_URL'] = canvas_url
+    os.environ['CANVAS_API_TOKEN'] = 'benchmark'
+    os.environ['TEST_ENV_TEST'] = canvas_url
+    data_dir = tempfile.mkdtemp(prefix='canvas-bench-')
+    os.environ['DATABASE_PATH'] = os.path.join(data_dir, 'bench.db')
+    os.environ['REQUEST_LOG_PATH'] = os.path.join(data_dir, 'request_log.jsonl')
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['INVENTORY_SYNC_INTERVAL'] = '0'
+    os.environ['CLEANUP_SWEEP_INTERVAL'] = '0'
+    os.environ.setdefault('SIS_IMPORT_POLL_INTERVAL', '0.05')
+    os.environ.setdefault('PROGRESS_POLL_INTERVAL', '0.05')
+    if args.backend == 'rest':
+        os.environ['SIS_IMPORT_THRESHOLD'] = str(sys.maxsize)
+    elif args.backend == 'sis_import':
+        os.environ['SIS_IMPORT_THRESHOLD'] = '0'
+
+def start_fake_canvas(args):
+    from app.testing.fake_canvas import FakeCanvas, create_app
+    from werkzeug.serving import make_server
+
+    fake = FakeCanvas(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                      bucket_size=args.bucket_size, leak_rate=args.leak_rate, request_cost=args.request_cost,
+                      seed=args.seed)
+    server = make_server('127.0.0.1', 0, create_app(fake), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fake, server, f"http://127.0.0.1:{server.server_port}"
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class CallRecorder:
+    """Collects the latency of every Canvas response the app's client receives"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def __call__(self, response, *args, **kwargs):
+        with self.lock:
+            self.latencies.append(response.elapsed.total_seconds())
+        return response
+
+    def drain(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+def request_payload(students, courses):
+    return {
+        'scenario': 'basic-course',
+        'requester': 'benchmark@uva.nl',
+        'environment': 'test',
+        'start_date': '2026-01-01',
+        'end_date': '2026-12-31',
+        'admin_users': [],
+        'subaccount': {'create': True, 'name': f'Benchmark {students}'},
+        'courses': [{'name': f'Benchmark course {i + 1}', 'sections': 1, 'students': students, 'teachers': 1}
+                    for i in range(courses)],
+        'options': {'configure_terms': False, 'add_apps': False, 'app_names': []}
+    }
+
+def measure(fake, recorder, action):
+    """Run action and return (result, wall seconds, Canvas calls, call latencies)"""
+    recorder.drain()
+    calls_before = fake.stats()['calls']
+    started = time.perf_counter()
+    result = action()
+    wall = time.perf_counter() - started
+    return result, wall, fake.stats()['calls'] - calls_before, recorder.drain()
+
+def run(args):
+    fake, server, canvas_url = start_fake_canvas(args)
+    configure(args, canvas_url)
+
+    from app.api.client_registry import get_client
+    from app.api.jobs import job_queue
+    from app.main import app
+
+    # Per-call request logging would dominate the timings
+    logging.disable(logging.INFO)
+    recorder = CallRecorder()
+    get_client('test').session.hooks['response'].append(recorder)
+
+    client = app.test_client()
+    auth = base64.b64encode(
+        f"{os.getenv('DEMO_USERNAME', 'admin')}:{os.getenv('DEMO_PASSWORD', 'uva2025demo')}".encode()
+    ).decode()
+    headers = {'Authorization': f'Basic {auth}'}
+
+    def provision(students):
+        response = client.post('/api/submit-request', json=request_payload(students, args.courses), headers=headers)
+        if response.status_code != 202:
+            raise RuntimeError(f"Submit failed: {response.get_json()}")
+        while job_queue.run_one():
+            pass
+        return client.get(f"/api/requests/{response.get_json()['request_id']}", headers=headers).get_json()
+
+    def cleanup(request_id):
+        return client.post(f'/api/requests/{request_id}/cleanup', headers=headers).get_json()
+
+    rows = []
+    for students in args.sizes:
+        for attempt in range(args.repeat):
+            record, wall, calls, latencies = measure(fake, recorder, lambda: provision(students))
+            errors = len(record['created_resources']['errors'])
+            rows.append(('provision', students, record.get('backend'), wall, calls, latencies, errors))
+
+            cleaned, wall, calls, latencies = measure(fake, recorder, lambda: cleanup(record['id']))
+            rows.append(('cleanup', students, record.get('backend'), wall, calls, latencies,
+                         len(cleaned.get('errors', []))))
+
+    server.shutdown()
+    return rows, fake.stats()
+
+def report(rows, stats):
+    header = f"{'phase':<10} {'students':>8} {'backend':<11} {'wall s':>8} {'calls':>6} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'errors':>6}"
+    print(header)
+    print('-' * len(header))
+    for phase, students, backend, wall, calls, latencies, errors in rows:
+        print(f"{phase:<10} {students:>8} {backend or '-':<11} {wall:>8.2f} {calls:>6} "
+              f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} {errors:>6}")
+
+    walls = {}
+    for phase, students, _, wall, *_ in rows:
+        walls.setdefault((phase, students), []).append(wall)
+    if any(len(values) > 1 for values in walls.values()):
+        print()
+        print('wall time over repeats (s)')
+        for (phase, students), values in walls.items():
+            print(f"  {phase:<10} {students:>8}  median {statistics.median(values):.2f}  "
+                  f"p95 {percentile(values, 0.95):.2f}")
+
+    print()
+    print(f"fake Canvas: {stats['calls']} calls, {stats['throttled']} throttled, "
+          f"{stats['injected_errors']} injected errors")
+
+if __name__ == '__main__':
+    report(*run(parse_args()))
@@ -0,0 +1,88 @@
+"""Fixtures for behaviour tests against the in-process fake Canvas.
+
+The app reads its configuration when it is imported, so the fake Canvas is
+started and the environment pointed at it, a throwaway database and a
+throwaway request log before anything that imports app.config.
+"""
+from app.testing.fake_canvas import FakeCanvas, create_app
+from werkzeug.serving import make_server
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+
+import pytest
+
+fake_canvas = FakeCanvas(import_polls=1, seed=0)
+_server = make_server('127.0.0.1', 0, create_app(fake_canvas), threaded=True)
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+CANVAS_URL = f"http://127.0.0.1:{_server.server_port}"
+
+_data_dir = tempfile.mkdtemp(prefix='canvas-tests-')
+os.environ.update({
+    'CANVAS_API_URL': CANVAS_URL,
+    'CANVAS_API_TOKEN': 'tests',
+    'TEST_ENV_TEST': CANVAS_URL,
+    'DATABASE_PATH': os.path.join(_data_dir, 'tests.db'),
+    'REQUEST_LOG_PATH': os.path.join(_data_dir, 'request_log.jsonl'),
+    'JOB_WORKERS': '0',
+    'USER_POOL_SIZE': '0',
+    'INVENTORY_SYNC_INTERVAL': '0',
+    'CLEANUP_SWEEP_INTERVAL': '0',
+    'CLEANUP_WINDOW': '',
+    'SIS_IMPORT_THRESHOLD': str(sys.maxsize),
+    'SIS_IMPORT_POLL_INTERVAL': '0.01',
+    'PROGRESS_POLL_INTERVAL': '0.01',
+    'JOB_PROGRESS_INTERVAL': '0'
+})
+
+def pytest_sessionfinish(session, exitstatus):
+    _server.shutdown()
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'admin:uva2025demo').decode()}
+
+def request_payload(students=5, courses=1, end_date='2099-12-31'):
+    # Test users are scoped to the requester, so each request gets its own
+    return {
+        'scenario': 'basic-course',
+        'requester': f'tests-{uuid.uuid4().hex[:8]}@uva.nl',
+        'environment': 'test',
+        'start_date': '2026-01-01',
+        'end_date': end_date,
+        'admin_users': [],
+        'subaccount': {'create': True, 'name': 'Tests'},
+        'courses': [{'name': f'Test course {i + 1}', 'sections': 1, 'students': students, 'teachers': 1}
+                    for i in range(courses)],
+        'options': {'configure_terms': False, 'add_apps': False, 'app_names': []}
+    }
+
+def run_jobs():
+    """Run queued jobs in this thread until the queue is empty"""
+    from app.api.jobs import job_queue
+    while job_queue.run_one():
+        pass
+
+@pytest.fixture
+def fake():
+    """The fake Canvas, with error injection switched off again after the test"""
+    yield fake_canvas
+    fake_canvas.error_rate = 0.0
+
+@pytest.fixture
+def client():
+    from app.main import app
+    return app.test_client()
+
+@pytest.fixture
+def submit(client):
+    """Submit a request through the API and run its provisioning job; returns the submit response"""
+    def submit(payload):
+        response = client.post('/api/submit-request', json=payload, headers=AUTH)
+        assert response.status_code == 202, response.get_json()
+        run_jobs()
+        return response.get_json()
+    return submit
@@ -0,0 +1,84 @@
+"""CanvasClient against the fake Canvas"""
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+import itertools
+import time
+
+from app.api import canvas_client
+from app.api.client_registry import get_client
+from app.config import Config
+from app.metrics import track_timings
+
+COURSE_LISTING = 'GET /api/v1/accounts/<int:account_id>/courses'
+
+def add_courses(fake, count):
+    for _ in range(count):
+        course_id = fake.next_id()
+        fake.courses[course_id] = {'id': course_id, 'name': f'Listed {course_id}', 'course_code': 'LIST',
+                                   'workflow_state': 'available', 'account_id': 1, 'sis_course_id': None,
+                                   'created_at': '2026-01-01T00:00:00Z'}
+
+def listing_calls(fake):
+    return fake.stats()['by_endpoint'].get(COURSE_LISTING, 0)
+
+def test_listing_times_each_page_but_not_the_callers_work(fake, monkeypatch):
+    add_courses(fake, 10)
+    monkeypatch.setattr(canvas_client, 'PAGE_SIZE', 2)
+    client = get_client('test')
+    calls = listing_calls(fake)
+
+    with track_timings() as breakdown:
+        listing = client.iter_account_courses(1)
+        for _ in itertools.islice(listing, 4):
+            time.sleep(0.1)
+        listing.close()
+
+    operation = breakdown.as_dict()['categories']['canvas']['operations']['iter_account_courses']
+    # One timed call per page fetched, prefetched ones included
+    assert operation['calls'] == listing_calls(fake) - calls >= 2
+    assert operation['seconds'] < 0.4
+
+def test_prefetched_pages_are_yielded_in_page_order(fake, monkeypatch):
+    add_courses(fake, 10)
+    monkeypatch.setattr(canvas_client, 'PAGE_SIZE', 2)
+    client = get_client('test')
+    monkeypatch.setattr(Config, 'LISTING_PREFETCH_PAGES', 1)
+    expected = [course['id'] for course in client.iter_account_courses(1)]
+
+    # Page 2 is the slowest to answer, so pages after it arrive first
+    arrivals = []
+    request = client.session.request
+
+    def page_two_last(method, url, *args, **kwargs):
+        response = request(method, url, *args, **kwargs)
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        if page == 2:
+            time.sleep(0.3)
+        arrivals.append(page)
+        return response
+
+    monkeypatch.setattr(client.session, 'request', page_two_last)
+    monkeypatch.setattr(Config, 'LISTING_PREFETCH_PAGES', 4)
+    assert [course['id'] for course in client.iter_account_courses(1)] == expected
+    assert arrivals.index(3) < arrivals.index(2)
+    assert sorted(arrivals) == list(range(1, len(arrivals) + 1))
+
+def test_writes_go_straight_to_the_endpoint_without_fetching_the_parent(fake):
+    client = get_client('test')
+    login = f'handles-{time.monotonic_ns()}'
+    before = Counter(fake.stats()['by_endpoint'])
+
+    subaccount = client.create_subaccount(1, 'Handles')
+    course = client.create_course(subaccount['id'], 'Handles', 'HND')
+    user = client.create_user(subaccount['id'], 'Handles User', f'{login}@uva.nl', login)
+    client.enroll_user(course['id'], user['id'])
+    client.delete_course(course['id'])
+
+    # One call per write: no GET of the account or course it goes through
+    assert Counter(fake.stats()['by_endpoint']) - before == Counter({
+        'POST /api/v1/accounts/<int:account_id>/sub_accounts': 1,
+        'POST /api/v1/accounts/<int:account_id>/courses': 1,
+        'POST /api/v1/accounts/<int:account_id>/users': 1,
+        'POST /api/v1/courses/<int:course_id>/enrollments': 1,
+        'DELETE /api/v1/courses/<int:course_id>': 1
+    })
@@ -0,0 +1,63 @@
+"""Batched course deletes against the fake Canvas"""
+from app.api.cleanup import _batch_failures, delete_courses
+from app.api.client_registry import get_client
+
+BATCH_UPDATE = 'PUT /api/v1/accounts/<int:account_id>/courses'
+SINGLE_DELETE = 'DELETE /api/v1/courses/<int:course_id>'
+
+def endpoint_calls(fake, endpoint):
+    return fake.stats()['by_endpoint'].get(endpoint, 0)
+
+def test_courses_are_deleted_in_batches_per_account(fake):
+    client = get_client('test')
+    faculty = client.create_subaccount(1, 'Cleanup faculty')
+    department = client.create_subaccount(1, 'Cleanup department')
+    in_faculty = [client.create_course(faculty['id'], f'Faculty {n}', 'DEL') for n in range(3)]
+    in_department = client.create_course(department['id'], 'Department', 'DEL')
+    in_root = client.create_course(1, 'Root', 'DEL')
+    batches = endpoint_calls(fake, BATCH_UPDATE)
+
+    # Plain ids are deleted through the root account
+    courses = [in_faculty[0], in_department, in_faculty[1], in_root['id'], in_faculty[2]]
+    results = delete_courses(client, courses, batch_size=2)
+
+    assert [result['course_id'] for result in results] == [in_faculty[0]['id'], in_department['id'],
+                                                           in_faculty[1]['id'], in_root['id'], in_faculty[2]['id']]
+    assert all(result['deleted'] and result['method'] == 'batch' for result in results)
+    # Two chunks for the faculty, one each for the department and the root account
+    assert endpoint_calls(fake, BATCH_UPDATE) - batches == 4
+    assert {fake.courses[result['course_id']]['workflow_state'] for result in results} == {'deleted'}
+
+def test_batch_failures_are_reported_per_course(fake):
+    client = get_client('test')
+    gone = client.create_course(1, 'Already gone', 'DEL')
+    kept = client.create_course(1, 'Still there', 'DEL')
+    fake.courses[gone['id']]['workflow_state'] = 'deleted'
+
+    results = delete_courses(client, [gone, kept])
+    assert results[0] == {'course_id': gone['id'], 'deleted': False, 'error': 'The course was not found',
+                          'method': 'batch'}
+    assert results[1]['deleted'] and results[1]['error'] is None
+
+def test_failed_batch_calls_fall_back_to_single_deletes(fake):
+    client = get_client('test')
+    # The record points at an account Canvas doesn't have, so the batch call is rejected
+    courses = [{**client.create_course(1, f'Misfiled {n}', 'DEL'), 'account_id': 999999999} for n in range(2)]
+    singles = endpoint_calls(fake, SINGLE_DELETE)
+
+    results = delete_courses(client, courses)
+    assert [(result['deleted'], result['method']) for result in results] == [(True, 'single'), (True, 'single')]
+    assert endpoint_calls(fake, SINGLE_DELETE) - singles == 2
+
+def test_progress_messages_map_errors_to_courses():
+    message = ("3 courses processed\n"
+               "The course was not found: 12, 13\n"
+               "Course is still in use: 14\n"
+               "Unrelated error: 99")
+    assert _batch_failures(message, [11, 12, 13, 14]) == {
+        12: 'The course was not found',
+        13: 'The course was not found',
+        14: 'Course is still in use'
+    }
+    assert _batch_failures('4 courses processed', [11]) == {}
+    assert _batch_failures(None, [11]) == {}
@@ -0,0 +1,19 @@
+"""Pooled Canvas clients"""
+from tests.conftest import CANVAS_URL
+
+def test_client_is_reused_until_url_or_token_changes(monkeypatch):
+    from app.api.client_registry import ClientRegistry
+    registry = ClientRegistry()
+
+    client = registry.get('test')
+    assert registry.get('test') is client
+
+    monkeypatch.setenv('CANVAS_API_URL_TEST', f'{CANVAS_URL}/api/v1')
+    moved = registry.get('test')
+    assert moved is not client
+    assert registry.get('test') is moved
+
+    monkeypatch.setenv('CANVAS_API_TOKEN_TEST', 'rotated')
+    rotated = registry.get('test')
+    assert rotated is not moved
+    assert rotated.token == 'rotated'
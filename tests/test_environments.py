@@ -0,0 +1,54 @@
+"""Per-environment Canvas credentials and environment status"""
+import threading
+import uuid
+
+from tests.conftest import AUTH, CANVAS_URL
+
+from app.api import routes
+from app.config import Config
+
+def test_credentials_prefer_environment_specific_settings(monkeypatch):
+    for name in ('CANVAS_API_URL_ACCEPTATIE', 'CANVAS_API_TOKEN_ACCEPTATIE', 'TEST_ENV_ACCEPTATIE'):
+        monkeypatch.delenv(name, raising=False)
+    assert Config.canvas_credentials('acceptatie') == (CANVAS_URL, 'tests')
+
+    monkeypatch.setenv('TEST_ENV_ACCEPTATIE', 'https://acceptatie.example.edu')
+    assert Config.canvas_credentials('acceptatie') == ('https://acceptatie.example.edu', 'tests')
+
+    monkeypatch.setenv('CANVAS_API_URL_ACCEPTATIE', 'https://api.acceptatie.example.edu')
+    monkeypatch.setenv('CANVAS_API_TOKEN_ACCEPTATIE', 'acceptatie-token')
+    assert Config.canvas_credentials('acceptatie') == ('https://api.acceptatie.example.edu', 'acceptatie-token')
+    # Other environments still use the global settings
+    assert Config.canvas_credentials('test') == (CANVAS_URL, 'tests')
+    assert Config.canvas_credentials() == (CANVAS_URL, 'tests')
+
+def test_status_reports_slow_first_crawls_as_pending(client, monkeypatch):
+    slow, quick = f'slow-{uuid.uuid4().hex[:8]}', f'quick-{uuid.uuid4().hex[:8]}'
+    monkeypatch.setattr(Config, 'TEST_ENVIRONMENTS', {slow: CANVAS_URL, quick: CANVAS_URL})
+    release = threading.Event()
+    crawls = []
+
+    def status(env):
+        crawls.append(env)
+        if env == slow:
+            release.wait(5)
+        return {'status': 'connected', 'total_courses': 0}
+    monkeypatch.setattr(routes.inventory_sync, 'status', status)
+
+    try:
+        statuses = client.get('/api/environments/status?deadline=0.1', headers=AUTH).get_json()
+        assert statuses[slow] == {'status': 'pending', 'environment': slow, 'cache': {'cache': 'pending'}}
+        assert statuses[quick]['status'] == 'connected'
+        assert statuses[quick]['cache']['cache'] == 'miss'
+    finally:
+        release.set()
+
+    # The slow crawl carried on in the background and the next call gets its result
+    statuses = client.get('/api/environments/status?deadline=5', headers=AUTH).get_json()
+    assert statuses[slow]['status'] == 'connected'
+    assert statuses[quick]['cache']['cache'] == 'hit'
+    assert sorted(crawls) == sorted([slow, quick])
+
+def test_status_rejects_a_bad_deadline(client):
+    response = client.get('/api/environments/status?deadline=soon', headers=AUTH)
+    assert response.status_code == 400
@@ -0,0 +1,48 @@
+"""Automatic cleanup of expired requests against the fake Canvas"""
+from tests.conftest import request_payload, run_jobs
+
+from app.api.expiry_sweeper import expiry_sweeper
+from app.config import Config
+from app.models.request_store import request_store
+
+def expire(request_id):
+    request_store.update(request_id, {'end_date': '2020-01-01'})
+
+def sweep():
+    assert expiry_sweeper.sweep() is not None
+    run_jobs()
+
+def test_partly_failed_cleanup_is_retried_until_every_course_is_gone(fake, submit):
+    request_id = submit(request_payload(students=2, courses=2))['request_id']
+    expire(request_id)
+
+    # Every course delete fails: the request stays uncleaned and counts an attempt
+    fake.error_rate = 1.0
+    sweep()
+    fake.error_rate = 0.0
+    record = request_store.get(request_id)
+    assert not record['cleaned']
+    assert record['cleanup_attempts'] == 1
+    assert 'Failed to delete course' in record['cleanup_error']
+
+    # The next sweep deletes what was left and only then marks it cleaned
+    sweep()
+    record = request_store.get(request_id)
+    assert record['cleaned']
+    assert record['cleanup_reason'] == 'expired'
+    assert record['cleanup_results']['deleted_courses'] == 2
+    for course in record['created_resources']['courses']:
+        assert fake.courses[course['id']]['workflow_state'] == 'deleted'
+
+def test_cleanup_gives_up_after_max_attempts(fake, submit):
+    request_id = submit(request_payload(students=1))['request_id']
+    expire(request_id)
+
+    fake.error_rate = 1.0
+    for _ in range(Config.CLEANUP_MAX_ATTEMPTS):
+        sweep()
+    fake.error_rate = 0.0
+
+    assert request_store.get(request_id)['cleanup_attempts'] == Config.CLEANUP_MAX_ATTEMPTS
+    expired = request_store.expired('2021-01-01', 100, max_attempts=Config.CLEANUP_MAX_ATTEMPTS)
+    assert request_id not in [record['id'] for record in expired]
@@ -0,0 +1,53 @@
+"""Inventory sync against the fake Canvas"""
+import requests
+
+from tests.conftest import CANVAS_URL
+
+from app.api.canvas_client import CANVAS_TIME_FORMAT, canvas_time
+from app.api.inventory_sync import inventory_sync
+from app.models.inventory import inventory
+from datetime import datetime
+
+def create_outside_course(name):
+    response = requests.post(f'{CANVAS_URL}/api/v1/accounts/1/courses',
+                             data={'course[name]': name, 'course[course_code]': 'OUT'},
+                             headers={'Authorization': 'Bearer tests'})
+    response.raise_for_status()
+    return response.json()
+
+def test_canvas_time_matches_canvas_format():
+    assert canvas_time('2026-10-18T15:35:55.123456Z') == '2026-10-18T15:35:55Z'
+    assert canvas_time('2026-10-18T17:35:55+02:00') == '2026-10-18T15:35:55Z'
+    datetime.strptime(canvas_time(), CANVAS_TIME_FORMAT)
+
+def test_incremental_sync_picks_up_outside_courses(fake):
+    inventory_sync.sync('test', full=True)
+    created = create_outside_course('Outside sorted')
+    result = inventory_sync.sync('test', full=False)
+    assert result['sorted']
+    assert created['id'] in {course['id'] for course in inventory.iter_courses('test', limit=1000)[0]}
+
+def test_incremental_sync_stops_when_canvas_ignores_the_sort(fake, monkeypatch):
+    # Earlier courses may straddle a second; give them one time so only the new ones are out of order
+    for course in fake.courses.values():
+        course['created_at'] = '2026-01-01T00:00:00Z'
+    inventory_sync.sync('test', full=True)
+    # A watermark past the oldest course, so an oldest-first listing starts below it
+    inventory.mark_synced('test', '2029-01-01T00:00:00Z')
+    # More than one page of them, created in one second here; spread them out like
+    # courses created over days, so an unsorted listing shows ascending times
+    for index in range(150):
+        course = create_outside_course(f'Outside unsorted {index}')
+        fake.courses[course['id']]['created_at'] = f'2030-01-01T{index // 60:02d}:{index % 60:02d}:00Z'
+    monkeypatch.setattr(fake, 'course_sorts', set())
+    calls = fake.stats()['calls']
+
+    result = inventory_sync.sync('test', full=False)
+    assert not result['sorted']
+    # Subaccounts, then a single page of courses rather than all of them
+    assert fake.stats()['calls'] - calls <= 2
+
+    # The full crawl still finds them
+    inventory_sync.sync('test', full=True)
+    names = {course['name'] for course in inventory.iter_courses('test', limit=1000)[0]}
+    assert {f'Outside unsorted {index}' for index in range(150)} <= names
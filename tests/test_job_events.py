@@ -0,0 +1,39 @@
+"""Server-Sent Events of provisioning jobs"""
+import threading
+
+from tests.conftest import AUTH, request_payload, run_jobs
+
+def read_events(response):
+    """Parse an SSE body into (id, type) pairs as it streams"""
+    buffer = ''
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer:
+            block, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+            if 'event' in fields:
+                yield fields['id'], fields['event']
+
+def test_watchers_receive_events_while_the_job_runs(client):
+    submitted = client.post('/api/submit-request', json=request_payload(students=2), headers=AUTH).get_json()
+    response = client.get(f"/api/jobs/{submitted['job_id']}/events", headers=AUTH, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+
+    # The job only starts once the watcher is waiting
+    worker = threading.Timer(0.2, run_jobs)
+    worker.start()
+    types = []
+    for event_id, event_type in read_events(response):
+        types.append(event_type)
+        if event_type == 'job_finished':
+            break
+    response.close()
+    worker.join()
+
+    assert types[-1] == 'job_finished'
+    assert 'course_created' in types
+    assert types.count('user_created') == 3
+
+    # A finished, fully delivered job tells EventSource to stop reconnecting
+    resumed = client.get(f"/api/jobs/{submitted['job_id']}/events", headers={**AUTH, 'Last-Event-ID': event_id})
+    assert resumed.status_code == 204
@@ -0,0 +1,60 @@
+"""Dry-run plans against what a run actually costs"""
+from collections import Counter
+
+from tests.conftest import AUTH, request_payload
+
+from app.config import Config
+
+def endpoint_calls(fake):
+    return Counter(fake.stats()['by_endpoint'])
+
+def plan(client, payload):
+    response = client.post('/api/submit-request?dry_run=1', json=payload, headers=AUTH)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_rest_plan_matches_the_calls_a_run_makes(client, fake, submit):
+    payload = request_payload(students=5, courses=2)
+    planned = plan(client, payload)
+    assert planned['dry_run'] and planned['allowed']
+    assert planned['backend'] == 'rest'
+    assert planned['calls'] == {'create_subaccount': 1, 'create_course': 2, 'create_user': 6, 'enroll_user': 12}
+
+    before = endpoint_calls(fake)
+    submit(payload)
+    made = endpoint_calls(fake) - before
+    assert made == Counter({
+        'POST /api/v1/accounts/<int:account_id>/sub_accounts': 1,
+        'POST /api/v1/accounts/<int:account_id>/courses': 2,
+        'POST /api/v1/accounts/<int:account_id>/users': 6,
+        'POST /api/v1/courses/<int:course_id>/enrollments': 12
+    })
+    assert planned['total_calls'] == sum(made.values())
+
+def test_sis_import_plan_matches_the_calls_a_run_makes(client, fake, submit, monkeypatch):
+    monkeypatch.setattr(Config, 'SIS_IMPORT_THRESHOLD', 0)
+    payload = request_payload(students=5, courses=2)
+    planned = plan(client, payload)
+    assert planned['backend'] == 'sis_import'
+    assert planned['calls'] == {'create_subaccount': 1, 'create_sis_import': 1, 'wait_for_sis_import': 1,
+                                'get_course_by_sis_id': 2, 'list_course_enrollments': 2}
+
+    before = endpoint_calls(fake)
+    submit(payload)
+    made = endpoint_calls(fake) - before
+    assert made['POST /api/v1/accounts/<int:account_id>/sub_accounts'] == 1
+    assert made['POST /api/v1/accounts/<int:account_id>/sis_imports'] == 1
+    # Waiting polls until the import has finished
+    assert made['GET /api/v1/accounts/<int:account_id>/sis_imports/<int:import_id>'] >= 1
+    assert made['GET /api/v1/courses/<course_ref>'] == 2
+    assert made['GET /api/v1/courses/<int:course_id>/enrollments'] == 2
+
+def test_requests_over_the_call_limit_are_refused(client, fake, monkeypatch):
+    monkeypatch.setattr(Config, 'PLAN_MAX_CANVAS_CALLS', 10)
+    calls = fake.stats()['calls']
+    response = client.post('/api/submit-request', json=request_payload(students=5, courses=2), headers=AUTH)
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['error'] == 'Request too large'
+    assert body['plan']['refusals'] == ['21 Canvas calls exceed the limit of 10']
+    assert fake.stats()['calls'] == calls
@@ -0,0 +1,29 @@
+"""Provisioning helpers"""
+import time
+
+from app.api.provisioning import BACKEND_REST, BACKEND_SIS_IMPORT, run_bounded, select_backend
+from app.config import Config
+
+def course(students, teachers=1):
+    return {'name': 'Course', 'sections': 1, 'students': students, 'teachers': teachers}
+
+def test_select_backend_counts_shared_users_once(monkeypatch):
+    monkeypatch.setattr(Config, 'SIS_IMPORT_THRESHOLD', 200)
+    # 101 distinct users, though the per-course sum is 202
+    assert select_backend([course(100), course(100)]) == BACKEND_REST
+    assert select_backend([course(200), course(10)]) == BACKEND_SIS_IMPORT
+
+def test_run_bounded_keeps_item_order_and_captures_errors():
+    def work(item):
+        # Later items finish first
+        time.sleep((8 - item) * 0.01)
+        if item == 3:
+            raise ValueError('three')
+        return item * 10
+
+    results = run_bounded(work, range(8), max_workers=4)
+    assert [item for item, _, _ in results] == list(range(8))
+    assert [result for _, result, _ in results] == [0, 10, 20, None, 40, 50, 60, 70]
+    errors = {item: error for item, _, error in results if error is not None}
+    assert list(errors) == [3]
+    assert str(errors[3]) == 'three'
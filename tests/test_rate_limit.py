@@ -0,0 +1,102 @@
+"""Adaptive Canvas concurrency and throttling"""
+import io
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+from app.api.rate_limit import RateLimitController, RateLimitedSession
+from app.config import Config
+
+def canvas_response(status=200, remaining=None, text=''):
+    response = requests.Response()
+    response.status_code = status
+    response._content = text.encode()
+    if remaining is not None:
+        response.headers['X-Rate-Limit-Remaining'] = str(remaining)
+    return response
+
+class ScriptedAdapter(BaseAdapter):
+    """Answers with the given responses in turn and keeps the bodies it was sent"""
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.bodies = []
+
+    def send(self, request, **kwargs):
+        self.bodies.append(request.body)
+        response = self.responses.pop(0)
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+def test_cap_grows_per_window_and_halves_once_per_low_budget():
+    controller = RateLimitController(initial=4, minimum=1, maximum=8, low_water=100)
+    for _ in range(4):
+        controller.acquire()
+        controller.release(canvas_response(remaining=500))
+    assert controller.limit == 5
+
+    # Three calls in flight when the budget runs low: the cap halves for the first only
+    for _ in range(3):
+        controller.acquire()
+    for _ in range(3):
+        controller.release(canvas_response(remaining=50))
+    assert controller.limit == 2
+    assert controller.counters['decreases'] == 1
+
+    # Throttled calls halve it too, down to the minimum
+    controller.acquire()
+    controller.release(canvas_response(403, text='403 Forbidden (Rate Limit Exceeded)'), throttled=True)
+    assert controller.limit == 1
+
+def test_requests_are_paced_when_the_bucket_is_nearly_empty(monkeypatch):
+    monkeypatch.setattr(Config, 'RATE_LIMIT_PACING_DELAY', 0.2)
+    controller = RateLimitController(initial=4, low_water=100)
+    controller.acquire()
+    controller.release(canvas_response(remaining=0))
+
+    started = time.monotonic()
+    controller.acquire()
+    assert time.monotonic() - started >= 0.15
+    controller.release(canvas_response(remaining=500))
+
+    # A budget just under low water only waits a fraction as long
+    controller.acquire()
+    controller.release(canvas_response(remaining=90))
+    assert controller.stats()['paused_for'] <= 0.2 * 0.1 + 0.01
+
+def test_throttled_calls_back_off_and_retry_with_the_upload_rewound(monkeypatch):
+    monkeypatch.setattr(Config, 'RATE_LIMIT_BACKOFF_BASE', 0.01)
+    controller = RateLimitController(initial=4)
+    session = RateLimitedSession(controller, max_retries=3)
+    adapter = ScriptedAdapter([
+        canvas_response(403, remaining=0, text='403 Forbidden (Rate Limit Exceeded)'),
+        canvas_response(429, remaining=0),
+        canvas_response(200, remaining=700)
+    ])
+    session.mount('http://', adapter)
+
+    response = session.post('http://canvas.test/api/v1/accounts/1/sis_imports',
+                            files={'attachment': ('import.zip', io.BytesIO(b'zipped csv'))})
+    assert response.status_code == 200
+    assert len(adapter.bodies) == 3
+    assert all(b'zipped csv' in body for body in adapter.bodies)
+    assert controller.counters['throttled'] == 2
+    assert controller.counters['retries'] == 2
+
+def test_retries_stop_at_the_limit(monkeypatch):
+    monkeypatch.setattr(Config, 'RATE_LIMIT_BACKOFF_BASE', 0.01)
+    session = RateLimitedSession(RateLimitController(), max_retries=1)
+    session.mount('http://', ScriptedAdapter([canvas_response(429), canvas_response(429), canvas_response(200)]))
+    assert session.get('http://canvas.test/api/v1/courses').status_code == 429
+
+def test_other_403s_are_not_retried():
+    session = RateLimitedSession(RateLimitController(), max_retries=3)
+    adapter = ScriptedAdapter([canvas_response(403, text='user not authorized'), canvas_response(200)])
+    session.mount('http://', adapter)
+    assert session.get('http://canvas.test/api/v1/courses').status_code == 403
+    assert len(adapter.bodies) == 1
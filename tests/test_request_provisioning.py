@@ -0,0 +1,119 @@
+"""Provisioning jobs run end to end against the fake Canvas"""
+from tests.conftest import AUTH, request_payload, run_jobs
+
+from app.api.canvas_client import CanvasClient
+from app.api.jobs import job_queue
+from app.api.provisioning import course_sis_id
+from app.config import Config
+from app.models.request_store import request_store
+
+def test_progress_never_exceeds_totals_when_courses_fail(client, fake, submit):
+    # Users are shared by both courses, so a failed course must not count them as failed
+    # while the other course can still create them
+    fake.error_rate = 0.3
+    submitted = submit(request_payload(students=10, courses=2))
+    fake.error_rate = 0.0
+
+    job = client.get(submitted['status_url'], headers=AUTH).get_json()
+    # Every item is counted exactly once by the time the job has finished
+    for name, phase in job['progress']['phases'].items():
+        assert phase['done'] + phase['failed'] == phase['total'], (name, phase)
+    assert job['progress']['phases']['users']['total'] == 11
+    assert job['progress']['phases']['enrollments']['total'] == 22
+
+    # Nor may the overall progress reported with each event
+    for event in job_queue.events_since(submitted['job_id'], limit=10000):
+        if 'total' in event['data']:
+            assert event['data']['done'] <= event['data']['total'], event
+
+def test_resume_finishes_a_failed_request_without_duplicates(client, fake, submit):
+    fake.error_rate = 0.5
+    request_id = submit(request_payload(students=5, courses=2))['request_id']
+    fake.error_rate = 0.0
+    record = request_store.get(request_id)
+    assert record['resumable']
+    assert record['created_resources']['errors']
+
+    response = client.post(f'/api/requests/{request_id}/resume', headers=AUTH)
+    assert response.status_code == 202
+    run_jobs()
+
+    record = request_store.get(request_id)
+    assert record['status'] == 'completed'
+    assert not record['resumable']
+    assert not record['created_resources']['errors']
+
+    # Every test user exists once in Canvas and is enrolled once in each course
+    suffix = record['user_suffix']
+    users = [user for user in fake.users.values() if user.get('login_id', '').endswith(f'_{suffix}')]
+    assert len(users) == 6
+    assert len({user['login_id'] for user in users}) == 6
+    course_ids = {course['id'] for course in record['created_resources']['courses']}
+    assert len(course_ids) == 2
+    enrollments = [(enrollment['course_id'], enrollment['user_id']) for enrollment in fake.enrollments.values()
+                   if enrollment['course_id'] in course_ids]
+    assert len(enrollments) == 12
+    assert len(set(enrollments)) == 12
+
+    # Nothing is left to resume
+    assert client.post(f'/api/requests/{request_id}/resume', headers=AUTH).status_code == 400
+
+def test_resume_reimports_sis_requests_without_duplicates(client, fake, submit, monkeypatch):
+    monkeypatch.setattr(Config, 'SIS_IMPORT_THRESHOLD', 0)
+
+    # The import applies, but mapping it back to Canvas ids fails
+    def unavailable(self, course_id):
+        raise RuntimeError('Enrollments unavailable')
+    with monkeypatch.context() as patch:
+        patch.setattr(CanvasClient, 'list_course_enrollments', unavailable)
+        request_id = submit(request_payload(students=5, courses=2))['request_id']
+    record = request_store.get(request_id)
+    assert record['backend'] == 'sis_import'
+    assert record['resumable']
+
+    assert client.post(f'/api/requests/{request_id}/resume', headers=AUTH).status_code == 202
+    run_jobs()
+    record = request_store.get(request_id)
+    assert record['status'] == 'completed'
+    assert not record['created_resources']['errors']
+
+    # The second import updated what the first one created
+    suffix = record['user_suffix']
+    users = [user for user in fake.users.values() if user.get('login_id', '').endswith(f'_{suffix}')]
+    assert len(users) == 6
+    sis_ids = {course_sis_id(request_id, index) for index in (1, 2)}
+    course_ids = {course['id'] for course in fake.courses.values() if course.get('sis_course_id') in sis_ids}
+    assert course_ids == {course['id'] for course in record['created_resources']['courses']}
+    assert len(course_ids) == 2
+    enrollments = [enrollment for enrollment in fake.enrollments.values() if enrollment['course_id'] in course_ids]
+    assert len(enrollments) == 12
+
+def test_failed_users_and_enrollments_are_recorded_per_item(fake, submit, monkeypatch):
+    create_user = CanvasClient.create_user
+    enroll_user = CanvasClient.enroll_user
+
+    def refuse_student_2(self, account_id, name, email, login_id, **kwargs):
+        if login_id.startswith('tstudent2_'):
+            raise RuntimeError('Canvas said no')
+        return create_user(self, account_id, name, email, login_id, **kwargs)
+
+    def refuse_student_3(self, course_id, user_id, role='StudentEnrollment'):
+        if fake.users[user_id]['login_id'].startswith('tstudent3_'):
+            raise RuntimeError('Enrollment refused')
+        return enroll_user(self, course_id, user_id, role)
+
+    monkeypatch.setattr(CanvasClient, 'create_user', refuse_student_2)
+    monkeypatch.setattr(CanvasClient, 'enroll_user', refuse_student_3)
+    record = request_store.get(submit(request_payload(students=5))['request_id'])
+
+    suffix = record['user_suffix']
+    course_id = record['created_resources']['courses'][0]['id']
+    assert record['status'] == 'completed'
+    assert record['resumable']
+    assert record['created_resources']['errors'] == [
+        f'Failed to create user tstudent2_{suffix}: Canvas said no',
+        f'Failed to enroll tstudent3_{suffix} in course {course_id}: Enrollment refused'
+    ]
+    # The other users were still created, in spec order, including the one whose enrollment failed
+    assert [user['login_id'] for user in record['created_resources']['users']] == [
+        f'tstudent{n}_{suffix}' for n in (1, 3, 4, 5)] + [f'tteacher1_{suffix}']
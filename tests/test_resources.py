@@ -0,0 +1,54 @@
+"""Compact storage of created_resources"""
+import json
+import zlib
+
+from app.models.resources import dump_resources, load_resources, user_fields
+
+def generated(kind, number, suffix, user_id, **extra):
+    return {'id': user_id, **user_fields(kind, number, suffix), **extra}
+
+def test_round_trip_of_mixed_users_and_irregular_checkpoints(monkeypatch):
+    from app.config import Config
+    monkeypatch.setattr(Config, 'RESOURCES_COMPRESS_MIN_BYTES', 1)
+    suffix = 'ab12cd34'
+    users = [
+        generated('teacher', 1, suffix, 500),
+        *(generated('student', number, suffix, 1000 + number) for number in range(1, 40)),
+        # Taken from the warm pool: other names and logins
+        {'id': 2001, 'name': 'Pool Student 7', 'email': 'pool7@test.uva.nl', 'login_id': 'pool_7_zz',
+         'sis_user_id': 'pool_7_zz', 'pooled': True},
+        # Reused from the user index, in the middle of a run
+        generated('student', 40, suffix, 1040, reused=True),
+        generated('student', 42, suffix, 1042),
+        # Looks generated but its name was edited
+        {**generated('student', 43, suffix, 1043), 'name': 'Renamed'},
+        generated('student', 1, 'ef56gh78', 3001, reused=True),
+    ]
+    checkpoints = {
+        'subaccount': 77,
+        'course:TEST-ab12cd34-C1': 88,
+        **{f'user:tstudent{number}_{suffix}': 1000 + number for number in range(1, 40)},
+        **{f'enrollment:TEST-ab12cd34-C1:tstudent{number}_{suffix}': 5000 + number for number in range(1, 40)},
+        # Leading zeros and placeholders must survive, and non-id values are kept as they are
+        'user:tstudent007_' + suffix: 7007,
+        'user:tstudent{n}_' + suffix: 9,
+        'content_started:TEST-ab12cd34-C1': 'progress-12',
+        'user:tteacher1_' + suffix: 500,
+    }
+    resources = {'subaccounts': [{'id': 77, 'name': 'Tests'}], 'courses': [{'id': 88, 'name': 'Course'}],
+                 'users': users, 'errors': ['one failed'], 'checkpoints': checkpoints}
+    original = json.loads(json.dumps(resources))
+
+    stored = dump_resources(resources)
+    assert isinstance(stored, bytes)
+    assert load_resources(stored) == original
+    # Stored compactly, and the caller's dict is left alone
+    assert len(stored) < len(json.dumps(original)) / 4
+    assert resources == original
+
+def test_legacy_rows_are_read_as_they_are():
+    legacy = {'subaccounts': [], 'courses': [{'id': 1}],
+              'users': [generated('student', 1, 'ab12cd34', 11)], 'errors': []}
+    assert load_resources(json.dumps(legacy)) == legacy
+    assert load_resources(zlib.compress(json.dumps(legacy).encode())) == legacy
+    assert load_resources(None) is None
@@ -0,0 +1,47 @@
+"""/api/setup configurations as a dependency graph"""
+import uuid
+
+from tests.conftest import AUTH
+
+def post_setup(client, **sections):
+    config = {'environment': 'test', 'subaccounts': [], 'courses': [], **sections}
+    return client.post('/api/setup', json=config, headers=AUTH)
+
+def test_unknown_refs_and_cycles_are_rejected(client, fake):
+    calls = fake.stats()['calls']
+    unknown = post_setup(client, courses=[{'name': 'Intro', 'course_code': 'T1', 'account': '@nowhere'}])
+    assert unknown.status_code == 400
+    assert "Unknown reference '@nowhere'" in unknown.get_json()['error']
+
+    cycle = post_setup(client, subaccounts=[{'ref': 'a', 'name': 'A', 'parent': '@b'},
+                                       {'ref': 'b', 'name': 'B', 'parent': '@a'}])
+    assert cycle.status_code == 400
+    assert 'Circular references between @a, @b' in cycle.get_json()['error']
+    # Nothing reached Canvas
+    assert fake.stats()['calls'] == calls
+
+def test_refs_resolve_and_failures_skip_their_dependents(client, fake):
+    login = f'graph-{uuid.uuid4().hex[:8]}'
+    response = post_setup(
+        client,
+        subaccounts=[{'ref': 'faculty', 'name': 'Faculty'},
+                     {'ref': 'department', 'name': 'Department', 'account': '@faculty'}],
+        courses=[{'ref': 'intro', 'name': 'Intro', 'course_code': 'T1', 'account': '@department'},
+                 {'ref': 'broken', 'name': 'Broken', 'course_code': 'T2', 'account': 999999999}],
+        users=[{'ref': 'alice', 'name': 'Alice', 'email': f'{login}@uva.nl', 'login_id': login}],
+        enrollments=[{'course': '@intro', 'user': '@alice'}, {'course': '@broken', 'user': '@alice'}]
+    )
+    assert response.status_code == 200
+    results = response.get_json()
+
+    refs = results['refs']
+    assert set(refs) == {'faculty', 'department', 'intro', 'alice', 'enrollments.0'}
+    department = fake.accounts[refs['department']]
+    assert department['parent_account_id'] == refs['faculty']
+    assert fake.courses[refs['intro']]['account_id'] == refs['department']
+    assert [(e['course_id'], e['user_id']) for e in results['enrollments']] == [(refs['intro'], refs['alice'])]
+
+    # The failed course and the enrollment waiting for it, in config order
+    assert len(results['errors']) == 2
+    assert results['errors'][0].startswith("Failed to create course 'Broken'")
+    assert results['errors'][1] == "Skipped enrollment '@enrollments.1': @broken was not created"
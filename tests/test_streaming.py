@@ -0,0 +1,65 @@
+"""Streamed list endpoints"""
+from datetime import datetime, timedelta
+import json
+
+from tests.conftest import AUTH, request_payload
+
+def test_requests_stream_as_json_array_or_ndjson(client, submit):
+    for _ in range(3):
+        submit(request_payload(students=1))
+
+    array = client.get('/api/requests?limit=2', headers=AUTH)
+    assert array.status_code == 200
+    assert array.is_streamed
+    assert array.mimetype == 'application/json'
+    assert len(array.get_json()) == 2
+    assert array.headers['X-Next-Cursor']
+
+    ndjson = client.get('/api/requests?limit=2', headers={**AUTH, 'Accept': 'application/x-ndjson'})
+    assert ndjson.mimetype == 'application/x-ndjson'
+    lines = ndjson.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == array.get_json()
+    assert ndjson.headers['X-Next-Cursor'] == array.headers['X-Next-Cursor']
+    # The two bodies are cached separately
+    assert ndjson.headers['ETag'] != array.headers['ETag']
+
+    # Following the cursor continues where the page ended
+    following = client.get(f"/api/requests?limit=2&format=ndjson&cursor={array.headers['X-Next-Cursor']}",
+                           headers=AUTH)
+    seen = {record['id'] for record in array.get_json()}
+    assert not seen & {json.loads(line)['id'] for line in following.get_data(as_text=True).splitlines()}
+
+def test_empty_and_invalid_lists(client):
+    assert client.get('/api/requests?environment=nowhere', headers=AUTH).get_json() == []
+    empty = client.get('/api/requests?environment=nowhere&format=ndjson', headers=AUTH)
+    assert empty.status_code == 200
+    assert empty.get_data(as_text=True) == ''
+    assert client.get('/api/requests?cursor=not-a-cursor', headers=AUTH).status_code == 400
+
+def test_courses_stream_from_inventory_or_canvas(client, fake, submit):
+    submit(request_payload(students=1, courses=2))
+    mirrored = client.get('/api/environments/test/courses?limit=1000', headers=AUTH).get_json()
+    live = client.get('/api/environments/test/courses?source=canvas&format=ndjson', headers=AUTH)
+    live_ids = {json.loads(line)['id'] for line in live.get_data(as_text=True).splitlines()}
+    assert {course['id'] for course in mirrored} <= live_ids
+
+def test_unknown_environment_is_not_found(client):
+    for method, path in [('get', 'status'), ('get', 'courses'), ('get', 'subaccounts'),
+                         ('post', 'inventory/sync'), ('post', 'users/reconcile')]:
+        response = getattr(client, method)(f'/api/environments/nowhere/{path}', headers=AUTH)
+        assert response.status_code == 404, path
+        assert response.get_json() == {'error': 'Unknown environment: nowhere'}
+
+def test_status_filtered_etag_changes_with_the_date(client, monkeypatch):
+    from app.api import routes
+
+    class Tomorrow(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=1)
+
+    today = client.get('/api/requests?status=active', headers=AUTH).headers['ETag']
+    unfiltered = client.get('/api/requests', headers=AUTH).headers['ETag']
+    monkeypatch.setattr(routes, 'datetime', Tomorrow)
+    assert client.get('/api/requests?status=active', headers=AUTH).headers['ETag'] != today
+    assert client.get('/api/requests', headers=AUTH).headers['ETag'] == unfiltered
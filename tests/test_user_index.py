@@ -0,0 +1,57 @@
+"""Test user index reuse and reconcile against the fake Canvas"""
+import uuid
+
+from tests.conftest import AUTH, run_jobs
+
+from app.api.client_registry import get_client
+from app.models.user_index import user_index
+
+USER_CREATES = 'POST /api/v1/accounts/<int:account_id>/users'
+
+def user_creates(fake):
+    return fake.stats()['by_endpoint'].get(USER_CREATES, 0)
+
+def test_create_user_reuses_the_indexed_user(fake):
+    client = get_client('test')
+    login_id = f'reuse_{uuid.uuid4().hex[:8]}'
+    created = client.create_user(1, 'Reuse Me', f'{login_id}@example.edu', login_id, sis_user_id=f'SIS-{login_id}')
+    calls = user_creates(fake)
+
+    again = client.create_user(1, 'Reuse Me', f'{login_id}@example.edu', login_id)
+    assert again['reused'] and again['id'] == created['id']
+    # The SIS id alone finds it too
+    by_sis = client.create_user(1, 'Reuse Me', 'other@example.edu', f'other_{login_id}', sis_user_id=f'SIS-{login_id}')
+    assert by_sis['reused'] and by_sis['id'] == created['id']
+    assert user_creates(fake) == calls
+
+def test_reconcile_relinks_marks_missing_and_adopts(fake, client):
+    canvas = get_client('test')
+    suffix = uuid.uuid4().hex[:8]
+    moved = canvas.create_user(1, 'Moved User', 'moved@example.edu', f'moved_{suffix}')
+    gone = canvas.create_user(1, 'Gone User', 'gone@example.edu', f'gone_{suffix}')
+
+    # Recreated in Canvas under a new id, and deleted outright
+    new_id = fake.next_id()
+    fake.users[new_id] = {**fake.users.pop(moved['id']), 'id': new_id}
+    del fake.users[gone['id']]
+    # Test users created before the index existed, and a real user
+    for login_id in (f'tstudent1_{suffix}', f'jdoe_{suffix}'):
+        user_id = fake.next_id()
+        fake.users[user_id] = {'id': user_id, 'name': login_id, 'login_id': login_id, 'sis_user_id': None}
+
+    response = client.post('/api/environments/test/users/reconcile', headers=AUTH)
+    assert response.status_code == 202
+    run_jobs()
+    result = client.get(response.headers['Location'], headers=AUTH).get_json()['result']
+    assert result['relinked'] >= 1 and result['missing'] >= 1 and result['adopted'] >= 1
+
+    assert user_index.lookup('test', login_id=f'moved_{suffix}')['id'] == new_id
+    assert user_index.lookup('test', login_id=f'gone_{suffix}') is None
+    assert user_index.lookup('test', login_id=f'tstudent1_{suffix}') is not None
+    assert user_index.lookup('test', login_id=f'jdoe_{suffix}') is None
+
+    # A second pass finds nothing new to fix
+    response = client.post('/api/environments/test/users/reconcile', headers=AUTH)
+    run_jobs()
+    result = client.get(response.headers['Location'], headers=AUTH).get_json()['result']
+    assert result['relinked'] == result['missing'] == result['adopted'] == 0
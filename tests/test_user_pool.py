@@ -0,0 +1,73 @@
+"""Warm test user pool against the fake Canvas"""
+import pytest
+
+from app.api.user_pool import POOL_USER_NAME, RECYCLED, UserPool
+from app.config import Config
+from app.models.database import Database
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'USER_POOL_SIZE', 3)
+    monkeypatch.setattr(Config, 'USER_POOL_REFILL_BATCH', 2)
+    monkeypatch.setattr(Config, 'USER_POOL_REFILL_INTERVAL', 60)
+    return Database(str(tmp_path / 'pool.db'))
+
+def pool(database, worker_name='worker-a'):
+    user_pool = UserPool(database)
+    user_pool.worker_name = worker_name
+    return user_pool
+
+def test_fill_tops_up_to_the_target_in_batches(database, fake):
+    filler = pool(database)
+    assert filler.fill('test') == 2
+    assert filler.fill('test') == 1
+    assert filler.fill('test') == 0
+    assert filler.depth('test') == 3
+
+def test_take_hands_out_each_user_once_and_is_safe_to_retry(database, fake):
+    filler = pool(database)
+    filler.fill('test')
+    filler.fill('test')
+
+    taken = filler.take('test', 2, 'REQ-POOL-1')
+    assert len(taken) == 2 and all(user['pool'] for user in taken)
+    assert filler.depth('test') == 1
+    # A retry after a crash gets the same users back instead of draining the pool
+    assert filler.take('test', 2, 'REQ-POOL-1') == taken
+    # Once one is recorded on the request, only the other is handed out again, plus a fresh one
+    again = filler.take('test', 2, 'REQ-POOL-1', exclude=[taken[0]['id']])
+    assert again[0] == taken[1] and again[1] not in taken
+    assert filler.depth('test') == 0
+
+    # An empty pool counts misses
+    assert filler.take('test', 2, 'REQ-POOL-2') == []
+    stats = filler.db.connection().execute("SELECT hits, misses FROM pool_stats WHERE environment = 'test'").fetchone()
+    assert (stats['hits'], stats['misses']) == (3, 2)
+
+def test_release_renames_users_and_makes_them_available(database, fake):
+    filler = pool(database)
+    filler.fill('test')
+    taken = filler.take('test', 2, 'REQ-POOL-3')
+    for user in taken:
+        fake.users[user['id']]['name'] = 'Renamed by the request'
+
+    assert filler.release('test', taken) == {'recycled': 2, 'errors': []}
+    assert {fake.users[user['id']]['name'] for user in taken} == {POOL_USER_NAME}
+    assert filler.depth('test') == 2
+    # Filled users stay filled when they come back; only new ones count as recycled
+    sources = {row['source'] for row in filler.db.connection().execute('SELECT source FROM pool_users')}
+    assert RECYCLED not in sources
+
+def test_one_process_at_a_time_refills(database, fake):
+    first, second = pool(database, 'worker-a'), pool(database, 'worker-b')
+    assert first.fill('test') == 2
+    # worker-a holds the lease, so worker-b leaves the rest to it
+    assert second.fill('test') == 0
+    assert first.fill('test') == 1
+
+    first.take('test', 3, 'REQ-POOL-4')
+    database.connection().execute("UPDATE pool_stats SET lease_until = '2000-01-01' WHERE environment = 'test'")
+    # An expired lease can be taken over
+    assert second.fill('test') == 2
+    assert database.connection().execute(
+        "SELECT filler FROM pool_stats WHERE environment = 'test'").fetchone()[0] == 'worker-b'
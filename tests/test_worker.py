@@ -0,0 +1,26 @@
+"""The standalone job worker process"""
+import os
+import subprocess
+import sys
+import time
+
+from app.api.inventory_sync import JOB_KIND as SYNC_INVENTORY_JOB
+from app.api.jobs import COMPLETED, FAILED, job_queue
+
+def test_worker_process_runs_queued_jobs():
+    job_id = job_queue.enqueue(SYNC_INVENTORY_JOB, {'environment': 'test', 'full': True})
+    worker = subprocess.Popen([sys.executable, '-m', 'app.worker'],
+                              env={**os.environ, 'JOB_WORKERS': '1', 'JOB_POLL_INTERVAL': '0.1'},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        job = job_queue.get(job_id)
+        while job['status'] not in (COMPLETED, FAILED) and time.monotonic() < deadline:
+            time.sleep(0.1)
+            job = job_queue.get(job_id)
+    finally:
+        worker.terminate()
+        worker.wait(10)
+
+    assert job['status'] == COMPLETED, job['error']
+    assert job['result']['mode'] == 'full'